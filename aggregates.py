@@ -0,0 +1,205 @@
+import numpy as np
+import pandas as pd
+
+from features import add_derived_features
+
+# Hours [0, 9) are morning, [9, 17) afternoon, [17, 21) evening and [21, 24) night
+TIME_OF_DAY_BINS = [0, 9, 17, 21, 24]
+TIME_OF_DAY_LABELS = ["Morning", "Afternoon", "Evening", "Night"]
+ELO_DIFF_BINS = [-float('inf'), -100, 0, 100, float('inf')]
+ELO_DIFF_LABELS = ["< -100", "-100 to 0", "0 to 100", "> 100"]
+
+def game_hours(df):
+    """Hour of day of each game, NaN where the time is missing or unparseable."""
+    times = df["time"]
+    if not pd.api.types.is_datetime64_any_dtype(times):
+        times = pd.to_datetime(times, errors="coerce")
+    return times.dt.hour
+
+def time_of_day_labels(df):
+    return pd.cut(game_hours(df), bins=TIME_OF_DAY_BINS, labels=TIME_OF_DAY_LABELS, right=False)
+
+def day_half_labels(df):
+    """Splits games at 17:00 into "Morning/Afternoon" (hour < 17) and "Evening/Night", like the time_of_day bins."""
+    hours = game_hours(df).to_numpy(dtype="float64", na_value=np.nan)
+    codes = np.where(np.isnan(hours), -1, np.where(hours < 17, 0, 1))
+    return pd.Categorical.from_codes(codes, categories=["Morning/Afternoon", "Evening/Night"])
+
+def elo_diff_labels(df):
+    return pd.cut(add_derived_features(df)["elo_diff"], bins=ELO_DIFF_BINS, labels=ELO_DIFF_LABELS, right=False)
+
+def castled_labels(df):
+    """"Castled" for kingside/queenside castling, "Not Castled" for "None", missing otherwise."""
+    castle = df["castle"]
+    codes = np.where(castle.isin(["Kingside", "Queenside"]), 0, np.where(castle == "None", 1, -1))
+    return pd.Categorical.from_codes(codes, categories=["Castled", "Not Castled"])
+
+CASTLING_TYPES = ["Kingside", "Queenside", "No Castling"]
+
+def castling_type_labels(df):
+    """The player's castling side, "No Castling" for anything else."""
+    castle = df["castle"]
+    codes = np.where(castle == "Kingside", 0, np.where(castle == "Queenside", 1, 2))
+    return pd.Categorical.from_codes(codes, categories=CASTLING_TYPES)
+
+# Each dimension maps a frame to one group label per game; missing labels are left out of every group.
+# Dimensions labelled by raw column values keep only the groups seen and sort them by name, so that
+# the groups come out the same however the rows were split into chunks
+SORTED_DIMENSIONS = {"color", "opening", "opening_id", "family_id"}
+DIMENSIONS = {
+    "color": lambda df: df["color"],
+    "opening": lambda df: df["opening"],
+    "opening_id": lambda df: df["opening_id"],
+    "family_id": lambda df: df["family_id"],
+    "time_of_day": time_of_day_labels,
+    "day_half": day_half_labels,
+    "elo_diff_bin": elo_diff_labels,
+    "castled": castled_labels,
+    "castling_type": castling_type_labels,
+}
+
+def group_codes(labels, sort=False):
+    """
+    Integer group codes (-1 for missing) and the group names. Categorical labels keep their category
+    order unless `sort` is set; anything else is factorized in sorted order.
+    """
+    if isinstance(labels, pd.Series) and isinstance(labels.dtype, pd.CategoricalDtype):
+        labels = labels.array
+    if not isinstance(labels, pd.Categorical):
+        return pd.factorize(labels, sort=True)
+    codes, groups = np.asarray(labels.codes), labels.categories
+    if sort:
+        order = np.argsort(np.asarray(groups, dtype=object), kind="stable")
+        rank = np.empty(len(order), dtype=codes.dtype)
+        rank[order] = np.arange(len(order), dtype=codes.dtype)
+        codes = np.where(codes >= 0, rank[codes], -1)
+        groups = groups[order]
+    return codes, groups
+
+def group_stats(codes, groups, values, name):
+    """Count, sum and sum of squares of `values` per group, from one bincount pass each."""
+    mask = codes >= 0
+    valid = mask & ~np.isnan(values)
+    codes = codes[valid]
+    values = values[valid]
+    size = len(groups)
+    return pd.DataFrame({
+        "n": np.bincount(codes, minlength=size),
+        "sum": np.bincount(codes, weights=values, minlength=size),
+        "sumsq": np.bincount(codes, weights=values * values, minlength=size),
+    }, index=pd.Index(groups, name=name))
+
+def compute_stats(df, requests):
+    """
+    Computes the sufficient statistics of every requested (dimension, value) pair, deriving each
+    dimension's group codes once no matter how many values are aggregated over it.
+
+    Args:
+        df (DataFrame): Cleaned games.
+        requests (list): (dimension, value) pairs, e.g. [("color", "score"), ("time_of_day", "is_win")].
+            Dimensions are keys of DIMENSIONS; values are numeric columns such as those added by
+            features.add_derived_features.
+
+    Returns:
+        dict: Maps each (dimension, value) pair to a DataFrame indexed by group with n, sum and sumsq.
+    """
+    add_derived_features(df)
+    codes_by_dimension = {}
+    results = {}
+    for dimension, value in requests:
+        sort = dimension in SORTED_DIMENSIONS
+        if dimension not in codes_by_dimension:
+            codes_by_dimension[dimension] = group_codes(DIMENSIONS[dimension](df), sort=sort)
+        codes, groups = codes_by_dimension[dimension]
+        values = df[value].to_numpy(dtype="float64", na_value=np.nan)
+        group = group_stats(codes, groups, values, dimension)
+        results[(dimension, value)] = group[group["n"] > 0] if sort else group
+    return results
+
+def merge_stats(left, right):
+    """
+    Merges two compute_stats results over disjoint sets of games into the statistics of their union.
+    Groups missing on one side count as empty there.
+    """
+    merged = {}
+    for key, group in left.items():
+        other = right[key]
+        index = group.index.union(other.index, sort=False)
+        total = group.reindex(index, fill_value=0) + other.reindex(index, fill_value=0)
+        merged[key] = total.sort_index() if key[0] in SORTED_DIMENSIONS else total
+    return merged
+
+def compute_stats_chunked(chunks, requests):
+    """
+    Like compute_stats, but over an iterable of frames (e.g. analysis.iter_data), holding one chunk in
+    memory at a time and merging the per-chunk statistics. Returns None when there are no chunks.
+
+    Scores and win flags are multiples of 0.5, so their sums and sums of squares are exact in float64
+    and the merged statistics are bit-identical to compute_stats over the concatenated frame.
+    """
+    totals = None
+    for chunk in chunks:
+        partial = compute_stats(chunk, requests)
+        totals = partial if totals is None else merge_stats(totals, partial)
+    return totals
+
+def family_stats(group, df):
+    """
+    Per-family-ID statistics (n, sum and sumsq, as from compute_stats) indexed by the family names
+    that the IDs have in the games of `df`, sorted by name.
+    """
+    pairs = df[["family_id", "opening"]].dropna().drop_duplicates("family_id")
+    families = pd.Series(pairs["opening"].astype(str).to_numpy(), index=pairs["family_id"].to_numpy(dtype="int64"))
+    labels = families.reindex(group.index.to_numpy(dtype="int64")).to_numpy()
+    return group.groupby(labels).sum().rename_axis("opening")
+
+def group_means(group):
+    """
+    Mean of each group; NaN for empty groups. `group` holds either sums (n, sum, sumsq, as from
+    compute_stats) or running moments (n, mean, m2, as from live_stats).
+    """
+    if "mean" in group.columns:
+        return group["mean"].where(group["n"] > 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return group["sum"] / group["n"]
+
+def group_squared_deviations(group):
+    """Sum of squared deviations from the group mean, per group."""
+    if "m2" in group.columns:
+        return group["m2"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (group["sumsq"] - group["sum"] ** 2 / group["n"]).clip(lower=0)
+
+def group_variances(group):
+    """Sample variance (ddof=1) of each group."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return group_squared_deviations(group) / (group["n"] - 1)
+
+def ttest_from_stats(group, a, b, equal_var=False):
+    """Two-sample t-test between groups `a` and `b`, from their sufficient statistics."""
+    from scipy import stats
+
+    if a not in group.index or b not in group.index:
+        return np.nan, np.nan
+    means = group_means(group)
+    stds = np.sqrt(group_variances(group))
+    return stats.ttest_ind_from_stats(means[a], stds[a], group["n"][a], means[b], stds[b], group["n"][b], equal_var=equal_var)
+
+def anova_from_stats(group):
+    """One-way ANOVA F statistic and p-value over the groups of `group`, from their sufficient statistics."""
+    from scipy import stats
+
+    n = group["n"].to_numpy(dtype="float64")
+    k = len(n)
+    if k < 2 or (n == 0).any():
+        return np.nan, np.nan
+    means = group_means(group).to_numpy(dtype="float64")
+    total = n.sum()
+    grand_mean = (n * means).sum() / total
+    between = (n * (means - grand_mean) ** 2).sum()
+    within = group_squared_deviations(group).to_numpy(dtype="float64").sum()
+    df_between = k - 1
+    df_within = total - k
+    with np.errstate(invalid="ignore", divide="ignore"):
+        f_stat = (between / df_between) / (within / df_within)
+    return f_stat, stats.f.sf(f_stat, df_between, df_within)
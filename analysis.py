@@ -1,64 +1,161 @@
+import argparse
+import os
+
 import pandas as pd
-from scipy.stats import ttest_ind
-from scipy import stats
-from scipy.stats import f_oneway
 
-def load_data(file_path="cleaned_games.csv"):
-    """Load the cleaned game data."""
+import aggregates as aggregate_stats
+import column_cache
+import features
+import game_db
+import schema
+from aggregates import compute_stats, compute_stats_chunked
+from clocks import MoveTimes, clocks_path, think_time_by_phase, time_trouble_frequency
+from game_db import compute_stats_sql, is_sqlite, iter_sqlite, load_sqlite
+from metrics import METRICS, metric_result, plan
+from resampling import group_sample, resampling_test
+from result_cache import ResultCache
+from schema import CATEGORY_COLUMNS, apply_filters, is_parquet, to_typed_frame
+
+def load_data(file_path="cleaned_games.parquet", columns=None, filters=None):
+    """
+    Load the cleaned game data.
+
+    Args:
+        file_path (str): A month-partitioned Parquet dataset, a SQLite database or a CSV file written by
+            preprocess_games.
+        columns (list): Only load these columns.
+        filters (list): (column, op, value) tuples, e.g. [("color", "==", "black")]. On Parquet they are
+            pushed down to the reader, which skips non-matching month partitions and row groups; on
+            SQLite they become an indexed WHERE clause.
+
+    The frame gets the compact schema of schema.to_typed_frame whatever the format: categorical labels,
+    datetime64 time, Int16 Elo, UInt16 move count and game_duration in seconds. While the dataset is
+    unchanged since preprocess_games wrote it, the columns come from its memory-mapped column cache
+    instead of being parsed (see column_cache).
+    """
     try:
-        return pd.read_csv(file_path)
+        filter_columns = [column for column, _, _ in filters or []]
+        usecols = list(dict.fromkeys(columns + filter_columns)) if columns else None
+        cached = column_cache.load(file_path, usecols)
+        if cached is not None:
+            if filters:
+                cached = apply_filters(cached, filters)
+            return cached[columns] if columns else cached
+        if is_parquet(file_path):
+            return to_typed_frame(pd.read_parquet(file_path, columns=columns, filters=filters), copy=False)
+        if is_sqlite(file_path):
+            return load_sqlite(file_path, columns=columns, filters=filters)
+        df = read_csv(file_path, usecols=usecols)
+        if filters:
+            df = apply_filters(df, filters)
+        return to_typed_frame(df[columns] if columns else df, copy=False)
     except Exception as e:
         print(f"Error loading data: {e}")
         return pd.DataFrame()
 
-def analyze_win_rate_by_color(df):
+def read_csv(file_path, **kwargs):
+    """
+    pd.read_csv for a cleaned games CSV: label columns are parsed straight into categoricals, and only
+    empty fields count as missing, so that a castle value of "None" stays a string.
+    """
+    return pd.read_csv(file_path, dtype={name: "category" for name in CATEGORY_COLUMNS},
+                       keep_default_na=False, na_values=[""], **kwargs)
+
+def iter_data(file_path="cleaned_games.parquet", chunk_size=1_000_000, columns=None, filters=None):
+    """
+    Stream the cleaned game data as DataFrames of about `chunk_size` rows, for datasets that do not
+    fit in memory. Takes the same arguments as load_data; on Parquet and SQLite the filters are pushed
+    down to the scanner, on CSV they are applied to each chunk.
+    """
+    filter_columns = [column for column, _, _ in filters or []]
+    usecols = list(dict.fromkeys(columns + filter_columns)) if columns else None
+    cached = column_cache.load(file_path, usecols)
+    if cached is not None:
+        # Slices of the memory-mapped columns: each chunk's pages are read only when it is used
+        for start in range(0, len(cached), chunk_size):
+            chunk = cached.iloc[start:start + chunk_size]
+            if filters:
+                chunk = apply_filters(chunk, filters)
+            yield chunk[columns] if columns else chunk
+        return
+    if is_sqlite(file_path):
+        yield from iter_sqlite(file_path, chunk_size, columns=columns, filters=filters)
+        return
+    if is_parquet(file_path):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+
+        dataset = ds.dataset(file_path, format="parquet", partitioning="hive")
+        expression = pq.filters_to_expression(filters) if filters else None
+        # Each month partition yields its own small batches; gather them into chunks of about
+        # chunk_size rows so the per-chunk overhead stays low
+        batches, rows = [], 0
+        for batch in dataset.to_batches(columns=columns, filter=expression, batch_size=chunk_size):
+            batches.append(batch)
+            rows += batch.num_rows
+            if rows >= chunk_size:
+                yield to_typed_frame(pa.Table.from_batches(batches).to_pandas(), copy=False)
+                batches, rows = [], 0
+        if rows:
+            yield to_typed_frame(pa.Table.from_batches(batches).to_pandas(), copy=False)
+        return
+
+    for chunk in read_csv(file_path, usecols=usecols, chunksize=chunk_size):
+        if filters:
+            chunk = apply_filters(chunk, filters)
+        yield to_typed_frame(chunk[columns] if columns else chunk, copy=False)
+
+def compute_aggregates(file_path="cleaned_games.parquet", requests=None, filters=None, chunk_size=None):
+    """
+    Computes the statistics of `requests` (default: ALL_AGGREGATES) for the games matching `filters`,
+    for passing to the analyze_* functions. On SQLite the group-bys run inside the database; with
+    `chunk_size` the dataset is streamed in chunks; otherwise it is loaded whole. Returns None when
+    no games match.
+    """
+    requests = requests or ALL_AGGREGATES
+    if is_sqlite(file_path):
+        return compute_stats_sql(file_path, requests, filters=filters)
+    if chunk_size:
+        return compute_stats_chunked(iter_data(file_path, chunk_size, columns=AGGREGATE_COLUMNS, filters=filters), requests)
+    df = load_data(file_path, filters=filters)
+    return None if df.empty else compute_stats(df, requests)
+
+def analyze_win_rate_by_color(df, aggregates=None):
     """Analyze win rate by color (white vs black)."""
     if "color" not in df.columns or "result" not in df.columns:
         print("Data file must contain 'color' and 'result' columns.")
         return
     
-    color_win_rate = df.groupby("color")["result"].apply(lambda x: (x == "win").sum() / len(x) * 100)
+    color_win_rate = metric_result("win_rate_by_color", df, aggregates).means * 100
     print("Win Rate by Color:")
     print(color_win_rate)
 
-def analyze_opening_impact_on_win_rate(df):
+def analyze_opening_impact_on_win_rate(df, aggregates=None):
     """
     Analyze if opening choice has a significant impact on win rate using ANOVA, excluding openings played less than 10 times.
     """
-    if "opening" not in df.columns or "result" not in df.columns:
-        print("Data must contain 'opening' and 'result' columns.")
+    if "family_id" not in df.columns or "result" not in df.columns:
+        print("Data must contain 'family_id' and 'result' columns.")
         return
 
-    # Create a win column where wins = 1, draws = 0.5, losses = 0
-    df["win"] = df["result"].apply(lambda x: 1 if x == "win" else (0.5 if x == "agreed" else 0))
-    
-    # Count the number of games per opening
-    opening_counts = df["opening"].value_counts()
-
-    # Filter out openings played less than 10 times
-    valid_openings = opening_counts[opening_counts >= 10].index
-    filtered_df = df[df["opening"].isin(valid_openings)]
+    # Score (wins = 1, draws = 0.5, losses = 0) per opening family played at least 10 times, grouped on
+    # the integer family ID, with an ANOVA across them (see metrics.METRICS)
+    result = metric_result("score_by_opening", df, aggregates)
 
     # Check if there are enough openings left for analysis
-    if filtered_df["opening"].nunique() < 2:
+    if len(result.stats) < 2:
         print("Not enough data to perform analysis after filtering.")
         return
 
-    # Group win rates by opening
-    openings = filtered_df["opening"].unique()
-    win_rates_by_opening = [filtered_df[filtered_df["opening"] == opening]["win"] for opening in openings]
-    
-    # Perform ANOVA test
-    f_stat, p_value = f_oneway(*win_rates_by_opening)
-
-    print(f"F-statistic: {f_stat}, P-value: {p_value}")
-    if p_value < 0.05:
+    print(f"F-statistic: {result.statistic}, P-value: {result.p_value}")
+    if result.p_value < 0.05:
         print("The difference in win rate between openings is statistically significant.")
     else:
         print("The difference in win rate between openings is not statistically significant.")
 
 
-def analyze_color_impact_on_win_rate(df):
+def analyze_color_impact_on_win_rate(df, aggregates=None):
     """
     Perform a t-test to determine if color (white or black) has a significant impact on win rate,
     with draws counted as 0.5.
@@ -67,133 +164,76 @@ def analyze_color_impact_on_win_rate(df):
         print("Data must contain 'color' and 'result' columns.")
         return
 
-    # Create a new column for win rate, with wins as 1, draws as 0.5, and losses as 0
-    df["win"] = df["result"].apply(lambda x: 1 if x == "win" else (0.5 if x == "agreed" else 0))
-
-    # Separate win rates by color
-    white_wins = df[df["color"] == "white"]["win"]
-    black_wins = df[df["color"] == "black"]["win"]
-
-    # Perform a two-sample t-test
-    t_stat, p_value = ttest_ind(white_wins, black_wins, equal_var=False)
+    # Two-sample Welch t-test of the score (wins as 1, draws as 0.5, losses as 0) between white and black
+    result = metric_result("score_by_color", df, aggregates)
 
-    print(f"T-statistic: {t_stat}, P-value: {p_value}")
-    if p_value < 0.05:
+    print(f"T-statistic: {result.statistic}, P-value: {result.p_value}")
+    if result.p_value < 0.05:
         print("The difference in win rate between white and black is statistically significant.")
     else:
         print("The difference in win rate between white and black is not statistically significant.")
 
 
-def analyze_win_rate_by_time_of_day(df):
+def analyze_win_rate_by_time_of_day(df, aggregates=None):
     """Analyze win rate by time of day."""
-    df["time"] = pd.to_datetime(df["time"], errors='coerce')
-    df = df.dropna(subset=["time"])
-    df["hour"] = df["time"].dt.hour
-    df["time_of_day"] = pd.cut(df["hour"], bins=[0, 9, 17, 21, 24], labels=["Morning", "Afternoon", "Evening", "Night"])
-    df["win"] = df["result"].apply(lambda x: 1 if x == "win" else 0)
+    aggregates = aggregates or compute_stats(df, plan(["win_rate_by_time_of_day", "win_rate_by_day_half"]))
 
-    win_rate_by_time_of_day = df.groupby("time_of_day")["win"].mean() * 100
+    win_rate_by_time_of_day = metric_result("win_rate_by_time_of_day", df, aggregates).means * 100
     print("Win Rate by Time of Day:")
     print(win_rate_by_time_of_day)
 
-    morning_afternoon = df[df["hour"] <= 17]["win"]
-    evening_night = df[df["hour"] > 17]["win"]
-    t_stat, p_value = ttest_ind(morning_afternoon, evening_night)
+    # Morning/afternoon (hour < 17) vs evening/night
+    result = metric_result("win_rate_by_day_half", df, aggregates)
     
-    print(f"T-statistic: {t_stat}, P-value: {p_value}")
-    if p_value < 0.05:
+    print(f"T-statistic: {result.statistic}, P-value: {result.p_value}")
+    if result.p_value < 0.05:
         print("There is a statistically significant difference in win rates depending on the time of the day.")
     else:
         print("There is no statistically significant difference in win rates depending on the time of the day.")
 
 
-def analyze_elo_diff_vs_win_rate(df):
+def analyze_elo_diff_vs_win_rate(df, aggregates=None):
     """Analyze Elo difference vs win rate and calculate p-value."""
     if "result" not in df.columns or "white_elo" not in df.columns or "black_elo" not in df.columns:
         print("Data file must contain 'result', 'white_elo', and 'black_elo' columns.")
         return None
     
-    # Calculate Elo difference
-    df["elo_diff"] = df.apply(
-        lambda row: row["white_elo"] - row["black_elo"] if row["color"] == "white" else row["black_elo"] - row["white_elo"], axis=1
-    )
-    
-    # Calculate win rate: 1 for win, 0 for loss, 0.5 for draw
-    df["win_rate"] = df["result"].apply(lambda x: 1 if x == "win" else (0.5 if x == "agreed" else 0))
+    # Score (1 for win, 0 for loss, 0.5 for draw) per Elo difference bin: < -100, -100 to 0, 0 to 100,
+    # > 100, with a one-way ANOVA across the bins
+    result = metric_result("score_by_elo_diff", df, aggregates)
+    win_rate_by_elo_diff = result.means.rename_axis("elo_diff_bins") * 100
     
-    # Bin the Elo difference into categories
-    bins = [-float('inf'), -100, 0, 100, float('inf')]
-    labels = ["< -100", "-100 to 0", "0 to 100", "> 100"]
-    
-    df["elo_diff_bins"] = pd.cut(df["elo_diff"], bins=bins, labels=labels, right=False)
-    
-    # Group by Elo difference bins
-    grouped = df.groupby("elo_diff_bins")["win_rate"]
-    win_rate_by_elo_diff = grouped.mean() * 100
-    
-    # Prepare data for ANOVA test
-    groups = [df[df["elo_diff_bins"] == bin]["win_rate"].dropna() for bin in labels]
-    
-    # Perform one-way ANOVA
-    f_stat, p_value = f_oneway(*groups)
-    
-    print(f"F-statistic: {f_stat}, P-value: {p_value}")
-    if p_value < 0.05:
+    print(f"F-statistic: {result.statistic}, P-value: {result.p_value}")
+    if result.p_value < 0.05:
         print("There is a statistically significant effect of Elo difference on win rate.")
     else:
         print("There is no statistically significant effect of Elo difference on win rate.")
     
     return win_rate_by_elo_diff
 
-def analyze_castling_impact_on_win_rate(df):
+def analyze_castling_impact_on_win_rate(df, aggregates=None):
     """Analyze win rate based on castling (kingside, queenside, or no castling)."""
-    if "moves" not in df.columns or "result" not in df.columns:
-        print("Data must contain 'moves' and 'result' columns.")
+    if "castle" not in df.columns or "result" not in df.columns:
+        print("Data must contain 'castle' and 'result' columns.")
         return
 
-    # Create a new column for castling category
-    def categorize_castling(moves):
-        if "O-O" in moves:
-            return "Kingside Castled"
-        elif "O-O-O" in moves:
-            return "Queenside Castled"
-        else:
-            return "Not Castled"
-    
-    # Apply categorization based on moves
-    df["castling"] = df["moves"].apply(categorize_castling)
-
-    # Create a new column for win rate, with wins as 1, draws as 0.5, and losses as 0
-    df["win"] = df["result"].apply(lambda x: 1 if x == "win" else (0.5 if x == "agreed" else 0)) 
-
-    # Group win rates by castling category
-    kingside = df[df["castling"] == "Kingside Castled"]["win"]
-    queenside = df[df["castling"] == "Queenside Castled"]["win"]
-    not_castled = df[df["castling"] == "Not Castled"]["win"]
+    # Score per castling type, with an ANOVA across kingside, queenside and no castling
+    result = metric_result("score_by_castling_type", df, aggregates)
 
-    # Perform ANOVA test
-    f_stat, p_value = f_oneway(kingside, queenside, not_castled)
-
-    print(f"F-statistic: {f_stat}, P-value: {p_value}")
-    if p_value < 0.05:
+    print(f"F-statistic: {result.statistic}, P-value: {result.p_value}")
+    if result.p_value < 0.05:
         print("The difference in win rate between castling categories is statistically significant.")
     else:
         print("The difference in win rate between castling categories is not statistically significant.")
 
 
-def analyze_castling_effect(df):
+def analyze_castling_effect(df, aggregates=None):
     """Analyze the effect of castling on win rate using a t-test."""
-    
-    # Filter data into two groups: castling (kingside or queenside) vs. no castling
-    castling_games = df[df["castle"].isin(["Kingside", "Queenside"])]  # Games where castling occurred
-    no_castling_games = df[df["castle"] == "None"]  # Games where no castling occurred
-
-    # Calculate win rates for each group (win = 1, draw = 0.5, loss = 0)
-    castling_win_rate = castling_games["win"].mean()
-    no_castling_win_rate = no_castling_games["win"].mean()
-
-    # Perform an independent t-test to compare the win rates
-    t_stat, p_value = stats.ttest_ind(castling_games["win"], no_castling_games["win"], equal_var=False)
+    # Score (win = 1, draw = 0.5, loss = 0) for games with castling (kingside or queenside) and games
+    # without castling, compared with an independent t-test
+    result = metric_result("score_by_castling", df, aggregates)
+    castling_win_rate, no_castling_win_rate = result.means[["Castled", "Not Castled"]]
+    t_stat, p_value = result.statistic, result.p_value
 
         # Determine if the result is significant
     if p_value < 0.05:
@@ -206,14 +246,103 @@ def analyze_castling_effect(df):
     print(f"T-statistic: {t_stat:.4f}")
     print(f"P-value: {p_value:.4f}")
 
+def analyze_time_management(times, threshold=30.0):
+    """
+    Analyze think time per move in each game phase, for the player and the opponents, and how often
+    each gets into time trouble (a clock at or below `threshold` seconds), from the move clocks kept
+    by preprocess_games(clocks=True).
+    """
+    if not len(times.clocks):
+        print("No move clocks to analyze.")
+        return
+
+    print("Mean seconds per move by phase (player):")
+    print(think_time_by_phase(times))
+    print("Mean seconds per move by phase (opponents):")
+    print(think_time_by_phase(times, own=False))
+
+    trouble = time_trouble_frequency(times, threshold)
+    print(f"Time trouble (<= {threshold:.0f} s) in {trouble['player_games']:.1%} of the player's games "
+          f"and {trouble['opponent_games']:.1%} of the opponents', over {trouble['games']} clocked games")
+    print(f"Player's moves in time trouble: {trouble['player_moves']:.1%}")
+    print(trouble["player_moves_by_phase"])
+    return trouble
+
+
+# The t-tests and ANOVA above as resampling tests: name -> the metric (see metrics.METRICS) retested
+RESAMPLED_TESTS = {
+    "color": "score_by_color",
+    "time of day": "win_rate_by_day_half",
+    "Elo difference": "score_by_elo_diff",
+    "castling": "score_by_castling",
+}
+
+def analyze_resampled_significance(df, method="permutation", resamples=10000, seed=0, workers=1):
+    """
+    Repeat the color, time-of-day, Elo-difference and castling tests as permutation or bootstrap tests
+    (see resampling.resampling_test), which do not assume normally distributed 0/0.5/1 outcomes.
+    """
+    results = {}
+    for name, metric_name in RESAMPLED_TESTS.items():
+        metric = METRICS[metric_name]
+        sample = group_sample(df, metric.dimension, metric.value, metric.groups)
+        stat, p_value = resampling_test(sample, method, resamples, seed, workers)
+        results[name] = (stat, p_value)
+        significance = "statistically significant" if p_value < 0.05 else "not statistically significant"
+        print(f"{name.capitalize()} ({method}, {resamples} resamples): statistic {stat:.4f}, P-value: {p_value:.4f} "
+              f"-> {significance}")
+    return results
+
+
+# The statistics of every metric, computed together in one pass over the data
+ALL_AGGREGATES = plan()
+
+# Columns the aggregated analyses read when streaming
+AGGREGATE_COLUMNS = ["result", "color", "family_id", "time", "castle", "white_elo", "black_elo"]
+
+# compute_aggregates memoized on disk per dataset fingerprint; call cached_aggregates.invalidate(path)
+# to drop the results of one dataset. The chunk size does not change the statistics, and changes to
+# the grouping, binning, derived features or loading (column cache included) recompute them
+RESULT_CACHE = ResultCache("analysis_cache")
+cached_aggregates = RESULT_CACHE.memoize(compute_aggregates, ignore=["chunk_size"],
+                                         sources=[aggregate_stats, column_cache, features, game_db, schema,
+                                                  load_data, iter_data])
 
 if __name__ == "__main__":
-    df = load_data()
+    parser = argparse.ArgumentParser(description="Analyze the cleaned chess games.")
+    parser.add_argument("file_path", nargs="?", default="cleaned_games.parquet")
+    parser.add_argument("--chunk-size", type=int, help="Stream the dataset in chunks of this many rows instead of loading it whole")
+    parser.add_argument("--refresh", action="store_true", help="Drop the cached results of this dataset first")
+    parser.add_argument("--resamples", type=int, default=0, help="Also run permutation/bootstrap tests with this many resamples")
+    parser.add_argument("--method", choices=["permutation", "bootstrap"], default="permutation")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1, help="Processes for the resampling tests")
+    parser.add_argument("--time-trouble", type=float, default=30.0, help="Clock seconds at or below which a player is in time trouble")
+    args = parser.parse_args()
+
+    if args.refresh:
+        cached_aggregates.invalidate(args.file_path)
+
+    # Compute the statistics of every analysis at once (or reuse them while the dataset is unchanged);
+    # the analyses only need the column names of df
+    aggregates = cached_aggregates(args.file_path, ALL_AGGREGATES, chunk_size=args.chunk_size)
+    if aggregates is None:
+        raise SystemExit("No games to analyze.")
+    df = pd.DataFrame(columns=AGGREGATE_COLUMNS)
 
     # Perform analysis
-    analyze_win_rate_by_color(df)
-    analyze_color_impact_on_win_rate(df)
-    analyze_opening_impact_on_win_rate(df)
-    analyze_win_rate_by_time_of_day(df)
-    analyze_elo_diff_vs_win_rate(df)
-    analyze_castling_effect(df)
+    analyze_win_rate_by_color(df, aggregates)
+    analyze_color_impact_on_win_rate(df, aggregates)
+    analyze_opening_impact_on_win_rate(df, aggregates)
+    analyze_win_rate_by_time_of_day(df, aggregates)
+    analyze_elo_diff_vs_win_rate(df, aggregates)
+    analyze_castling_effect(df, aggregates)
+    analyze_castling_impact_on_win_rate(df, aggregates)
+
+    # Move clocks are only kept by preprocess_games(clocks=True)
+    if os.path.exists(clocks_path(args.file_path)):
+        analyze_time_management(MoveTimes.load(clocks_path(args.file_path)), args.time_trouble)
+
+    if args.resamples:
+        analyze_resampled_significance(load_data(args.file_path, columns=AGGREGATE_COLUMNS), args.method,
+                                       args.resamples, args.seed, args.workers)
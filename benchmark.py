@@ -0,0 +1,932 @@
+import copy
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+
+def bench_fetch_concurrency(archive_counts=(12, 60, 120), concurrency=8, latency=0.02):
+    """
+    Compares serial and concurrent archive fetching against a local stub API
+    as the number of monthly archives grows.
+    """
+    from data import fetch_all_games
+    from mock_api import serve_mock_api
+
+    server, api_base = serve_mock_api({f"user{n}": n for n in archive_counts}, latency=latency)
+    try:
+        print(f"{'archives':>8} {'serial (s)':>11} {'concurrent (s)':>15} {'speedup':>8}")
+        with tempfile.TemporaryDirectory() as tmp:
+            output_file = os.path.join(tmp, "games.json")
+            for n in archive_counts:
+                timings = []
+                for workers in (1, concurrency):
+                    start = time.perf_counter()
+                    fetch_all_games(f"user{n}", output_file=output_file, concurrency=workers, api_base=api_base)
+                    timings.append(time.perf_counter() - start)
+                print(f"{n:>8} {timings[0]:>11.3f} {timings[1]:>15.3f} {timings[0] / timings[1]:>7.1f}x")
+    finally:
+        server.shutdown()
+
+def bench_incremental_sync(archive_counts=(12, 60, 120), latency=0.02):
+    """
+    Compares a full re-download with an incremental sync of an already cached history.
+    """
+    from data import fetch_all_games, sync_games
+    from mock_api import serve_mock_api
+
+    server, api_base = serve_mock_api({f"user{n}": n for n in archive_counts}, latency=latency)
+    try:
+        print(f"{'archives':>8} {'full (s)':>9} {'sync (s)':>9} {'requests':>9}")
+        with tempfile.TemporaryDirectory() as tmp:
+            output_file = os.path.join(tmp, "games.json")
+            cache_dir = os.path.join(tmp, "cache")
+            for n in archive_counts:
+                start = time.perf_counter()
+                fetch_all_games(f"user{n}", output_file=output_file, api_base=api_base)
+                full = time.perf_counter() - start
+
+                sync_games(f"user{n}", output_file=output_file, cache_dir=cache_dir, api_base=api_base)
+                before = server.request_count
+                start = time.perf_counter()
+                sync_games(f"user{n}", output_file=output_file, cache_dir=cache_dir, api_base=api_base)
+                incremental = time.perf_counter() - start
+                print(f"{n:>8} {full:>9.3f} {incremental:>9.3f} {server.request_count - before:>9}")
+    finally:
+        server.shutdown()
+
+def bench_batch_ingest(users=200, archives=6, concurrency=16, latency=0.02, error_rate=0.1):
+    """
+    Measures batch ingestion throughput against the stub API, then resumes a run that was
+    interrupted by failing requests and counts how many requests the resume needs.
+    """
+    from ingest import ingest_users
+    from mock_api import serve_mock_api
+
+    usernames = [f"player{i}" for i in range(users)]
+    server, api_base = serve_mock_api({name: archives for name in usernames}, latency=latency)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            ingest_users(usernames, output_dir=os.path.join(tmp, "clean"), cache_dir=os.path.join(tmp, "clean_cache"),
+                         concurrency=concurrency, rate=1000, api_base=api_base)
+            elapsed = time.perf_counter() - start
+            requests_made = server.request_count
+
+            server.error_rate = error_rate
+            state = ingest_users(usernames, output_dir=os.path.join(tmp, "out"), cache_dir=os.path.join(tmp, "cache"),
+                                 concurrency=concurrency, rate=1000, max_retries=0, api_base=api_base)
+            failed = sum(1 for entry in state.values() if entry["status"] == "failed")
+            server.error_rate = 0.0
+            before = server.request_count
+            ingest_users(usernames, output_dir=os.path.join(tmp, "out"), cache_dir=os.path.join(tmp, "cache"),
+                         concurrency=concurrency, rate=1000, api_base=api_base, resume=True)
+            resumed = server.request_count - before
+
+        print(f"{users} users x {archives} archives: {elapsed:.2f}s, {users / elapsed:.1f} users/s, "
+              f"{requests_made / elapsed:.1f} requests/s")
+        print(f"resume after {failed} failed users: {resumed} requests (full run: {requests_made})")
+    finally:
+        server.shutdown()
+
+def peak_rss_of(code):
+    """Runs `code` in a fresh interpreter and returns (seconds, peak RSS in MB, its stdout)."""
+    probe = code + "\nimport resource; print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split()
+    return time.perf_counter() - start, int(output[-1]) / 1024, output[:-1]
+
+def bench_game_store_memory(games=1_000_000):
+    """
+    Compares peak RSS and file size of reading a synthetic history from the indented JSON array
+    and from the streaming JSONL store (plain and gzip).
+    """
+    from game_store import append_games
+    from mock_api import make_game
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "games.json")
+        paths = {"json": json_path, "jsonl": os.path.join(tmp, "games.jsonl"), "jsonl.gz": os.path.join(tmp, "games.jsonl.gz")}
+
+        # Write the legacy format incrementally, byte-identical to json.dump(games, indent=4)
+        with open(json_path, "w") as file:
+            file.write("[\n")
+            for i in range(games):
+                file.write(textwrap.indent(json.dumps(make_game("player", i), indent=4), "    "))
+                file.write(",\n" if i < games - 1 else "\n")
+            file.write("]")
+        for fmt in ("jsonl", "jsonl.gz"):
+            append_games(paths[fmt], (make_game("player", i) for i in range(games)))
+
+        read_json = "import json\nwith open({path!r}) as f: games = json.load(f)\nprint(sum(1 for g in games))"
+        read_store = "from game_store import iter_games\nprint(sum(1 for g in iter_games({path!r})))"
+        print(f"{'format':>9} {'size (MB)':>10} {'read (s)':>9} {'peak RSS (MB)':>14}")
+        for fmt, path in paths.items():
+            code = (read_json if fmt == "json" else read_store).format(path=path)
+            elapsed, rss, _ = peak_rss_of(code)
+            print(f"{fmt:>9} {os.path.getsize(path) / 2**20:>10.1f} {elapsed:>9.2f} {rss:>14.1f}")
+
+def legacy_pgn_features(pgn, color):
+    """The per-game PGN work preprocess_games did before pgn_parser, kept as the benchmark baseline."""
+    import re
+
+    castle = "None"
+    if "O-O" in (pgn.split()[::2] if color == "white" else pgn.split()[1::2]):
+        castle = "Kingside"
+    elif "O-O-O" in (pgn.split()[::2] if color == "white" else pgn.split()[1::2]):
+        castle = "Queenside"
+    opponent_castle = "None"
+    if "O-O" in (pgn.split()[1::2] if color == "white" else pgn.split()[::2]):
+        opponent_castle = "Kingside"
+    elif "O-O-O" in (pgn.split()[1::2] if color == "white" else pgn.split()[::2]):
+        opponent_castle = "Queenside"
+    date_match = re.search(r'\[UTCDate "(\d{4}\.\d{2}\.\d{2})"\]', pgn)
+    time_match = re.search(r'\[UTCTime "(\d{2}:\d{2}:\d{2})"\]', pgn)
+    end_time_match = re.search(r'\[EndTime "(\d{2}:\d{2}:\d{2})"\]', pgn)
+    move_pairs = re.findall(r'\d+\.\s([a-zA-Z0-9\+\#=\-]+)\s([a-zA-Z0-9\+\#=\-]+)', pgn)
+    move_count = len(move_pairs) or len(re.findall(r'\d+\.\s([a-zA-Z0-9\+\#=\-]+)', pgn)) // 2
+    re.findall(r'\d+\.\s([a-zA-Z0-9\+\#=\-]+)\s?([a-zA-Z0-9\+\#=\-]+)?', pgn)
+    return castle, opponent_castle, date_match, time_match, end_time_match, move_count
+
+def bench_pgn_parser(games=20_000):
+    """Games/sec of the legacy per-game PGN work vs pgn_parser.parse_pgn on Chess.com-style PGNs."""
+    from mock_api import make_game
+    from pgn_parser import parse_pgn
+
+    pgns = [make_game("player", i)["pgn"] for i in range(games)]
+    start = time.perf_counter()
+    for i, pgn in enumerate(pgns):
+        legacy_pgn_features(pgn, "white" if i % 2 == 0 else "black")
+    legacy = time.perf_counter() - start
+    start = time.perf_counter()
+    for pgn in pgns:
+        parse_pgn(pgn)
+    parsed = time.perf_counter() - start
+    print(f"legacy: {games / legacy:>10.0f} games/s")
+    print(f"parser: {games / parsed:>10.0f} games/s ({legacy / parsed:.1f}x)")
+
+def bench_preprocess_scaling(games=200_000, worker_counts=None, chunk_size=10000):
+    """Wall-clock time of preprocess_games at 1/2/4/8/N workers, checking every run matches the serial output."""
+    from game_store import append_games
+    from mock_api import make_game
+    from preprocess import preprocess_games
+
+    cpus = os.cpu_count() or 1
+    worker_counts = worker_counts or sorted({1, 2, 4, 8, cpus})
+    with tempfile.TemporaryDirectory() as tmp:
+        input_file = os.path.join(tmp, "games.jsonl")
+        append_games(input_file, (make_game("player", i) for i in range(games)))
+        serial_file = os.path.join(tmp, "serial.csv")
+
+        print(f"{games} games on {cpus} CPUs")
+        print(f"{'workers':>7} {'time (s)':>9} {'games/s':>9} {'speedup':>8}")
+        baseline = None
+        for workers in worker_counts:
+            output_file = serial_file if workers == 1 else os.path.join(tmp, f"parallel{workers}.csv")
+            start = time.perf_counter()
+            preprocess_games(input_file, output_file, your_username="player", workers=workers, chunk_size=chunk_size)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            if workers > 1:
+                with open(serial_file) as serial, open(output_file) as parallel:
+                    assert serial.read() == parallel.read(), f"{workers} workers differ from the serial output"
+            print(f"{workers:>7} {elapsed:>9.2f} {games / elapsed:>9.0f} {baseline / elapsed:>7.1f}x")
+
+def dir_size(path):
+    """Size in bytes of a file, or of every file below a directory."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+def bench_parquet_vs_csv(games=200_000):
+    """Load time and size of the cleaned dataset as CSV vs month-partitioned Parquet."""
+    import pandas as pd
+    from analysis import load_data
+    from game_store import append_games
+    from mock_api import make_history
+    from preprocess import preprocess_games
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_file = os.path.join(tmp, "games.jsonl")
+        append_games(input_file, make_history("player", games, per_month=games // 48))
+        paths = {"csv": os.path.join(tmp, "cleaned.csv"), "parquet": os.path.join(tmp, "cleaned.parquet")}
+        for path in paths.values():
+            preprocess_games(input_file, path, your_username="player")
+
+        queries = {
+            "full load": {},
+            "2 columns": {"columns": ["result", "color"]},
+            "black, 2018+": {"columns": ["result", "opening"],
+                             "filters": [("color", "==", "black"), ("time", ">=", pd.Timestamp("2018-01-01"))]},
+        }
+        print(f"{'format':>8} {'size (MB)':>10} " + " ".join(f"{name:>13}" for name in queries))
+        for fmt, path in paths.items():
+            timings = []
+            for kwargs in queries.values():
+                start = time.perf_counter()
+                load_data(path, **kwargs)
+                timings.append(time.perf_counter() - start)
+            print(f"{fmt:>8} {dir_size(path) / 2**20:>10.2f} " + " ".join(f"{t * 1000:>10.1f} ms" for t in timings))
+
+def bench_incremental_preprocess(games=200_000, new_games=(0, 100, 1000)):
+    """Full preprocess vs incremental runs that only see `new_games` games added since the last run."""
+    from game_store import append_games, write_games
+    from mock_api import make_history
+    from preprocess import preprocess_games
+
+    history = list(make_history("player", games + max(new_games), per_month=2000))
+    with tempfile.TemporaryDirectory() as tmp:
+        input_file = os.path.join(tmp, "games.jsonl")
+        for fmt in ("csv", "parquet"):
+            output_file = os.path.join(tmp, f"cleaned.{fmt}")
+            write_games(input_file, history[:games])
+            start = time.perf_counter()
+            preprocess_games(input_file, output_file, your_username="player", incremental=True)
+            print(f"{fmt:>8} full rebuild of {games} games: {time.perf_counter() - start:.2f}s")
+            added = games
+            for count in new_games:
+                append_games(input_file, history[added:added + count])
+                added += count
+                start = time.perf_counter()
+                preprocess_games(input_file, output_file, your_username="player", incremental=True)
+                print(f"{fmt:>8} incremental, {count:>5} new games: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+def synthetic_frame(rows, seed=0):
+    """A cleaned-games frame with random results, colors, openings, times and ratings."""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    results = np.array(["win", "resigned", "checkmated", "timeout", "agreed", "repetition", "abandoned"])
+    openings = np.array([f"Opening {i}" for i in range(60)])
+    opening_ids = rng.integers(0, len(openings), rows)
+    castles = np.array(["Kingside", "Queenside", "None"])
+    white_elo = rng.integers(400, 2400, rows)
+    return pd.DataFrame({
+        "result": results[rng.choice(len(results), rows, p=[0.48, 0.2, 0.1, 0.1, 0.05, 0.04, 0.03])],
+        "color": np.where(rng.random(rows) < 0.5, "white", "black"),
+        "opening": openings[opening_ids],
+        "opening_id": pd.array(opening_ids, dtype="UInt16"),
+        "family_id": pd.array(opening_ids, dtype="UInt16"),
+        "time": pd.Timestamp("2015-01-01") + pd.to_timedelta(rng.integers(0, 10 * 365 * 86400, rows), unit="s"),
+        "game_duration": [f"{m}:{s:02d}" for m, s in zip(rng.integers(0, 30, rows), rng.integers(0, 60, rows))],
+        "move_count": rng.integers(5, 120, rows),
+        "castle": castles[rng.integers(0, 3, rows)],
+        "opponent_castle": castles[rng.integers(0, 3, rows)],
+        "white_elo": white_elo,
+        "black_elo": white_elo + rng.integers(-300, 300, rows),
+    })
+
+def bench_derived_features(rows=5_000_000):
+    """Per-row lambdas the analyses used for score/Elo columns vs features.add_derived_features."""
+    from features import add_derived_features
+
+    df = synthetic_frame(rows)
+    legacy = df.copy()
+    start = time.perf_counter()
+    legacy["win"] = legacy["result"].apply(lambda x: 1 if x == "win" else (0.5 if x == "agreed" else 0))
+    legacy["elo_diff"] = legacy.apply(
+        lambda row: row["white_elo"] - row["black_elo"] if row["color"] == "white" else row["black_elo"] - row["white_elo"], axis=1
+    )
+    legacy["elo_rating"] = legacy.apply(lambda row: row["white_elo"] if row["color"] == "white" else row["black_elo"], axis=1)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    add_derived_features(df)
+    vectorized_time = time.perf_counter() - start
+    start = time.perf_counter()
+    add_derived_features(df)
+    cached_time = time.perf_counter() - start
+
+    assert (legacy["win"].to_numpy() == df["score"].to_numpy()).all()
+    assert (legacy["elo_diff"].to_numpy() == df["elo_diff"].to_numpy()).all()
+    assert (legacy["elo_rating"].to_numpy() == df["my_elo"].to_numpy()).all()
+    print(f"{rows} rows")
+    print(f"per-row lambdas: {legacy_time:>9.3f}s")
+    print(f"vectorized:      {vectorized_time:>9.3f}s ({legacy_time / vectorized_time:.0f}x)")
+    print(f"cached call:     {cached_time * 1e6:>9.1f}us")
+
+def bench_aggregates(rows=2_000_000):
+    """Per-group masks and scipy tests the analyses used vs aggregates.compute_stats and the *_from_stats tests."""
+    import numpy as np
+    import pandas as pd
+    from scipy.stats import f_oneway, ttest_ind
+
+    from aggregates import anova_from_stats, compute_stats, ttest_from_stats
+    from analysis import ALL_AGGREGATES
+    from features import add_derived_features
+
+    df = add_derived_features(synthetic_frame(rows))
+    start = time.perf_counter()
+    white = df[df["color"] == "white"]["score"]
+    black = df[df["color"] == "black"]["score"]
+    legacy_color = ttest_ind(white, black, equal_var=False)
+    counts = df["opening"].value_counts()
+    valid = df[df["opening"].isin(counts[counts >= 10].index)]
+    legacy_opening = f_oneway(*[valid[valid["opening"] == opening]["score"] for opening in valid["opening"].unique()])
+    hours = pd.to_datetime(df["time"]).dt.hour
+    legacy_day_half = ttest_ind(df[hours < 17]["is_win"], df[hours >= 17]["is_win"])
+    bins = pd.cut(df["elo_diff"], bins=[-float('inf'), -100, 0, 100, float('inf')], right=False)
+    legacy_elo = f_oneway(*[df[bins == b]["score"] for b in bins.cat.categories])
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    aggregates = compute_stats(df, ALL_AGGREGATES)
+    by_opening = aggregates[("family_id", "score")]
+    results = [
+        ttest_from_stats(aggregates[("color", "score")], "white", "black", equal_var=False),
+        anova_from_stats(by_opening[by_opening["n"] >= 10]),
+        ttest_from_stats(aggregates[("day_half", "is_win")], "Morning/Afternoon", "Evening/Night", equal_var=True),
+        anova_from_stats(aggregates[("elo_diff_bin", "score")]),
+    ]
+    engine_time = time.perf_counter() - start
+
+    for legacy, result in zip([legacy_color, legacy_opening, legacy_day_half, legacy_elo], results):
+        assert np.allclose(tuple(legacy), result, rtol=1e-8), (tuple(legacy), result)
+    print(f"{rows} rows, {len(ALL_AGGREGATES)} aggregates")
+    print(f"per-group masks: {legacy_time:>8.3f}s")
+    print(f"single pass:     {engine_time:>8.3f}s ({legacy_time / engine_time:.1f}x)")
+
+def bench_out_of_core(rows=10_000_000, chunk_size=1_000_000, part_rows=1_000_000):
+    """Peak RSS and rows/sec of the aggregated analyses in memory vs streamed in chunks, on a Parquet dataset."""
+    from schema import write_parquet
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "games.parquet")
+        for seed, start in enumerate(range(0, rows, part_rows)):
+            write_parquet(synthetic_frame(min(part_rows, rows - start), seed), path, append=start > 0)
+
+        # Each run prints a digest of every statistic, so the two paths can be compared bit for bit
+        digest = textwrap.dedent("""
+            import hashlib
+            from analysis import ALL_AGGREGATES
+            digest = hashlib.sha1()
+            for key in ALL_AGGREGATES:
+                group = aggregates[key]
+                digest.update(repr(list(group.index)).encode())
+                for name in ("n", "sum", "sumsq"):
+                    digest.update(group[name].to_numpy().tobytes())
+            print(digest.hexdigest())
+        """)
+        runs = {
+            "in memory": f"from aggregates import compute_stats\nfrom analysis import ALL_AGGREGATES, AGGREGATE_COLUMNS, load_data\n"
+                         f"aggregates = compute_stats(load_data({path!r}, columns=AGGREGATE_COLUMNS), ALL_AGGREGATES)\n",
+            "chunked": f"from aggregates import compute_stats_chunked\nfrom analysis import ALL_AGGREGATES, AGGREGATE_COLUMNS, iter_data\n"
+                       f"aggregates = compute_stats_chunked(iter_data({path!r}, {chunk_size}, columns=AGGREGATE_COLUMNS), ALL_AGGREGATES)\n",
+        }
+        digests = {}
+        print(f"{rows} rows, chunks of {chunk_size}")
+        print(f"{'mode':>10} {'time (s)':>9} {'rows/s':>11} {'peak RSS (MB)':>14}")
+        for mode, code in runs.items():
+            seconds, peak, output = peak_rss_of(code + digest)
+            digests[mode] = output[-1]
+            print(f"{mode:>10} {seconds:>9.2f} {rows / seconds:>11,.0f} {peak:>14.0f}")
+        assert digests["in memory"] == digests["chunked"], digests
+
+def bench_live_stats(history=1_000_000, new_games=1000):
+    """Cost of folding `new_games` games into the analyses: full compute_stats recompute per game vs LiveStats.update."""
+    import numpy as np
+
+    from aggregates import anova_from_stats, compute_stats, ttest_from_stats
+    from analysis import ALL_AGGREGATES
+    from live_stats import LiveStats
+
+    df = synthetic_frame(history + new_games)
+    past, arriving = df.iloc[:history].copy(), df.iloc[history:].to_dict("records")
+
+    start = time.perf_counter()
+    compute_stats(df.copy(), ALL_AGGREGATES)
+    recompute_time = time.perf_counter() - start
+
+    live = LiveStats.from_frame(past, ALL_AGGREGATES)
+    start = time.perf_counter()
+    for game in arriving:
+        live.update(game)
+    update_time = (time.perf_counter() - start) / new_games
+
+    # Shards merged after a JSON round trip must agree with a batch computation over all games
+    shards = [LiveStats(ALL_AGGREGATES) for _ in range(4)]
+    for i, game in enumerate(df.iloc[:20_000].to_dict("records")):
+        shards[i % 4].update(game)
+    merged = LiveStats.from_dict(json.loads(json.dumps(shards[0].to_dict())))
+    for shard in shards[1:]:
+        merged.merge(shard)
+    for tracker, frame in [(live, df), (merged, df.iloc[:20_000].copy())]:
+        expected = compute_stats(frame, ALL_AGGREGATES)
+        aggregates = tracker.aggregates()
+        assert np.allclose(ttest_from_stats(aggregates[("color", "score")], "white", "black"),
+                           ttest_from_stats(expected[("color", "score")], "white", "black"), rtol=1e-9)
+        assert np.allclose(anova_from_stats(aggregates[("elo_diff_bin", "score")]),
+                           anova_from_stats(expected[("elo_diff_bin", "score")]), rtol=1e-9)
+        assert (aggregates[("time_of_day", "is_win")]["n"].to_numpy() == expected[("time_of_day", "is_win")]["n"].to_numpy()).all()
+    print(f"{history} games of history")
+    print(f"full recompute: {recompute_time * 1e3:>10.1f}ms per game")
+    print(f"live update:    {update_time * 1e6:>10.1f}us per game ({recompute_time / update_time:,.0f}x)")
+
+def bench_sqlite_queries(sizes=(10_000, 100_000, 1_000_000), repeats=3):
+    """Latency of filtered queries on the CSV and Parquet outputs (pandas) vs the indexed SQLite table."""
+    import pandas as pd
+
+    from analysis import compute_aggregates, load_data
+    from game_db import write_sqlite
+    from schema import write_parquet
+
+    after_2023 = pd.Timestamp("2023-01-01")
+    queries = {
+        # Opening statistics as black after 2023
+        "openings as black >= 2023": lambda path: compute_aggregates(
+            path, [("opening", "score")], filters=[("color", "==", "black"), ("time", ">=", after_2023)]),
+        # The games of one opening as white in one month
+        "one opening, one month": lambda path: load_data(path, filters=[
+            ("opening", "==", "Opening 7"), ("color", "==", "white"),
+            ("time", ">=", pd.Timestamp("2023-06-01")), ("time", "<", pd.Timestamp("2023-07-01"))]),
+    }
+    print(f"{'games':>9} {'query':>26} {'csv (ms)':>9} {'parquet (ms)':>13} {'sqlite (ms)':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            df = synthetic_frame(size)
+            paths = {"csv": os.path.join(tmp, f"games{size}.csv"), "parquet": os.path.join(tmp, f"games{size}.parquet"),
+                     "sqlite": os.path.join(tmp, f"games{size}.db")}
+            df.to_csv(paths["csv"], index=False)
+            write_parquet(df, paths["parquet"])
+            write_sqlite(df, paths["sqlite"])
+            for name, query in queries.items():
+                timings = {}
+                results = {}
+                for backend, path in paths.items():
+                    start = time.perf_counter()
+                    for _ in range(repeats):
+                        results[backend] = query(path)
+                    timings[backend] = (time.perf_counter() - start) / repeats * 1e3
+                if isinstance(results["sqlite"], dict):
+                    stats, expected = results["sqlite"][("opening", "score")], results["parquet"][("opening", "score")]
+                    assert stats["n"].tolist() == expected["n"].tolist() and stats["sum"].tolist() == expected["sum"].tolist()
+                else:
+                    assert len(results["sqlite"]) == len(results["parquet"]) == len(results["csv"])
+                print(f"{size:>9} {name:>26} {timings['csv']:>9.1f} {timings['parquet']:>13.1f} {timings['sqlite']:>12.1f}")
+
+def bench_result_cache(rows=1_000_000):
+    """Cold compute_aggregates vs cached results from disk (a fresh process) and from memory (a dashboard refresh)."""
+    from analysis import ALL_AGGREGATES, compute_aggregates
+    from result_cache import ResultCache
+    from schema import write_parquet
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "games.parquet")
+        write_parquet(synthetic_frame(rows), path)
+        cache_dir = os.path.join(tmp, "cache")
+        cached = ResultCache(cache_dir).memoize(compute_aggregates)
+
+        timings = {}
+        for run in ("cold", "memory"):
+            start = time.perf_counter()
+            result = cached(path, ALL_AGGREGATES)
+            timings[run] = time.perf_counter() - start
+        start = time.perf_counter()
+        from_disk = ResultCache(cache_dir).memoize(compute_aggregates)(path, ALL_AGGREGATES)
+        timings["disk"] = time.perf_counter() - start
+        for key, group in result.items():
+            assert group.equals(from_disk[key])
+
+        # Rewriting the dataset changes its fingerprint; invalidating drops its entries
+        write_parquet(synthetic_frame(1000, seed=1), path)
+        assert cached(path, ALL_AGGREGATES)[("color", "score")]["n"].sum() == 1000
+        cached.invalidate(path)
+        assert not os.listdir(cache_dir)
+
+        # Least recently used entries are evicted beyond max_entries
+        small = ResultCache(cache_dir, max_entries=2).memoize(compute_aggregates)
+        for requests in ([("color", "score")], [("opening", "score")], [("castled", "score")]):
+            small(path, requests)
+        assert len(os.listdir(cache_dir)) == 2
+
+    print(f"{rows} rows")
+    print(f"cold:   {timings['cold'] * 1e3:>10.1f}ms")
+    print(f"disk:   {timings['disk'] * 1e3:>10.1f}ms ({timings['cold'] / timings['disk']:.0f}x)")
+    print(f"memory: {timings['memory'] * 1e3:>10.3f}ms ({timings['cold'] / timings['memory']:,.0f}x)")
+
+def bench_render_figures(rows=200_000, worker_counts=None):
+    """Headless render of every figure at 1 and N workers, then a re-run that skips the unchanged figures."""
+    from schema import write_parquet
+    from visualization import FIGURES, render_figures
+
+    worker_counts = worker_counts or sorted({1, os.cpu_count()})
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "games.parquet")
+        write_parquet(synthetic_frame(rows), path)
+        for workers in worker_counts:
+            output_dir = os.path.join(tmp, f"figures{workers}")
+            start = time.perf_counter()
+            timings = render_figures(path, output_dir, workers=workers)
+            total = time.perf_counter() - start
+            assert all(isinstance(seconds, float) for seconds in timings.values()), timings
+            print(f"{workers} worker(s): {total:.2f}s wall-clock")
+        for name in FIGURES:
+            print(f"{name:>10}: {timings[name]:.2f}s")
+        start = time.perf_counter()
+        rerun = render_figures(path, output_dir, workers=worker_counts[-1])
+        assert set(rerun.values()) == {"unchanged"}
+        print(f"unchanged re-run: {time.perf_counter() - start:.2f}s")
+
+def bench_site_feed(rows=200_000):
+    """Exporting the JSON feed for index.html vs rendering the same charts as PNGs: time and bytes."""
+    from site_feed import export_feed
+    from schema import write_parquet
+    from visualization import render_figures
+
+    charted = ["Figure_1", "Figure_3", "Figure_4", "Figure_5", "Figure_6", "Figure_8"]
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        # The feed reuses analysis.cached_aggregates, whose cache lives in the working directory
+        os.chdir(tmp)
+        try:
+            path = os.path.join(tmp, "games.parquet")
+            write_parquet(synthetic_frame(rows), path)
+            start = time.perf_counter()
+            render_figures(path, "figures", names=charted, workers=1)
+            render_time = time.perf_counter() - start
+            png_size = sum(os.path.getsize(os.path.join("figures", f"{name}.png")) for name in charted)
+
+            timings = []
+            for _ in range(2):
+                start = time.perf_counter()
+                feed_size = export_feed(path, os.path.join("data", "aggregates.json"))
+                timings.append(time.perf_counter() - start)
+        finally:
+            os.chdir(cwd)
+
+    print(f"{rows} rows, {len(charted)} charts")
+    print(f"matplotlib PNGs:      {render_time:>7.2f}s {png_size / 1024:>8.1f} KB")
+    print(f"JSON feed (cold):     {timings[0]:>7.2f}s {feed_size / 1024:>8.1f} KB")
+    print(f"JSON feed (cached):   {timings[1]:>7.2f}s")
+
+def bench_rating_progression(sizes=(10_000, 100_000, 1_000_000), max_points=2000):
+    """Rating progression plot: every game on a full frame copy (the old plot) vs rating_series + LTTB, to PNG."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import numpy as np
+    import pandas as pd
+
+    from features import add_derived_features
+    from rating_series import downsample, rating_series
+
+    print(f"{'games':>9} {'all points (s)':>15} {'LTTB (s)':>9} {'points':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        output_path = os.path.join(tmp, "rating.png")
+        for size in sizes:
+            df = synthetic_frame(size)
+            df["time"] = df["time"].sort_values(ignore_index=True)
+
+            start = time.perf_counter()
+            legacy = add_derived_features(df).copy()
+            legacy["time"] = pd.to_datetime(legacy["time"], errors="coerce")
+            legacy = legacy.dropna(subset=["my_elo"])
+            plt.figure(figsize=(10, 6))
+            plt.plot(legacy["time"], legacy["my_elo"], linestyle="-", color="b")
+            plt.savefig(output_path)
+            plt.close("all")
+            legacy_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            line = downsample(rating_series(df), max_points)
+            plt.figure(figsize=(10, 6))
+            plt.plot(line.index, line.to_numpy(), linestyle="-", color="b")
+            plt.savefig(output_path)
+            plt.close("all")
+            lttb_time = time.perf_counter() - start
+
+            assert len(line) == min(size, max_points)
+            assert line.iloc[0] == legacy["my_elo"].iloc[0] and line.iloc[-1] == legacy["my_elo"].iloc[-1]
+            assert np.isin(line.to_numpy(), legacy["my_elo"].to_numpy()).all()
+            print(f"{size:>9} {legacy_time:>15.2f} {lttb_time:>9.2f} {len(line):>7}")
+
+def bench_compact_schema(rows=1_000_000, repeats=5):
+    """Bytes/row and groupby speed of the cleaned CSV as read by plain pd.read_csv vs load_data's compact schema."""
+    import numpy as np
+    import pandas as pd
+
+    from analysis import load_data
+    from schema import memory_report
+
+    df = synthetic_frame(rows)
+    df.loc[df.index[::50], "white_elo"] = np.nan
+    df["time"] = df["time"].dt.strftime("%Y-%m-%d %H:%M:%S")
+    groupbys = {
+        "opening mean Elo": lambda frame: frame.groupby("opening", observed=True)["white_elo"].mean(),
+        "color x result count": lambda frame: frame.groupby(["color", "result"], observed=True).size(),
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cleaned_games.csv")
+        df.to_csv(path, index=False)
+        frames = {"read_csv": pd.read_csv(path), "read_csv (object)": pd.read_csv(path, dtype=object), "compact": load_data(path)}
+
+    reports = {name: memory_report(frame) for name, frame in frames.items()}
+    print(f"{rows} rows")
+    print(f"{'column':>16} " + " ".join(f"{name:>18}" for name in frames))
+    for column in list(df.columns) + ["total"]:
+        print(f"{column:>16} " + " ".join(f"{report.loc[column, 'bytes_per_row']:>12.1f} B/row" for report in reports.values()))
+    for label, groupby in groupbys.items():
+        timings = []
+        for frame in frames.values():
+            if frame is frames["read_csv (object)"]:
+                frame = frame.assign(white_elo=pd.to_numeric(frame["white_elo"]))
+            start = time.perf_counter()
+            for _ in range(repeats):
+                result = groupby(frame)
+            timings.append((time.perf_counter() - start) / repeats * 1e3)
+        print(f"{label:>20} " + " ".join(f"{t:>15.1f} ms" for t in timings))
+    expected = groupbys["opening mean Elo"](frames["read_csv"])
+    assert np.allclose(groupbys["opening mean Elo"](frames["compact"]).astype("float64").to_numpy(), expected.to_numpy())
+
+def legacy_opening_name(opening_url):
+    """The per-game opening name preprocess_games derived before opening_index, kept as the benchmark baseline."""
+    if opening_url != "Unknown":
+        opening_name = opening_url.split('/')[-1].replace('-', ' ').strip()
+        if ":" in opening_name:
+            opening_name = opening_name.split(":")[0]
+    else:
+        opening_name = "Unknown Opening"
+    return opening_name
+
+def bench_opening_index(games=1_000_000, repeats=5):
+    """Per-game ECO URL munging vs the opening index, and grouping scores by opening name vs opening and family ID."""
+    import numpy as np
+    import pandas as pd
+
+    from aggregates import anova_from_stats, compute_stats
+    from opening_index import OpeningIndex
+
+    families = ["Sicilian-Defense", "Italian-Game", "Queens-Pawn-Opening", "Caro-Kann-Defense", "French-Defense",
+                "Scandinavian-Defense", "Kings-Gambit", "English-Opening", "Ruy-Lopez-Opening", "Vienna-Game"]
+    lines = ["", "-Main-Line", "-Exchange-Variation", "-Exchange-Variation-4.Nf3", "-2...Nc6-3.d4", "-Modern-Variation-5.e3-c5"]
+    urls = np.array([f"https://www.chess.com/openings/{family}{line}" for family in families for line in lines] + ["Unknown"], dtype=object)
+    rng = np.random.default_rng(0)
+    ecos = urls[rng.integers(0, len(urls), games)].tolist()
+
+    start = time.perf_counter()
+    names = [legacy_opening_name(eco) for eco in ecos]
+    legacy = time.perf_counter() - start
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "openings.json")
+        start = time.perf_counter()
+        index = OpeningIndex(path)
+        opening_ids = index.ids(ecos)
+        openings = index.families()[opening_ids]
+        index.save()
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        OpeningIndex(path).ids(ecos)
+        warm = time.perf_counter() - start
+    print(f"{games} games, {len(urls)} ECO URLs -> {len(set(names))} legacy names, "
+          f"{len(set(openings))} families, {len(index.openings)} opening IDs")
+    print(f"{'legacy munging':>16}: {legacy:.2f} s  ({games / legacy:,.0f} games/s)")
+    print(f"{'index (new)':>16}: {cold:.2f} s  ({games / cold:,.0f} games/s)")
+    print(f"{'index (saved)':>16}: {warm:.2f} s  ({games / warm:,.0f} games/s)")
+    assert all(index.family(opening_id) == openings[i] for i, opening_id in enumerate(opening_ids[:1000]))
+
+    games_frame = synthetic_frame(games).drop(columns=["opening", "opening_id", "family_id"])
+    frames = {
+        "legacy names": ("opening", games_frame.assign(opening=names)),
+        "family category": ("opening", games_frame.assign(opening=pd.Categorical(openings))),
+        "family ID": ("family_id", games_frame.assign(family_id=pd.array(index.family_ids()[opening_ids], dtype="UInt16"))),
+        "opening ID": ("opening_id", games_frame.assign(opening_id=pd.array(opening_ids, dtype="UInt16"))),
+    }
+    for label, (dimension, frame) in frames.items():
+        start = time.perf_counter()
+        for _ in range(repeats):
+            f_stat, p_value = anova_from_stats(compute_stats(frame, [(dimension, "score")])[(dimension, "score")])
+        elapsed = (time.perf_counter() - start) / repeats
+        print(f"{label:>16}: {elapsed * 1e3:.1f} ms per grouped ANOVA (F={f_stat:.3f})")
+
+def bench_resampling(rows=1_000_000, loop_resamples=20, index_resamples=100, table_resamples=100_000, worker_counts=None):
+    """Resamples/sec of permutation and bootstrap tests on `rows` games: a Python loop vs batched index matrices vs count tables."""
+    import numpy as np
+
+    from resampling import group_sample, resampling_test, test_statistic
+
+    worker_counts = worker_counts or sorted({1, os.cpu_count() or 1})
+    sample = group_sample(synthetic_frame(rows), "color", "score", ["white", "black"])
+    # The same games, resampled game by game instead of as counts per score
+    by_game = copy.copy(sample)
+    by_game.table = None
+
+    rng = np.random.default_rng(0)
+    observed = test_statistic(sample.sizes, *sample.sums())
+    start = time.perf_counter()
+    for _ in range(loop_resamples):
+        shuffled = rng.permutation(sample.values)
+        sums = np.array([shuffled[:sample.sizes[0]].sum(), shuffled[sample.sizes[0]:].sum()])
+        test_statistic(sample.sizes, sums, np.array([(shuffled[:sample.sizes[0]] ** 2).sum(), (shuffled[sample.sizes[0]:] ** 2).sum()]))
+    loop = loop_resamples / (time.perf_counter() - start)
+    print(f"{rows} games, observed |t| = {observed:.3f}")
+    print(f"{'python loop':>28}: {loop:>12,.0f} resamples/s")
+
+    p_values = {}
+    for method in ("permutation", "bootstrap"):
+        for label, test_sample, resamples in (("index matrices", by_game, index_resamples), ("count tables", sample, table_resamples)):
+            for workers in worker_counts:
+                start = time.perf_counter()
+                stat, p_value = resampling_test(test_sample, method, resamples, seed=0, workers=workers)
+                rate = resamples / (time.perf_counter() - start)
+                p_values.setdefault((method, label), []).append(p_value)
+                print(f"{method + ', ' + label:>28}: {rate:>12,.0f} resamples/s at {workers} worker(s), p = {p_value:.4f}")
+    # Worker count does not change the resamples drawn
+    assert all(len(set(p)) == 1 for p in p_values.values())
+
+def bench_replay(games=20_000):
+    """Moves/sec of the bitboard replay engine, and games/sec of parse_pgn alone vs parse_pgn plus replay."""
+    from mock_api import make_game
+    from pgn_parser import parse_pgn
+    from replay import game_features, replay
+
+    pgns = [make_game("player", i)["pgn"] for i in range(games)]
+    parsed = [parse_pgn(pgn) for pgn in pgns]
+    moves = sum(len(game.moves) for game in parsed)
+    start = time.perf_counter()
+    for game in parsed:
+        replay(game.moves)
+    replayed = time.perf_counter() - start
+    print(f"replay: {moves / replayed:>12,.0f} moves/s over {moves} moves")
+
+    start = time.perf_counter()
+    for pgn in pgns:
+        parse_pgn(pgn)
+    parse_only = time.perf_counter() - start
+    start = time.perf_counter()
+    for pgn in pgns:
+        game_features(parse_pgn(pgn))
+    with_replay = time.perf_counter() - start
+    print(f"parse_pgn:          {games / parse_only:>10,.0f} games/s")
+    print(f"parse_pgn + replay: {games / with_replay:>10,.0f} games/s")
+
+def legacy_clock_times(pgn):
+    """Clock seconds of a PGN converted move by move in Python, the baseline for MoveTimes.from_pgns."""
+    import re
+
+    seconds = []
+    for clock in re.findall(r"\[%clk ([^\]]+)\]", pgn):
+        hours, minutes, secs = clock.split(":")
+        seconds.append(int(hours) * 3600 + int(minutes) * 60 + float(secs))
+    return seconds
+
+def bench_clocks(games=100_000, threshold=30.0):
+    """Moves/sec of clock parsing per move in Python vs flat MoveTimes arrays, and of the time-management aggregates."""
+    import numpy as np
+
+    from clocks import MoveTimes, think_time_by_phase, time_trouble_frequency
+    from mock_api import make_game
+
+    pgns = [make_game("player", i)["pgn"] for i in range(games)]
+    colors = [i % 2 for i in range(games)]
+
+    start = time.perf_counter()
+    legacy = [legacy_clock_times(pgn) for pgn in pgns]
+    legacy_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    times = MoveTimes.from_pgns(pgns, colors, ["600"] * games)
+    parse_seconds = time.perf_counter() - start
+    moves = len(times.clocks)
+    assert np.allclose(np.concatenate([np.asarray(clocks, dtype=np.float32) for clocks in legacy]), times.clocks)
+    print(f"{games} games, {moves} moves, {times.clocks.nbytes + times.offsets.nbytes:,} bytes of arrays")
+    print(f"{'per move (Python)':>22}: {moves / legacy_seconds:>14,.0f} moves/s")
+    print(f"{'MoveTimes':>22}: {moves / parse_seconds:>14,.0f} moves/s")
+
+    # The aggregates on ten copies of the games, to reach millions of moves
+    many = MoveTimes.concat([times] * 10)
+    start = time.perf_counter()
+    by_phase = think_time_by_phase(many)
+    trouble = time_trouble_frequency(many, threshold)
+    aggregate_seconds = time.perf_counter() - start
+    print(f"{'aggregates':>22}: {len(many.clocks) / aggregate_seconds:>14,.0f} moves/s over {len(many.clocks)} moves")
+    print(by_phase)
+    print(f"time trouble (<= {threshold:.0f} s) in {trouble['player_games']:.1%} of games")
+
+def bench_opening_tree(games=20_000, queries=200):
+    """Games/sec of building the opening tree, and position lookups/sec in the mmap-ed tree vs rescanning the PGNs."""
+    import numpy as np
+
+    from mock_api import make_game
+    from opening_tree import TREE_PLIES, OpeningTree, chunk_edges
+    from pgn_parser import parse_pgn
+
+    raw = [make_game("player", i) for i in range(games)]
+    pgns = [game["pgn"] for game in raw]
+    results = [game["white"]["result"] for game in raw]
+    rows = [(parse_pgn(pgn).moves, None, 0, result) for pgn, result in zip(pgns, results)]
+
+    start = time.perf_counter()
+    tree = OpeningTree.from_parts([chunk_edges(rows[i:i + 10_000]) for i in range(0, games, 10_000)])
+    build_seconds = time.perf_counter() - start
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "games.tree")
+        tree.save(path)
+        size = os.path.getsize(path + ".edges.npy") + os.path.getsize(path + ".nodes.npy")
+        tree = OpeningTree.load(path)
+        lines = [rows[i % games][0][:1 + i % TREE_PLIES] for i in range(queries)]
+
+        start = time.perf_counter()
+        looked_up = [tree.lookup(line)["games"] for line in lines]
+        lookup_seconds = time.perf_counter() - start
+        del tree
+
+    # The baseline parses every PGN for every query and matches the move prefix
+    rescan_queries = max(queries // 100, 1)
+    start = time.perf_counter()
+    for line in lines[:rescan_queries]:
+        rescanned = sum(parse_pgn(pgn).moves[:len(line)] == line for pgn in pgns)
+        # Without transpositions in the mock games, both count the same games
+        assert rescanned == looked_up[lines.index(line)]
+    rescan_seconds = (time.perf_counter() - start) / rescan_queries
+
+    print(f"{games} games -> {size:,} bytes on disk, built at {games / build_seconds:,.0f} games/s")
+    print(f"{'rescan PGNs':>12}: {1 / rescan_seconds:>12,.1f} lookups/s")
+    print(f"{'tree (mmap)':>12}: {queries / lookup_seconds:>12,.1f} lookups/s")
+
+def bench_cold_start(rows=1_000_000, runs=3):
+    """
+    Seconds from a fresh interpreter to the first result (win rate by color) on a CSV of `rows` games,
+    parsing the CSV vs opening its memory-mapped column cache, and the import time of the analysis
+    and visualization modules next to that of the libraries they now import lazily.
+    """
+    import column_cache
+
+    def cold(code):
+        best = float("inf")
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                           stdout=subprocess.DEVNULL)
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    first_result = ("from analysis import load_data; from features import add_derived_features; df = load_data({path!r}, columns=['result', 'color']); "
+                    "add_derived_features(df); print(df.groupby('color', observed=True)['is_win'].mean())")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "games.csv")
+        synthetic_frame(rows).to_csv(path, index=False)
+        timings = {"import analysis": cold("import analysis"), "import visualization": cold("import visualization"),
+                   "scipy.stats + pyplot + seaborn": cold("import scipy.stats, matplotlib.pyplot, seaborn"),
+                   "first result (CSV)": cold(first_result.format(path=path))}
+        column_cache.build(path)
+        timings["first result (column cache)"] = cold(first_result.format(path=path))
+    for label, seconds in timings.items():
+        print(f"{label:>30}: {seconds:.2f}s")
+
+def bench_metrics(rows=2_000_000):
+    """Every metric of metrics.METRICS computed with one scan per metric vs run_metrics' single planned pass."""
+    from features import add_derived_features
+    from metrics import METRICS, metric_result, plan, run_metrics
+
+    df = add_derived_features(synthetic_frame(rows))
+
+    start = time.perf_counter()
+    separate = {name: metric_result(name, df) for name in METRICS}
+    separate_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = run_metrics(df)
+    batched_time = time.perf_counter() - start
+
+    for name in METRICS:
+        assert batched[name].stats.equals(separate[name].stats), name
+    print(f"{rows} rows, {len(METRICS)} metrics over {len(plan())} (dimension, value) pairs")
+    print(f"one scan per metric: {separate_time:>8.3f}s")
+    print(f"single pass:         {batched_time:>8.3f}s ({separate_time / batched_time:.1f}x)")
+
+BENCHMARKS = {
+    "fetch": bench_fetch_concurrency,
+    "sync": bench_incremental_sync,
+    "ingest": bench_batch_ingest,
+    "store": bench_game_store_memory,
+    "pgn": bench_pgn_parser,
+    "preprocess": bench_preprocess_scaling,
+    "parquet": bench_parquet_vs_csv,
+    "incremental": bench_incremental_preprocess,
+    "features": bench_derived_features,
+    "aggregates": bench_aggregates,
+    "out_of_core": bench_out_of_core,
+    "live": bench_live_stats,
+    "sqlite": bench_sqlite_queries,
+    "cache": bench_result_cache,
+    "render": bench_render_figures,
+    "feed": bench_site_feed,
+    "rating": bench_rating_progression,
+    "compact": bench_compact_schema,
+    "openings": bench_opening_index,
+    "resampling": bench_resampling,
+    "replay": bench_replay,
+    "clocks": bench_clocks,
+    "tree": bench_opening_tree,
+    "cold_start": bench_cold_start,
+    "metrics": bench_metrics,
+}
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print(f"== {name} ==")
+        BENCHMARKS[name]()
@@ -0,0 +1,299 @@
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from pgn_parser import HEADER_END_RE
+
+# Chess.com writes the mover's remaining time after every move as {[%clk H:MM:SS.s]}
+CLOCK_TAG = b"%clk "
+MAX_HOUR_DIGITS = 3
+MAX_MOVE_NUMBER_DIGITS = 4
+CLOCK_PADDING = 16
+MOVETEXT_START_RE = re.compile(HEADER_END_RE.pattern.encode())
+TIME_CONTROL_RE = re.compile(r"^(\d+)(?:\+(\d+(?:\.\d+)?))?$")
+
+# Game phases by ply: moves 1-10, 11-30 and the rest
+PHASE_BINS = [0, 20, 60, np.inf]
+PHASE_LABELS = ["Opening", "Middlegame", "Endgame"]
+
+def clocks_path(output_file):
+    """The move clocks preprocess_games keeps next to an output, e.g. cleaned_games.parquet.clocks.npz."""
+    return output_file.rstrip("/\\") + ".clocks.npz"
+
+def parse_time_control(time_control):
+    """Base time and increment in seconds of a TimeControl header such as "600" or "180+2"; NaN if unknown."""
+    match = TIME_CONTROL_RE.match(time_control or "")
+    if not match:
+        return np.nan, np.nan
+    return float(match.group(1)), float(match.group(2) or 0)
+
+def byte_table(chars):
+    """Lookup table marking the given bytes, for classifying a whole buffer with one indexing."""
+    table = np.zeros(256, dtype=bool)
+    table[list(chars)] = True
+    return table
+
+DIGITS = byte_table(b"0123456789")
+# The first byte of a SAN move: a piece, a pawn's file or castling
+SAN_START = byte_table(b"abcdefghNBRQKO")
+MOVE_START = DIGITS | SAN_START
+NUMBER_NEXT = byte_table(b".0123456789")
+
+def movetext_start(encoded):
+    """Byte offset of the movetext of an encoded PGN, as pgn_parser.split_pgn splits it."""
+    if b"\r" in encoded:
+        match = MOVETEXT_START_RE.search(encoded)
+        position = match.end() if match else -1
+    else:
+        position = encoded.find(b"\n\n")
+        position = position + 2 if position >= 0 else -1
+    if position < 0:
+        return len(encoded) if encoded.lstrip().startswith(b"[") else 0
+    return position
+
+def clock_plies(data, game_starts, text_starts, clocks):
+    """
+    The 0-based ply of the move each clock (the byte position of a "%clk " tag) follows, read from the
+    SAN move numbers like pgn_parser.BLACK_FIRST_RE: a move after "N." is ply 2 * (N - 1), after "N..."
+    ply 2 * (N - 1) + 1, and every further move before the next number adds one ply. Each PGN in the
+    bytes `data` starts after a newline, at `game_starts`. Tag sections, comments and variations are
+    skipped; clocks inside a variation or without a numbered move before them in their game are -1.
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    # Tokens start after whitespace; keep the game starts and those that may be move numbers or moves
+    tokens = np.flatnonzero(buf[:-CLOCK_PADDING] <= ord(" ")) + 1
+    is_start = np.zeros(len(tokens), dtype=bool)
+    is_start[np.searchsorted(tokens, game_starts)] = True
+    first = buf[tokens]
+    keep = MOVE_START[first] | is_start
+    tokens, first, is_start = tokens[keep], first[keep], is_start[keep]
+    # Move numbers: digits followed by "." (White's move) or "..." (Black's), maybe with the move attached
+    is_number = DIGITS[first]
+    is_number[is_number] = NUMBER_NEXT[buf[tokens[is_number] + 1]]
+    numbers = tokens[is_number]
+    value = (first[is_number] - np.uint8(ord("0"))).astype(np.int64)
+    end = numbers + 1
+    more = np.ones(len(numbers), dtype=bool)
+    for _ in range(MAX_MOVE_NUMBER_DIGITS - 1):
+        digit = buf[end] - np.uint8(ord("0"))
+        more &= digit <= 9
+        value = np.where(more, value * 10 + digit, value)
+        end += more
+    black = (buf[end + 1] == ord(".")) & (buf[end + 2] == ord("."))
+    is_numbered = buf[end] == ord(".")
+    number_ply = np.full(len(tokens), -1, dtype=np.int64)
+    number_ply[is_number] = np.where(is_numbered, 2 * (value - 1) + black, -1)
+    attached = np.zeros(len(tokens), dtype=bool)
+    attached[is_number] = is_numbered & SAN_START[buf[end + 1 + 2 * black]]
+    is_number[is_number] = is_numbered
+    is_move = SAN_START[first]
+
+    # A position is in a tag section or comment if the last of these bounds before it opens one
+    brace_opens, brace_closes = np.flatnonzero(buf == ord("{")), np.flatnonzero(buf == ord("}"))
+    bounds = np.concatenate([game_starts, text_starts, brace_opens, brace_closes])
+    opens = np.repeat([True, False, True, False], [len(game_starts), len(text_starts), len(brace_opens), len(brace_closes)])
+    order = np.argsort(bounds, kind="stable")
+    bounds, opens = bounds[order], opens[order]
+    candidates = np.flatnonzero(is_number | is_move)
+    skipped = candidates[opens[np.searchsorted(bounds, tokens[candidates], side="right") - 1]]
+
+    # Variation depth, from the parentheses outside tag sections and comments
+    in_variation = np.zeros(len(clocks), dtype=bool)
+    if b"(" in data:
+        parens = np.flatnonzero((buf == ord("(")) | (buf == ord(")")))
+        parens = parens[~opens[np.searchsorted(bounds, parens, side="right") - 1]]
+        depths = np.append(np.cumsum(np.where(buf[parens] == ord("("), 1, -1)), 0)
+        skipped = np.union1d(skipped, candidates[depths[np.searchsorted(parens, tokens[candidates], side="right") - 1] > 0])
+        in_variation = depths[np.searchsorted(parens, clocks, side="right") - 1] > 0
+    is_number[skipped] = is_move[skipped] = False
+
+    # Number each game's moves from the last move number (or game start) before them
+    kept = np.flatnonzero(is_start | is_number | is_move)
+    index = np.arange(len(kept))
+    is_marker = is_start[kept] | is_number[kept]
+    marker = np.maximum.accumulate(np.where(is_marker, index, 0))
+    attached, number_ply = attached[kept] & is_number[kept], np.where(is_number[kept], number_ply[kept], -1)
+    plies = number_ply[marker] + attached[marker] + index - marker - 1
+    plies[(number_ply[marker] < 0) | (is_marker & ~attached)] = -1
+
+    # Each clock follows the last move (or, with none, the move number or game start) before it
+    move = np.searchsorted(tokens[kept], clocks, side="right") - 1
+    return np.where(in_variation, -1, np.append(plies, -1)[move])
+
+def parse_clocks(pgns):
+    """
+    Seconds of every [%clk] comment of many PGNs, as a float32 array in move order, the ply of the move
+    each clock follows (see clock_plies) and the number of clocks of each PGN. The PGNs are scanned as
+    one byte buffer with numpy instead of a regex match per comment: every "%clk " tag is located, then
+    the digits at fixed offsets from the colons are read for all tags at once. Fractions are kept to a
+    tenth of a second, as Chess.com writes them; malformed clocks are NaN. Clocks that follow no move
+    are dropped.
+    """
+    encoded = [pgn.encode() for pgn in pgns]
+    lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+    game_starts = np.cumsum(lengths + 1) - lengths
+    text_starts = game_starts + np.fromiter(map(movetext_start, encoded), dtype=np.int64, count=len(encoded))
+    # Newlines separate the PGNs; the padding keeps reads past a clock at the very end in bounds
+    data = b"\n".join([b"", *encoded, bytes(CLOCK_PADDING)])
+    buf = np.frombuffer(data, dtype=np.uint8)
+    starts = np.flatnonzero(buf == CLOCK_TAG[0])
+    for i in range(1, len(CLOCK_TAG)):
+        starts = starts[buf[starts + i] == CLOCK_TAG[i]]
+    plies = clock_plies(data, game_starts, text_starts, starts)
+    starts, plies = starts[plies >= 0], plies[plies >= 0]
+    counts = np.bincount(np.searchsorted(game_starts, starts, side="right") - 1, minlength=len(pgns))
+    starts += len(CLOCK_TAG)
+
+    def digits(offsets):
+        # Non-digit bytes wrap around to values above 9
+        values = buf[offsets] - np.uint8(ord("0"))
+        return values, values <= 9
+
+    hours, valid = digits(starts)
+    hours = hours.astype(np.float64)
+    colon = starts + 1
+    more = valid.copy()
+    for _ in range(MAX_HOUR_DIGITS - 1):
+        values, is_digit = digits(colon)
+        more &= is_digit
+        hours = np.where(more, hours * 10 + values, hours)
+        colon += more
+    (m1, ok1), (m2, ok2) = digits(colon + 1), digits(colon + 2)
+    (s1, ok3), (s2, ok4) = digits(colon + 4), digits(colon + 5)
+    tenth, ok5 = digits(colon + 7)
+    valid &= (buf[colon] == ord(":")) & (buf[colon + 3] == ord(":")) & ok1 & ok2 & ok3 & ok4
+    tenths = np.where((buf[colon + 6] == ord(".")) & ok5, tenth, 0)
+    seconds = hours * 3600 + (m1.astype(np.int16) * 10 + m2) * 60 + ((s1.astype(np.int16) * 10 + s2) * 10 + tenths) / 10
+    seconds[~valid] = np.nan
+    return seconds.astype(np.float32), plies.astype(np.int16), counts
+
+class MoveTimes:
+    """
+    Clock data of many games as flat arrays: `clocks` holds the remaining time in seconds (float32)
+    after every clocked move and `plies` its 0-based ply (even plies are White's), the moves of game i
+    being clocks[offsets[i]:offsets[i + 1]]. Per game, `color` is the player's color (0 white, 1 black)
+    and `base` and `increment` come from the time control.
+    """
+
+    def __init__(self, clocks, plies, offsets, color, base, increment):
+        self.clocks = np.asarray(clocks, dtype=np.float32)
+        self.plies = np.asarray(plies, dtype=np.int16)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.color = np.asarray(color, dtype=np.int8)
+        self.base = np.asarray(base, dtype=np.float32)
+        self.increment = np.asarray(increment, dtype=np.float32)
+
+    @classmethod
+    def from_pgns(cls, pgns, color, time_controls):
+        """Builds the arrays from the PGNs of many games (see parse_clocks) and their TimeControl headers."""
+        clocks, plies, counts = parse_clocks(pgns)
+        controls = np.array([parse_time_control(control) for control in time_controls], dtype=np.float64).reshape(-1, 2)
+        return cls(clocks, plies, np.concatenate([[0], np.cumsum(counts)]), color, controls[:, 0], controls[:, 1])
+
+    @classmethod
+    def concat(cls, parts):
+        parts = [part for part in parts if part is not None]
+        if not parts:
+            return cls.empty()
+        offsets = [parts[0].offsets]
+        for part in parts[1:]:
+            offsets.append(part.offsets[1:] + offsets[-1][-1])
+        return cls(np.concatenate([part.clocks for part in parts]), np.concatenate([part.plies for part in parts]),
+                   np.concatenate(offsets), np.concatenate([part.color for part in parts]),
+                   np.concatenate([part.base for part in parts]), np.concatenate([part.increment for part in parts]))
+
+    @classmethod
+    def empty(cls):
+        return cls([], [], [0], [], [], [])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def counts(self):
+        """Number of clocked moves of each game."""
+        return np.diff(self.offsets)
+
+    def game_index(self):
+        """The game of every clocked move."""
+        return np.repeat(np.arange(len(self)), self.counts())
+
+    def spent(self):
+        """
+        Seconds spent on every clocked move: the mover's previous clock, two plies earlier (the base time
+        for each side's first move), plus the increment minus the clock after the move, clipped at 0.
+        NaN without a time control, or when the mover's previous move has no clock (a missing comment,
+        or a game set up from a position).
+        """
+        counts = self.counts()
+        # Look up each move's ply - 2 in the same game by a (game, ply) key
+        keys = self.game_index() * (1 << 16) + self.plies
+        order = np.argsort(keys, kind="stable")
+        found = order[np.minimum(np.searchsorted(keys, keys - 2, sorter=order), len(keys) - 1)]
+        previous = np.where(keys[found] == keys - 2, self.clocks[found], np.float32(np.nan))
+        first = self.plies < 2
+        previous[first] = np.repeat(self.base, counts)[first]
+        spent = previous + np.repeat(self.increment, counts) - self.clocks
+        return np.maximum(spent, 0, where=~np.isnan(spent), out=spent)
+
+    def own_moves(self):
+        """Mask of the moves played by the player rather than the opponent."""
+        return (self.plies % 2) == np.repeat(self.color, self.counts())
+
+    def save(self, path):
+        """Writes the arrays to an .npz file, atomically."""
+        temp_path = path + ".tmp.npz"
+        np.savez(temp_path, clocks=self.clocks, plies=self.plies, offsets=self.offsets, color=self.color,
+                 base=self.base, increment=self.increment)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["clocks"], data["plies"], data["offsets"], data["color"], data["base"], data["increment"])
+
+def phase_codes(times):
+    """The PHASE_LABELS index of every clocked move."""
+    return np.digitize(times.plies, PHASE_BINS[1:-1])
+
+def think_time_by_phase(times, own=True):
+    """
+    Mean seconds spent per move in each phase (PHASE_LABELS) over the player's moves, or the
+    opponents' with own=False, with the number of moves each mean covers.
+    """
+    spent = times.spent()
+    mask = (times.own_moves() == own) & ~np.isnan(spent)
+    phases = phase_codes(times)[mask]
+    n = np.bincount(phases, minlength=len(PHASE_LABELS))
+    total = np.bincount(phases, weights=spent[mask], minlength=len(PHASE_LABELS))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return pd.DataFrame({"moves": n, "mean_seconds": total / n}, index=pd.Index(PHASE_LABELS, name="phase"))
+
+def time_trouble(times, threshold=30.0, own=True):
+    """
+    Whether the player (or the opponent, with own=False) was ever down to `threshold` seconds or less
+    in each game, as a boolean array per game; games without clocks count as False.
+    """
+    mask = (times.own_moves() == own) & (times.clocks <= threshold)
+    return np.bincount(times.game_index()[mask], minlength=len(times)) > 0
+
+def time_trouble_frequency(times, threshold=30.0):
+    """
+    How often time trouble (a clock at or below `threshold` seconds) happens: the share of clocked
+    games in which the player and the opponent got into it, and the share of the player's moves and
+    of each phase's moves played in it.
+    """
+    clocked = times.counts() > 0
+    own = times.own_moves()
+    trouble = own & (times.clocks <= threshold)
+    phases = phase_codes(times)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        by_phase = np.bincount(phases[trouble], minlength=len(PHASE_LABELS)) / np.bincount(phases[own], minlength=len(PHASE_LABELS))
+    return {
+        "games": int(clocked.sum()),
+        "player_games": float(time_trouble(times, threshold)[clocked].mean()) if clocked.any() else np.nan,
+        "opponent_games": float(time_trouble(times, threshold, own=False)[clocked].mean()) if clocked.any() else np.nan,
+        "player_moves": float(trouble.sum() / own.sum()) if own.any() else np.nan,
+        "player_moves_by_phase": pd.Series(by_phase, index=pd.Index(PHASE_LABELS, name="phase")),
+    }
@@ -0,0 +1,165 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from result_cache import dataset_fingerprint
+
+CACHE_VERSION = 1
+
+def cache_path(file_path):
+    """The column cache of a dataset, e.g. cleaned_games.parquet.columns/."""
+    return file_path.rstrip("/\\") + ".columns"
+
+def read_meta(file_path):
+    try:
+        with open(os.path.join(cache_path(file_path), "meta.json"), "r") as file:
+            meta = json.load(file)
+    except (OSError, json.JSONDecodeError):
+        return None
+    return meta if meta.get("version") == CACHE_VERSION else None
+
+def is_fresh(file_path, meta=None):
+    """Whether the cache of `file_path` exists and was written for the dataset as it is now."""
+    meta = meta or read_meta(file_path)
+    return meta is not None and os.path.exists(file_path) and meta["fingerprint"] == dataset_fingerprint(file_path)
+
+def code_dtype(categories):
+    """The dtype pandas uses for the codes of a categorical with these categories."""
+    return pd.Categorical.from_codes([], categories=categories).codes.dtype
+
+def encode_column(series, categories=None):
+    """
+    Splits a column into flat arrays and the metadata that rebuilds it: codes for categoricals (and
+    labels of any other non-numeric dtype), values and a missing mask for nullable integers,
+    integer ticks for datetimes and the values themselves for plain numpy columns. `categories` are
+    those already in the cache; new ones are added after them, so existing codes stay valid.
+    """
+    dtype = series.dtype
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return {"kind": "datetime", "dtype": str(dtype)}, {"values": series.to_numpy().view(np.int64)}
+    if isinstance(dtype, pd.api.extensions.ExtensionDtype) and pd.api.types.is_numeric_dtype(dtype) \
+            and not isinstance(dtype, pd.CategoricalDtype):
+        array = series.array
+        return {"kind": "masked", "dtype": str(dtype)}, {"values": array.to_numpy(dtype=dtype.numpy_dtype, na_value=0),
+                                                          "mask": np.asarray(array.isna())}
+    if pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_bool_dtype(dtype):
+        return {"kind": "numpy"}, {"values": series.to_numpy()}
+    labels = series.astype("category") if not isinstance(dtype, pd.CategoricalDtype) else series
+    known = list(categories or [])
+    known_set = set(known)
+    merged = known + [category for category in labels.cat.categories.tolist() if category not in known_set]
+    codes = pd.Categorical(labels, categories=merged).codes
+    return {"kind": "category", "categories": merged}, {"codes": codes.astype(code_dtype(merged), copy=False)}
+
+def open_array(path, dtype, rows):
+    """A read-only view of a column file as a numpy.memmap, in copy-on-write mode: writes stay in memory."""
+    if rows == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="c", shape=(rows,))
+
+def decode_column(directory, name, info, rows):
+    """Rebuilds a column from its memory-mapped files without copying them."""
+    arrays = {part: open_array(os.path.join(directory, f"{name}.{part}.bin"), dtype, rows)
+              for part, dtype in info["arrays"].items()}
+    kind = info["kind"]
+    if kind == "category":
+        values = pd.Categorical.from_codes(arrays["codes"], categories=info["categories"], validate=False)
+    elif kind == "masked":
+        array_type = pd.api.types.pandas_dtype(info["dtype"]).construct_array_type()
+        values = array_type(arrays["values"], arrays["mask"], copy=False)
+    elif kind == "datetime":
+        values = arrays["values"].view(info["dtype"])
+    else:
+        values = arrays["values"]
+    return pd.Series(values, name=name, copy=False)
+
+def load(file_path, columns=None):
+    """
+    The cleaned games of `file_path` from its column cache, each column backed by a numpy.memmap of
+    its file, so nothing is parsed or copied and pages are read only when touched. Returns None when
+    there is no cache, the dataset changed since it was written or the cache cannot be read.
+    """
+    meta = read_meta(file_path)
+    if not is_fresh(file_path, meta):
+        return None
+    names = columns or list(meta["columns"])
+    if any(name not in meta["columns"] for name in names):
+        return None
+    directory = cache_path(file_path)
+    try:
+        return pd.DataFrame({name: decode_column(directory, name, meta["columns"][name], meta["rows"]) for name in names},
+                            copy=False)
+    except (OSError, KeyError, TypeError, ValueError):
+        return None
+
+def replace_file(path, values):
+    """Writes an array to `path` through a new file, so memory maps of the old one stay valid."""
+    temp_path = path + ".tmp"
+    np.ascontiguousarray(values).tofile(temp_path)
+    os.replace(temp_path, path)
+
+def write(file_path, df, append=False):
+    """
+    Writes the column cache of the dataset `file_path` (call it after the dataset itself) from the
+    cleaned frame `df`. With `append`, the rows of `df` are added to the end of every column file
+    (check is_fresh before writing the dataset: the cache must hold exactly the rows written before);
+    a categorical whose codes need a wider dtype is rewritten, and a cache with other columns is
+    rebuilt from the whole dataset. The metadata is replaced last, so a failed write leaves a cache
+    that is_fresh rejects.
+    """
+    directory = cache_path(file_path)
+    meta = read_meta(file_path) if append else None
+    if append and (meta is None or set(meta["columns"]) != set(df.columns)):
+        return build(file_path)
+    os.makedirs(directory, exist_ok=True)
+    if meta is None:
+        # Without metadata no reader opens the files while they are replaced
+        if os.path.exists(os.path.join(directory, "meta.json")):
+            os.remove(os.path.join(directory, "meta.json"))
+    else:
+        df = df[list(meta["columns"])]
+    rows = meta["rows"] if meta else 0
+    columns = {}
+    for name in df.columns:
+        old = meta["columns"][name] if meta else None
+        info, arrays = encode_column(df[name], old.get("categories") if old else None)
+        if old and old["kind"] == "category" and old["arrays"]["codes"] != arrays["codes"].dtype.str:
+            # More categories than the old code dtype holds: widen the existing codes first
+            path = os.path.join(directory, f"{name}.codes.bin")
+            replace_file(path, np.fromfile(path, dtype=old["arrays"]["codes"])[:rows].astype(arrays["codes"].dtype))
+        for part, values in arrays.items():
+            path = os.path.join(directory, f"{name}.{part}.bin")
+            if meta:
+                # Drops anything past the rows in the metadata, left by a write that did not finish;
+                # readers map at most those rows, so appending in place is safe
+                os.truncate(path, rows * values.dtype.itemsize)
+                with open(path, "ab") as file:
+                    file.write(np.ascontiguousarray(values).tobytes())
+            else:
+                replace_file(path, values)
+        info["arrays"] = {part: values.dtype.str for part, values in arrays.items()}
+        columns[name] = info
+
+    meta = {"version": CACHE_VERSION, "rows": rows + len(df), "fingerprint": dataset_fingerprint(file_path),
+            "columns": columns}
+    temp_path = os.path.join(directory, "meta.json.tmp")
+    with open(temp_path, "w") as file:
+        json.dump(meta, file)
+    os.replace(temp_path, os.path.join(directory, "meta.json"))
+
+def build(file_path):
+    """(Re)builds the column cache of a dataset by loading it once with analysis.load_data."""
+    from analysis import load_data
+
+    # The month partition column of a Parquet dataset is not one of the cleaned columns
+    write(file_path, load_data(file_path).drop(columns="month", errors="ignore"))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the memory-mapped column cache of a cleaned dataset.")
+    parser.add_argument("file_path", nargs="?", default="cleaned_games.parquet")
+    args = parser.parse_args()
+    build(args.file_path)
+    print(f"Column cache written to {cache_path(args.file_path)}.")
@@ -1,44 +1,271 @@
 import requests
 import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from requests.adapters import HTTPAdapter
 
-def fetch_all_games(username, output_file="all_chess_games.json"):
+from game_store import write_games
+
+API_BASE = "https://api.chess.com/pub"
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# How long after the end of its month (UTC) an archive may still receive games, e.g. games that
+# ended around midnight
+ARCHIVE_GRACE = timedelta(days=1)
+
+def make_session(pool_size=8):
+    """
+    Creates a requests session whose connection pool can hold `pool_size` keep-alive connections.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(HEADERS)
+    return session
+
+def get_with_backoff(session, url, max_retries=5, backoff=0.5, limiter=None, **kwargs):
+    """
+    GETs `url`, retrying on 429 and 5xx responses with exponential backoff.
+    A Retry-After header from the server takes precedence over the computed delay.
+    If a `limiter` is given, every attempt first takes a token from it.
+    """
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        response = session.get(url, **kwargs)
+        if response.status_code not in RETRY_STATUSES or attempt == max_retries:
+            break
+        retry_after = response.headers.get("Retry-After")
+        try:
+            delay = float(retry_after)
+        except (TypeError, ValueError):
+            delay = backoff * (2 ** attempt)
+        time.sleep(delay)
+    response.raise_for_status()
+    return response
+
+def fetch_archive_games(session, archive_url, max_retries=5):
+    """Fetches the list of games stored in a single monthly archive."""
+    print(f"Fetching games from {archive_url}...")
+    archive_response = get_with_backoff(session, archive_url, max_retries=max_retries)
+    return archive_response.json().get("games", [])
+
+def archive_cache_path(cache_dir, archive_url):
+    """Maps an archive URL such as .../player/<user>/games/2023/05 to <cache_dir>/<user>_2023_05.json."""
+    match = re.search(r"/player/([^/]+)/games/(\d{4})/(\d{2})$", archive_url)
+    if match:
+        name = "_".join(match.groups())
+    else:
+        name = re.sub(r"[^A-Za-z0-9]+", "_", archive_url).strip("_")
+    return os.path.join(cache_dir, f"{name.lower()}.json")
+
+def archive_month_end(archive_url):
+    """The UTC start of the month after an archive's month, or None for a URL without a year and month."""
+    match = re.search(r"/games/(\d{4})/(\d{2})$", archive_url)
+    if not match:
+        return None
+    year, month = int(match.group(1)), int(match.group(2))
+    return datetime(year + month // 12, month % 12 + 1, 1, tzinfo=timezone.utc)
+
+def archive_complete(entry, archive_url):
+    """
+    Whether a cached archive was fetched after its month was over, so that no game can have been added
+    to it since. Entries without a fetch time (written before it was recorded) count as incomplete.
+    """
+    month_end = archive_month_end(archive_url)
+    fetched_at = entry.get("fetched_at")
+    if month_end is None or fetched_at is None:
+        return False
+    return fetched_at >= (month_end + ARCHIVE_GRACE).timestamp()
+
+def load_cached_archive(cache_dir, archive_url):
+    """Returns the cached entry for an archive, or None if it has not been fetched before."""
+    path = archive_cache_path(cache_dir, archive_url)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as file:
+            return json.load(file)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def save_cached_archive(cache_dir, archive_url, entry):
+    """Writes an archive entry atomically so an interrupted run never leaves a truncated cache file."""
+    path = archive_cache_path(cache_dir, archive_url)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(entry, file)
+    os.replace(tmp_path, path)
+
+def fetch_archive_cached(session, archive_url, cache_dir, revalidate=True, max_retries=5, limiter=None, verbose=True):
+    """
+    Returns the games of an archive, using the on-disk cache where possible.
+
+    Cached archives fetched after their month was over are returned without a request unless
+    `revalidate` is set; any other cached archive (the current month, or a month cached before it
+    ended) is revalidated. Revalidation sends If-None-Match/If-Modified-Since with the stored
+    validators, so an unchanged archive costs a 304. Each entry records when it was last fetched.
+    """
+    cached = load_cached_archive(cache_dir, archive_url)
+    if cached is not None and not revalidate and archive_complete(cached, archive_url):
+        return cached["games"]
+
+    headers = {}
+    if cached is not None:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    if verbose:
+        print(f"Fetching games from {archive_url}...")
+    fetched_at = time.time()
+    response = get_with_backoff(session, archive_url, max_retries=max_retries, limiter=limiter, headers=headers)
+    if response.status_code == 304 and cached is not None:
+        # Unchanged, but known to be complete once revalidated after its month
+        if not archive_complete(cached, archive_url):
+            cached["fetched_at"] = fetched_at
+            save_cached_archive(cache_dir, archive_url, cached)
+        return cached["games"]
+
+    entry = {
+        "url": archive_url,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "fetched_at": fetched_at,
+        "games": response.json().get("games", []),
+    }
+    save_cached_archive(cache_dir, archive_url, entry)
+    return entry["games"]
+
+def merge_games(archive_games):
+    """Yields the games of per-archive game lists in order, dropping games seen in an earlier archive."""
+    seen = set()
+    for games in archive_games:
+        for game in games:
+            key = game.get("url") or game.get("uuid")
+            if key is not None:
+                if key in seen:
+                    continue
+                seen.add(key)
+            yield game
+
+def save_games(output_file, games, return_games=True):
+    """
+    Writes games to `output_file` as they are produced and returns them as a list, or only their
+    number if `return_games` is False so a JSONL store can be written without holding every game.
+    """
+    if not return_games:
+        return write_games(output_file, games)
+    all_games = []
+
+    def collect():
+        for game in games:
+            all_games.append(game)
+            yield game
+
+    write_games(output_file, collect())
+    return all_games
+
+def fetch_all_games(username, output_file="all_chess_games.json", concurrency=1, max_retries=5, api_base=API_BASE,
+                    return_games=True):
     """
     Fetches all available chess games for the specified username from Chess.com API.
-    
+
     Args:
         username (str): Chess.com username.
-        output_file (str): Path to save the fetched games as a JSON file.
-    
+        output_file (str): Path to save the fetched games. A .jsonl, .jsonl.gz or .jsonl.zst path is a
+            streaming game store appended to as each archive arrives; anything else is a JSON array.
+        concurrency (int): Number of archives downloaded in parallel. 1 fetches them one after another.
+        max_retries (int): Retries per request on 429/5xx responses.
+        api_base (str): Root of the API, e.g. a local stub server for benchmarking.
+        return_games (bool): Return the games. If False, only their number is returned.
+
     Returns:
-        list: List of all games fetched from the API.
+        list: List of all games fetched from the API (the number of games if return_games is False).
     """
-    base_url = f"https://api.chess.com/pub/player/{username}/games/archives"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
+    base_url = f"{api_base}/player/{username}/games/archives"
+    session = make_session(pool_size=max(concurrency, 1))
 
     try:
         # Fetch the list of archives
-        response = requests.get(base_url, headers=headers)
-        response.raise_for_status()  # Check for errors
+        response = get_with_backoff(session, base_url, max_retries=max_retries)
         archives = response.json().get("archives", [])
-        
-        all_games = []
+
         print(f"Found {len(archives)} archives for {username}. Fetching games...")
 
-        # Fetch games from each archive
-        for archive_url in archives:
-            print(f"Fetching games from {archive_url}...")
-            archive_response = requests.get(archive_url, headers=headers)
-            archive_response.raise_for_status()
-            games = archive_response.json().get("games", [])
-            all_games.extend(games)  # Add games to the main list
+        # Fetch games from each archive and save them in archive order as they arrive
+        with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+            if concurrency > 1:
+                results = executor.map(lambda url: fetch_archive_games(session, url, max_retries), archives)
+            else:
+                results = (fetch_archive_games(session, archive_url, max_retries) for archive_url in archives)
+            all_games = save_games(output_file, (game for games in results for game in games), return_games)
+
+        count = len(all_games) if return_games else all_games
+        print(f"Fetched {count} games in total. Saved to {output_file}.")
+        return all_games
+    except requests.exceptions.HTTPError as http_err:
+        print(f"HTTP error occurred: {http_err}")
+    except requests.exceptions.RequestException as req_err:
+        print(f"Request error occurred: {req_err}")
+    except json.JSONDecodeError:
+        print("Error decoding the JSON response.")
+    finally:
+        session.close()
+    return [] if return_games else 0
+
+def sync_games(username, output_file="all_chess_games.jsonl", cache_dir="archive_cache", concurrency=1,
+               revalidate_all=False, max_retries=5, api_base=API_BASE, return_games=True):
+    """
+    Incrementally syncs the games of `username` through a per-archive on-disk cache.
+
+    Past monthly archives never change once their month is over, so only archives missing from the
+    cache and archives last fetched before their month ended (the current month, or one cached
+    mid-month by an earlier sync) are requested; the latter with a conditional request. Set
+    `revalidate_all` to conditionally re-request every cached archive instead.
+
+    Args:
+        username (str): Chess.com username.
+        output_file (str): Path to save the merged games, as a JSONL game store or a JSON array.
+        cache_dir (str): Directory holding one JSON file per archive with its games and validators.
+        concurrency (int): Number of archives requested in parallel.
+        revalidate_all (bool): Revalidate every cached archive, not just those that may be incomplete.
+        max_retries (int): Retries per request on 429/5xx responses.
+        api_base (str): Root of the API.
+        return_games (bool): Return the games. If False, only their number is returned.
+
+    Returns:
+        list: List of all games for the user, merged from the cache and new downloads
+        (the number of games if return_games is False).
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    base_url = f"{api_base}/player/{username}/games/archives"
+    session = make_session(pool_size=max(concurrency, 1))
 
-        # Save all games to a JSON file
-        with open(output_file, "w") as file:
-            json.dump(all_games, file, indent=4)
+    try:
+        response = get_with_backoff(session, base_url, max_retries=max_retries)
+        archives = response.json().get("archives", [])
+        print(f"Found {len(archives)} archives for {username}. Syncing games...")
 
-        print(f"Fetched {len(all_games)} games in total. Saved to {output_file}.")
+        def sync_archive(index):
+            return fetch_archive_cached(session, archives[index], cache_dir, revalidate_all, max_retries)
+
+        with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+            if concurrency > 1:
+                archive_games = executor.map(sync_archive, range(len(archives)))
+            else:
+                archive_games = (sync_archive(index) for index in range(len(archives)))
+            all_games = save_games(output_file, merge_games(archive_games), return_games)
+
+        count = len(all_games) if return_games else all_games
+        print(f"Synced {count} games in total. Saved to {output_file}.")
         return all_games
     except requests.exceptions.HTTPError as http_err:
         print(f"HTTP error occurred: {http_err}")
@@ -46,11 +273,13 @@ def fetch_all_games(username, output_file="all_chess_games.json"):
         print(f"Request error occurred: {req_err}")
     except json.JSONDecodeError:
         print("Error decoding the JSON response.")
-    return []
+    finally:
+        session.close()
+    return [] if return_games else 0
 
 if __name__ == "__main__":
     username = "ardaylmaz"
-    
-    # Fetch all games and save to a JSON file
-    games = fetch_all_games(username)
-    print(f"Fetched {len(games)} games for user {username}.")
+
+    # Sync all games through the archive cache into the streaming game store
+    count = sync_games(username, concurrency=8, return_games=False)
+    print(f"Fetched {count} games for user {username}.")
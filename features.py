@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+# Score of a result from the player's point of view: wins count 1, draws by agreement 0.5, anything else 0
+RESULT_SCORES = {"win": 1.0, "agreed": 0.5}
+
+DERIVED_COLUMNS = ["score", "is_win", "my_elo", "opp_elo", "elo_diff"]
+
+def elo_array(df, column):
+    """An Elo column as a float64 array with NaN for missing ratings, whatever its dtype."""
+    return pd.to_numeric(df[column], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+
+def add_derived_features(df):
+    """
+    Adds the columns every analysis needs, computed once with vectorized operations:
+
+    - score: 1 for a win, 0.5 for a draw by agreement, 0 otherwise
+    - is_win: 1 for a win, 0 otherwise
+    - my_elo / opp_elo: the player's and the opponent's rating, picked by `color`
+    - elo_diff: my_elo - opp_elo
+
+    The columns are stored on the frame itself, so later calls on the same frame (or on slices of it)
+    return immediately. Returns the frame.
+    """
+    if all(name in df.columns for name in DERIVED_COLUMNS):
+        return df
+
+    result = df["result"]
+    # Mapping a categorical only touches its categories, not every row
+    df["score"] = result.map(RESULT_SCORES).astype("float64").fillna(0.0).to_numpy()
+    df["is_win"] = (result == "win").to_numpy(dtype="int8")
+
+    if "white_elo" in df.columns and "black_elo" in df.columns:
+        is_white = (df["color"] == "white").to_numpy()
+        white_elo = elo_array(df, "white_elo")
+        black_elo = elo_array(df, "black_elo")
+        df["my_elo"] = np.where(is_white, white_elo, black_elo)
+        df["opp_elo"] = np.where(is_white, black_elo, white_elo)
+        df["elo_diff"] = df["my_elo"] - df["opp_elo"]
+    return df
@@ -0,0 +1,181 @@
+import os
+import sqlite3
+
+import pandas as pd
+
+from aggregates import CASTLING_TYPES, ELO_DIFF_LABELS, SORTED_DIMENSIONS, TIME_OF_DAY_LABELS
+from features import DERIVED_COLUMNS, add_derived_features
+from schema import to_typed_frame
+
+TABLE = "games"
+
+# Columns of the games table: the cleaned columns (typed as in schema.to_typed_frame, with `time`
+# as "YYYY-MM-DD HH:MM:SS" text so that it sorts and compares as a date), the derived features and,
+# for datasets preprocessed with replay, the replay features
+DB_COLUMNS = {
+    "result": "TEXT", "color": "TEXT", "opening": "TEXT", "opening_id": "INTEGER", "family_id": "INTEGER", "time": "TEXT",
+    "game_duration": "INTEGER", "move_count": "INTEGER", "castle": "TEXT", "opponent_castle": "TEXT", "white_elo": "INTEGER",
+    "black_elo": "INTEGER", "score": "REAL", "is_win": "INTEGER", "my_elo": "REAL", "opp_elo": "REAL",
+    "elo_diff": "REAL", "castle_ply": "INTEGER", "opponent_castle_ply": "INTEGER", "queen_trade_ply": "INTEGER",
+    "material_diff_20": "INTEGER", "final_material_diff": "INTEGER",
+}
+CLEANED_COLUMNS = list(DB_COLUMNS)[:12]
+
+INDEXES = {
+    "idx_games_time": ["time"],
+    # Also covers the opening statistics of a color over a time range, without touching the table
+    "idx_games_color_time": ["color", "time", "opening", "score"],
+    "idx_games_opening_color": ["opening", "color"],
+    "idx_games_opening_id": ["opening_id"],
+    "idx_games_family_id": ["family_id", "score"],
+    "idx_games_my_elo": ["my_elo"],
+}
+
+# SQL counterparts of aggregates.DIMENSIONS, with the same bins and missing-value handling. The unary
+# + keeps SQLite from walking a whole index just to avoid sorting the groups, so that the filters
+# pick the index instead
+HOUR_SQL = "CAST(strftime('%H', time) AS INTEGER)"
+DIMENSION_SQL = {
+    "color": "+color",
+    "opening": "+opening",
+    "opening_id": "+opening_id",
+    "family_id": "+family_id",
+    "time_of_day": f"""CASE WHEN {HOUR_SQL} < 9 THEN 'Morning' WHEN {HOUR_SQL} < 17 THEN 'Afternoon'
+                           WHEN {HOUR_SQL} < 21 THEN 'Evening' WHEN {HOUR_SQL} < 24 THEN 'Night' END""",
+    "day_half": f"CASE WHEN {HOUR_SQL} < 17 THEN 'Morning/Afternoon' WHEN {HOUR_SQL} >= 17 THEN 'Evening/Night' END",
+    "elo_diff_bin": """CASE WHEN elo_diff < -100 THEN '< -100' WHEN elo_diff < 0 THEN '-100 to 0'
+                            WHEN elo_diff < 100 THEN '0 to 100' WHEN elo_diff >= 100 THEN '> 100' END""",
+    "castled": "CASE WHEN castle IN ('Kingside', 'Queenside') THEN 'Castled' WHEN castle = 'None' THEN 'Not Castled' END",
+    "castling_type": "CASE WHEN castle IN ('Kingside', 'Queenside') THEN castle ELSE 'No Castling' END",
+}
+DIMENSION_GROUPS = {
+    "time_of_day": TIME_OF_DAY_LABELS,
+    "day_half": ["Morning/Afternoon", "Evening/Night"],
+    "elo_diff_bin": ELO_DIFF_LABELS,
+    "castled": ["Castled", "Not Castled"],
+    "castling_type": CASTLING_TYPES,
+}
+
+FILTER_OPS = {"=": "=", "==": "=", "!=": "IS NOT", "<": "<", "<=": "<=", ">": ">", ">=": ">="}
+
+def is_sqlite(path):
+    return path.endswith((".db", ".sqlite"))
+
+def to_db_frame(df):
+    """The cleaned games as rows of the games table."""
+    typed = add_derived_features(to_typed_frame(df))
+    typed["time"] = typed["time"].dt.strftime("%Y-%m-%d %H:%M:%S")
+    typed = typed[[name for name in DB_COLUMNS if name in typed.columns]]
+    # Plain Python objects with None for every missing value, which sqlite3 stores as NULL
+    return typed.astype(object).where(typed.notna(), None)
+
+def write_sqlite(df, path, append=False):
+    """
+    Writes cleaned games to the games table of a SQLite database, with indexes on time, color,
+    opening and Elo. Without `append` the table is rebuilt and the indexes are created after loading.
+    The table has the DB_COLUMNS present in `df` (plus the derived features).
+    """
+    rows = to_db_frame(df)
+    with sqlite3.connect(path) as connection:
+        if not append:
+            connection.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        columns = ", ".join(f"{name} {DB_COLUMNS[name]}" for name in rows.columns)
+        connection.execute(f"CREATE TABLE IF NOT EXISTS {TABLE} ({columns})")
+        placeholders = ", ".join("?" for _ in rows.columns)
+        connection.executemany(f"INSERT INTO {TABLE} ({', '.join(rows.columns)}) VALUES ({placeholders})",
+                               rows.itertuples(index=False, name=None))
+        for name, indexed in INDEXES.items():
+            if all(column in rows.columns for column in indexed):
+                connection.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {TABLE} ({', '.join(indexed)})")
+        connection.execute("ANALYZE")
+    connection.close()
+
+def filters_to_sql(filters):
+    """Turns Parquet-style (column, op, value) filters into a WHERE clause and its parameters."""
+    clauses = []
+    params = []
+    for column, op, value in filters or []:
+        if column not in DB_COLUMNS:
+            raise ValueError(f"Unknown column: {column}")
+        if column == "time":
+            value = [pd.Timestamp(v).strftime("%Y-%m-%d %H:%M:%S") for v in value] if op in ("in", "not in") \
+                else pd.Timestamp(value).strftime("%Y-%m-%d %H:%M:%S")
+        if op in ("in", "not in"):
+            value = list(value)
+            placeholders = ", ".join("?" for _ in value)
+            # Like pandas' ~isin, "not in" keeps missing values
+            clauses.append(f"{column} IN ({placeholders})" if op == "in" else f"({column} IS NULL OR {column} NOT IN ({placeholders}))")
+            params.extend(value)
+        elif op in FILTER_OPS:
+            clauses.append(f"{column} {FILTER_OPS[op]} ?")
+            params.append(value)
+        else:
+            raise ValueError(f"Unsupported filter operator: {op}")
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+def stored_columns(connection):
+    """The columns load_sqlite returns by default: every stored column but the derived features."""
+    names = {row[1] for row in connection.execute(f"PRAGMA table_info({TABLE})")}
+    return [name for name in DB_COLUMNS if name in names and name not in DERIVED_COLUMNS] or CLEANED_COLUMNS
+
+def select_sql(columns, filters=None):
+    for column in columns:
+        if column not in DB_COLUMNS:
+            raise ValueError(f"Unknown column: {column}")
+    where, params = filters_to_sql(filters)
+    return f"SELECT {', '.join(columns)} FROM {TABLE}{where}", params
+
+def load_sqlite(path, columns=None, filters=None):
+    """Loads the games matching `filters` from a SQLite database, typed like the Parquet dataset."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    with sqlite3.connect(path) as connection:
+        sql, params = select_sql(columns or stored_columns(connection), filters)
+        df = pd.read_sql_query(sql, connection, params=params)
+    connection.close()
+    return to_typed_frame(df)
+
+def iter_sqlite(path, chunk_size, columns=None, filters=None):
+    """Like load_sqlite, but yields frames of at most `chunk_size` rows."""
+    connection = sqlite3.connect(path)
+    try:
+        sql, params = select_sql(columns or stored_columns(connection), filters)
+        for chunk in pd.read_sql_query(sql, connection, params=params, chunksize=chunk_size):
+            yield to_typed_frame(chunk)
+    finally:
+        connection.close()
+
+def compute_stats_sql(path, requests, filters=None):
+    """
+    aggregates.compute_stats pushed down into SQLite: one GROUP BY query per dimension, aggregating
+    every value requested over it, restricted by `filters` (which can use the indexes). Returns the
+    same {(dimension, value): DataFrame[n, sum, sumsq]} dict, with the same groups in the same order.
+    """
+    values_by_dimension = {}
+    for dimension, value in requests:
+        values_by_dimension.setdefault(dimension, []).append(value)
+    where, params = filters_to_sql(filters)
+
+    results = {}
+    with sqlite3.connect(path) as connection:
+        for dimension, values in values_by_dimension.items():
+            sums = ", ".join(f"COUNT({v}), TOTAL({v}), TOTAL({v} * {v})" for v in values)
+            rows = connection.execute(
+                f"SELECT {DIMENSION_SQL[dimension]} AS grp, {sums} FROM {TABLE}{where} GROUP BY grp ORDER BY grp", params
+            ).fetchall()
+            rows = [row for row in rows if row[0] is not None]
+            groups = [row[0] for row in rows]
+            for i, value in enumerate(values):
+                group = pd.DataFrame({
+                    "n": pd.Series([row[1 + 3 * i] for row in rows], dtype="int64"),
+                    "sum": pd.Series([row[2 + 3 * i] for row in rows], dtype="float64"),
+                    "sumsq": pd.Series([row[3 + 3 * i] for row in rows], dtype="float64"),
+                })
+                group.index = pd.Index(groups, name=dimension, dtype="object")
+                if dimension in SORTED_DIMENSIONS:
+                    group = group[group["n"] > 0]
+                else:
+                    group = group.reindex(pd.Index(DIMENSION_GROUPS[dimension], name=dimension), fill_value=0)
+                results[(dimension, value)] = group
+    connection.close()
+    return results
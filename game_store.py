@@ -0,0 +1,118 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+
+def is_jsonl(path):
+    """True for newline-delimited JSON stores: .jsonl, .jsonl.gz or .jsonl.zst."""
+    return path.endswith((".jsonl", ".jsonl.gz", ".jsonl.zst"))
+
+def open_store(path, mode="r"):
+    """
+    Opens a game store as a text file, compressing with gzip or zstd based on the file extension.
+    Mode is "r", "w" or "a".
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    if path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("zstandard is required for .zst game stores: pip install zstandard")
+        if mode == "r":
+            raw = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        else:
+            # Appending adds another zstd frame, which the decompressor reads back transparently
+            raw = zstandard.ZstdCompressor().stream_writer(open(path, mode + "b"), closefd=True)
+        return io.TextIOWrapper(raw, encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+def append_games(path, games):
+    """Appends games to a JSONL store, one compact JSON object per line. Returns the number written."""
+    count = 0
+    with open_store(path, "a") as file:
+        for game in games:
+            file.write(json.dumps(game, separators=(",", ":")))
+            file.write("\n")
+            count += 1
+    return count
+
+def temp_store_path(path):
+    """A temporary path next to a store with the same extension, e.g. games.jsonl.gz -> games.tmp.jsonl.gz."""
+    for extension in (".jsonl.gz", ".jsonl.zst", ".jsonl"):
+        if path.endswith(extension):
+            return path[:-len(extension)] + ".tmp" + extension
+    return path + ".tmp"
+
+def write_games(path, games):
+    """
+    Writes games to `path`, replacing its contents. JSONL stores are written line by line from any
+    iterable; other paths get the original indented JSON array. Returns the number written.
+
+    The games go to a temporary file that replaces `path` only once every game was written, so an
+    iterable that raises (e.g. a failed download) leaves the previous store intact.
+    """
+    temp_path = temp_store_path(path)
+    try:
+        if is_jsonl(path):
+            open_store(temp_path, "w").close()
+            count = append_games(temp_path, games)
+        else:
+            games = list(games)
+            with open(temp_path, "w") as file:
+                json.dump(games, file, indent=4)
+            count = len(games)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    os.replace(temp_path, path)
+    return count
+
+def iter_games(path):
+    """
+    Yields the games of a store one at a time. JSONL stores are streamed line by line; a legacy
+    JSON array file is loaded whole and then iterated.
+    """
+    if not is_jsonl(path):
+        with open(path, "r") as file:
+            yield from json.load(file)
+        return
+    with open_store(path, "r") as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+def iter_raw_games(path, start=0, end=None):
+    """
+    Like iter_games, but yields each game of a JSONL store as its undecoded JSON line, which is much
+    cheaper to hand to another process. Games of a legacy JSON array file are yielded as dicts.
+
+    For an uncompressed .jsonl store, `start` and `end` limit reading to that byte range; `start`
+    must be the beginning of a line.
+    """
+    if not is_jsonl(path):
+        yield from iter_games(path)
+        return
+    if path.endswith(".jsonl"):
+        with open(path, "rb") as file:
+            file.seek(start)
+            position = start
+            for line in file:
+                position += len(line)
+                if end is not None and position > end:
+                    return
+                if line.strip():
+                    yield line.decode("utf-8")
+        return
+    with open_store(path, "r") as file:
+        for line in file:
+            if line.strip():
+                yield line
+
+def prefix_hash(path, offset, window=4096):
+    """Hash of the `window` bytes before `offset`, used to check that a store still starts the same way."""
+    with open(path, "rb") as file:
+        file.seek(max(0, offset - window))
+        return hashlib.sha1(file.read(min(offset, window))).hexdigest()
@@ -0,0 +1,205 @@
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+from data import API_BASE, fetch_archive_cached, get_with_backoff, make_session, merge_games
+from game_store import write_games
+
+class RateLimiter:
+    """Thread-safe token bucket allowing `rate` requests per second with bursts of up to `burst`."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+def load_state(state_file):
+    """Loads the per-user ingestion state, or an empty state if there is none yet."""
+    if not os.path.exists(state_file):
+        return {}
+    try:
+        with open(state_file, "r") as file:
+            return json.load(file)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+def save_state(state_file, state):
+    """Writes the ingestion state atomically so a crash never leaves it half-written."""
+    tmp_path = state_file + ".tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(state, file, indent=2)
+    os.replace(tmp_path, state_file)
+
+def user_output_path(output_dir, username):
+    """Returns the partition file holding the games of one user."""
+    return os.path.join(output_dir, f"{username.lower()}.jsonl")
+
+def write_user_games(output_dir, username, games):
+    """Writes the games of one user to its JSONL partition atomically. Returns the number written."""
+    return write_games(user_output_path(output_dir, username), games)
+
+def ingest_users(usernames, output_dir="games_by_user", cache_dir="archive_cache", concurrency=16,
+                 rate=20.0, max_retries=5, max_active_users=None, api_base=API_BASE, resume=False):
+    """
+    Downloads the games of many users with one shared concurrency and rate budget.
+
+    Archive-list and archive requests of all users go through a single thread pool of `concurrency`
+    workers and a single token bucket of `rate` requests per second. Every archive is stored in the
+    archive cache as it arrives, and each finished user is written to <output_dir>/<username>.jsonl and
+    recorded in <output_dir>/ingest_state.json. The state only lives as long as one batch: it is removed
+    once every user finished, and a run with `resume` set (after a crash or failed users) skips the
+    users its interrupted predecessor finished. Any other run ingests every user again, which only
+    revalidates the archives that may have changed.
+
+    Args:
+        usernames (list): Chess.com usernames to ingest.
+        output_dir (str): Directory for the per-user game files and the state file.
+        cache_dir (str): Per-archive cache shared with data.sync_games.
+        concurrency (int): Maximum number of requests in flight across all users.
+        rate (float): Maximum requests per second across all users.
+        max_retries (int): Retries per request on 429/5xx responses.
+        max_active_users (int): Users whose archives are held in memory at once. Defaults to 2 * concurrency.
+        api_base (str): Root of the API.
+        resume (bool): Continue the batch recorded in the state file instead of starting a new one.
+
+    Returns:
+        dict: The state of every user: status ("done" or "failed"), game count or error message.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    os.makedirs(cache_dir, exist_ok=True)
+    state_file = os.path.join(output_dir, "ingest_state.json")
+    state = load_state(state_file) if resume else {}
+    max_active_users = max_active_users or 2 * concurrency
+
+    # Drop duplicates and, when resuming, users finished by the interrupted run
+    pending = []
+    for username in dict.fromkeys(usernames):
+        if state.get(username, {}).get("status") == "done":
+            continue
+        pending.append(username)
+    total = len(pending)
+    print(f"Ingesting {total} users ({len(set(usernames)) - total} already done).")
+
+    session = make_session(pool_size=concurrency)
+    limiter = RateLimiter(rate)
+    active = {}  # username -> {"archives": [...], "games": {index: games}, "inflight": n, "failed": error}
+    futures = {}
+    finished = 0
+    start = time.perf_counter()
+
+    def list_archives(username):
+        url = f"{api_base}/player/{username}/games/archives"
+        response = get_with_backoff(session, url, max_retries=max_retries, limiter=limiter)
+        return response.json().get("archives", [])
+
+    def fetch_archive(username, index):
+        archives = active[username]["archives"]
+        # Archives fetched after their month was over never change; the others are revalidated
+        return fetch_archive_cached(session, archives[index], cache_dir, False, max_retries, limiter, verbose=False)
+
+    def finish(username, error=None):
+        nonlocal finished
+        finished += 1
+        user = active.pop(username)
+        if error is None:
+            archives = user["archives"]
+            games = merge_games(user["games"][index] for index in range(len(archives)))
+            count = write_user_games(output_dir, username, games)
+            state[username] = {"status": "done", "games": count, "archives": len(archives)}
+            print(f"[{finished}/{total}] {username}: {count} games from {len(archives)} archives")
+        else:
+            state[username] = {"status": "failed", "error": str(error)}
+            print(f"[{finished}/{total}] {username}: FAILED ({error})")
+        save_state(state_file, state)
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            queue = iter(pending)
+            while True:
+                # Admit new users while there is room
+                while len(active) < max_active_users:
+                    username = next(queue, None)
+                    if username is None:
+                        break
+                    active[username] = {"archives": None, "games": {}, "inflight": 1, "failed": None}
+                    futures[executor.submit(list_archives, username)] = (username, None)
+                if not futures:
+                    break
+
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    username, index = futures.pop(future)
+                    user = active[username]
+                    user["inflight"] -= 1
+                    try:
+                        result = future.result()
+                    except (requests.exceptions.RequestException, json.JSONDecodeError) as err:
+                        user["failed"] = user["failed"] or err
+                        result = None
+
+                    if index is None and user["failed"] is None:
+                        user["archives"] = result
+                        user["inflight"] += len(result)
+                        for archive_index in range(len(result)):
+                            futures[executor.submit(fetch_archive, username, archive_index)] = (username, archive_index)
+                    elif user["failed"] is None:
+                        user["games"][index] = result
+
+                    # A user is complete once none of its requests are still in flight
+                    if user["inflight"] == 0:
+                        finish(username, user["failed"])
+    finally:
+        session.close()
+        save_state(state_file, state)
+
+    elapsed = time.perf_counter() - start
+    failed = [name for name in pending if state.get(name, {}).get("status") == "failed"]
+    print(f"Finished {total - len(failed)} users, {len(failed)} failed, in {elapsed:.1f}s.")
+    if not failed:
+        # The batch is complete, so there is nothing left to resume
+        os.remove(state_file)
+    else:
+        print("Run again with --resume to retry the failed users.")
+    return state
+
+def read_usernames(path):
+    """Reads one username per line, ignoring blank lines and lines starting with '#'."""
+    with open(path, "r") as file:
+        return [line.strip() for line in file if line.strip() and not line.startswith("#")]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download the Chess.com games of many users.")
+    parser.add_argument("usernames", nargs="+", help="usernames, or @file with one username per line")
+    parser.add_argument("--output-dir", default="games_by_user")
+    parser.add_argument("--cache-dir", default="archive_cache")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rate", type=float, default=20.0, help="requests per second across all users")
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--resume", action="store_true", help="only ingest the users an interrupted run did not finish")
+    args = parser.parse_args()
+
+    usernames = []
+    for name in args.usernames:
+        usernames.extend(read_usernames(name[1:]) if name.startswith("@") else [name])
+
+    ingest_users(usernames, output_dir=args.output_dir, cache_dir=args.cache_dir, concurrency=args.concurrency,
+                 rate=args.rate, max_retries=args.max_retries, resume=args.resume)
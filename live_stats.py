@@ -0,0 +1,240 @@
+import bisect
+import json
+import os
+
+import pandas as pd
+
+from aggregates import CASTLING_TYPES, ELO_DIFF_BINS, ELO_DIFF_LABELS, TIME_OF_DAY_BINS, TIME_OF_DAY_LABELS, compute_stats
+from features import RESULT_SCORES
+
+class RunningStats:
+    """Count, mean and sum of squared deviations (M2) of a stream of values, kept with Welford's method."""
+
+    __slots__ = ("n", "mean", "m2")
+
+    def __init__(self, n=0, mean=0.0, m2=0.0):
+        self.n = n
+        self.mean = mean
+        self.m2 = m2
+
+    def update(self, value):
+        """Adds one value in O(1)."""
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other):
+        """Adds every value of another RunningStats (Chan et al.'s pairwise update). Returns self."""
+        if other.n == 0:
+            return self
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+        return self
+
+    def __repr__(self):
+        return f"RunningStats(n={self.n}, mean={self.mean}, m2={self.m2})"
+
+class GroupedStats:
+    """A RunningStats per group label, e.g. per color or per time of day."""
+
+    def __init__(self, labels=None):
+        # Fixed group order (for binned dimensions); groups are sorted by name otherwise
+        self.labels = labels
+        self.groups = {}
+
+    def update(self, label, value):
+        """Adds `value` to the group `label`; games without a label or value are skipped."""
+        if label is None or value is None or value != value:
+            return
+        group = self.groups.get(label)
+        if group is None:
+            group = self.groups[label] = RunningStats()
+        group.update(value)
+
+    def merge(self, other):
+        """Adds every group of another GroupedStats. Returns self."""
+        for label, group in other.groups.items():
+            self.groups.setdefault(label, RunningStats()).merge(group)
+        return self
+
+    def to_frame(self, name=None):
+        """
+        The groups as a DataFrame with n, mean and m2 columns, which the aggregates helpers
+        (group_means, ttest_from_stats, anova_from_stats, ...) accept like compute_stats output.
+        """
+        labels = self.labels if self.labels is not None else sorted(self.groups)
+        rows = [self.groups.get(label, RunningStats()) for label in labels]
+        return pd.DataFrame({
+            "n": [group.n for group in rows],
+            "mean": [group.mean for group in rows],
+            "m2": [group.m2 for group in rows],
+        }, index=pd.Index(labels, name=name, dtype="object"))
+
+    @classmethod
+    def from_frame(cls, frame, labels=None):
+        """Seeds the groups from a compute_stats result (n, sum and sum of squares per group)."""
+        grouped = cls(labels)
+        for label, n, total, sumsq in zip(frame.index, frame["n"], frame["sum"], frame["sumsq"]):
+            if n > 0:
+                mean = total / n
+                grouped.groups[label] = RunningStats(int(n), mean, max(sumsq - total * mean, 0.0))
+        return grouped
+
+    def to_dict(self):
+        return {str(label): [group.n, group.mean, group.m2] for label, group in self.groups.items()}
+
+    @classmethod
+    def from_dict(cls, data, labels=None, label_type=str):
+        """Restores the groups of to_dict, whose labels JSON turned into strings, as `label_type`."""
+        grouped = cls(labels)
+        for label, (n, mean, m2) in data.items():
+            grouped.groups[label_type(label)] = RunningStats(n, mean, m2)
+        return grouped
+
+def game_hour(time):
+    """Hour of day of a game's time (a timestamp, a date string or epoch seconds in UTC); None if unknown."""
+    if time is None or time != time:
+        return None
+    if isinstance(time, (int, float)):
+        return None if time == 0 else int(time // 3600 % 24)
+    time = pd.to_datetime(time, errors="coerce")
+    return None if pd.isna(time) else time.hour
+
+def game_elo_diff(game):
+    """The player's rating minus the opponent's, or None if either is missing."""
+    white_elo = pd.to_numeric(game.get("white_elo"), errors="coerce")
+    black_elo = pd.to_numeric(game.get("black_elo"), errors="coerce")
+    if pd.isna(white_elo) or pd.isna(black_elo):
+        return None
+    return float(white_elo - black_elo if game.get("color") == "white" else black_elo - white_elo)
+
+def time_of_day_label(game):
+    # Same [a, b) bins as pd.cut(..., right=False) in aggregates.time_of_day_labels
+    hour = game_hour(game.get("time"))
+    if hour is None:
+        return None
+    index = bisect.bisect_right(TIME_OF_DAY_BINS, hour)
+    return TIME_OF_DAY_LABELS[index - 1] if 0 < index < len(TIME_OF_DAY_BINS) else None
+
+def day_half_label(game):
+    hour = game_hour(game.get("time"))
+    if hour is None:
+        return None
+    return "Morning/Afternoon" if hour < 17 else "Evening/Night"
+
+def elo_diff_label(game):
+    # Same [a, b) bins as pd.cut(..., right=False) in aggregates.elo_diff_labels
+    elo_diff = game_elo_diff(game)
+    if elo_diff is None:
+        return None
+    return ELO_DIFF_LABELS[bisect.bisect_right(ELO_DIFF_BINS, elo_diff) - 1]
+
+def castled_label(game):
+    castle = game.get("castle")
+    if castle in ("Kingside", "Queenside"):
+        return "Castled"
+    return "Not Castled" if castle == "None" else None
+
+def castling_type_label(game):
+    castle = game.get("castle")
+    return castle if castle in ("Kingside", "Queenside") else "No Castling"
+
+def label_value(game, column):
+    value = game.get(column)
+    return None if value is None or value != value else value
+
+def integer_label(game, column):
+    value = game.get(column)
+    return None if value is None or pd.isna(value) else int(value)
+
+# Per-game counterparts of aggregates.DIMENSIONS: each maps one cleaned game (a dict keyed like
+# preprocess.COLUMNS) to its group label, with the fixed group order of binned dimensions
+GAME_DIMENSIONS = {
+    "color": (lambda game: label_value(game, "color"), None),
+    "opening": (lambda game: label_value(game, "opening"), None),
+    "opening_id": (lambda game: integer_label(game, "opening_id"), None),
+    "family_id": (lambda game: integer_label(game, "family_id"), None),
+    "time_of_day": (time_of_day_label, TIME_OF_DAY_LABELS),
+    "day_half": (day_half_label, ["Morning/Afternoon", "Evening/Night"]),
+    "elo_diff_bin": (elo_diff_label, ELO_DIFF_LABELS),
+    "castled": (castled_label, ["Castled", "Not Castled"]),
+    "castling_type": (castling_type_label, CASTLING_TYPES),
+}
+
+# Types of the group labels that are not strings, to restore them from JSON
+LABEL_TYPES = {"opening_id": int, "family_id": int}
+
+GAME_VALUES = {
+    "score": lambda game: RESULT_SCORES.get(game.get("result"), 0.0),
+    "is_win": lambda game: 1.0 if game.get("result") == "win" else 0.0,
+}
+
+class LiveStats:
+    """
+    Online statistics for a list of (dimension, value) requests, as used by analysis.ALL_AGGREGATES.
+    Games are added one at a time in O(1), shards are combined with merge, and the state round-trips
+    through to_dict/from_dict (or save/load) as JSON. `aggregates()` returns a dict that the
+    analyze_* functions accept in place of compute_stats output.
+    """
+
+    def __init__(self, requests):
+        self.requests = list(requests)
+        self.stats = {key: GroupedStats(GAME_DIMENSIONS[key[0]][1]) for key in self.requests}
+
+    def update(self, game):
+        """Adds one cleaned game."""
+        labels = {}
+        values = {}
+        for dimension, value in self.requests:
+            if dimension not in labels:
+                labels[dimension] = GAME_DIMENSIONS[dimension][0](game)
+            if value not in values:
+                values[value] = GAME_VALUES[value](game)
+            self.stats[(dimension, value)].update(labels[dimension], values[value])
+
+    def merge(self, other):
+        """Adds the games of another LiveStats over the same requests. Returns self."""
+        for key, grouped in self.stats.items():
+            grouped.merge(other.stats[key])
+        return self
+
+    def aggregates(self):
+        return {key: grouped.to_frame(key[0]) for key, grouped in self.stats.items()}
+
+    @classmethod
+    def from_frame(cls, df, requests):
+        """Seeds the statistics from a whole frame of history with one compute_stats pass."""
+        live = cls(requests)
+        for key, frame in compute_stats(df, live.requests).items():
+            live.stats[key] = GroupedStats.from_frame(frame, GAME_DIMENSIONS[key[0]][1])
+        return live
+
+    def to_dict(self):
+        return {"requests": [list(key) for key in self.requests],
+                "stats": [self.stats[key].to_dict() for key in self.requests]}
+
+    @classmethod
+    def from_dict(cls, data):
+        live = cls([tuple(key) for key in data["requests"]])
+        for key, groups in zip(live.requests, data["stats"]):
+            live.stats[key] = GroupedStats.from_dict(groups, GAME_DIMENSIONS[key[0]][1], LABEL_TYPES.get(key[0], str))
+        return live
+
+    def save(self, path):
+        """Writes the state as JSON, atomically."""
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump(self.to_dict(), file)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path, requests):
+        """Loads a saved state, or starts empty if `path` does not exist."""
+        if not os.path.exists(path):
+            return cls(requests)
+        with open(path, "r") as file:
+            return cls.from_dict(json.load(file))
@@ -0,0 +1,81 @@
+from collections import namedtuple
+
+from aggregates import anova_from_stats, compute_stats, group_means, ttest_from_stats
+
+# A metric is a value averaged over the groups of a dimension, optionally with a significance test:
+# - dimension: a key of aggregates.DIMENSIONS, which defines the grouping and its binning
+# - value: the per-game value averaged, "score" (1 / 0.5 / 0) or "is_win" (see features)
+# - test: a key of TESTS, or None
+# - groups: the two groups a t-test compares
+# - min_games: groups with fewer games are left out of the means and the test
+Metric = namedtuple("Metric", ["dimension", "value", "test", "groups", "min_games"], defaults=(None, None, 0))
+
+# (statistic, p-value) of a test from the sufficient statistics of a metric's groups
+TESTS = {
+    "welch": lambda group, groups: ttest_from_stats(group, *groups, equal_var=False),
+    "student": lambda group, groups: ttest_from_stats(group, *groups, equal_var=True),
+    "anova": lambda group, groups: anova_from_stats(group),
+}
+
+METRICS = {
+    "win_rate_by_color": Metric("color", "is_win"),
+    "score_by_color": Metric("color", "score", "welch", ["white", "black"]),
+    "score_by_opening": Metric("family_id", "score", "anova", min_games=10),
+    "win_rate_by_time_of_day": Metric("time_of_day", "is_win"),
+    "win_rate_by_day_half": Metric("day_half", "is_win", "student", ["Morning/Afternoon", "Evening/Night"]),
+    "score_by_elo_diff": Metric("elo_diff_bin", "score", "anova"),
+    "score_by_castling": Metric("castled", "score", "welch", ["Castled", "Not Castled"]),
+    "score_by_castling_type": Metric("castling_type", "score", "anova"),
+}
+
+# `stats` has n, sum and sumsq per group, `means` the mean value per group; statistic and p_value
+# are NaN for metrics without a test
+MetricResult = namedtuple("MetricResult", ["stats", "means", "statistic", "p_value"])
+
+def plan(names=None):
+    """
+    The (dimension, value) statistics that the metrics `names` (default: all of METRICS) need, each
+    listed once, so that one aggregates.compute_stats pass (or one scan of a dataset) serves them all.
+    """
+    requests = []
+    for name in names or METRICS:
+        metric = METRICS[name]
+        if (metric.dimension, metric.value) not in requests:
+            requests.append((metric.dimension, metric.value))
+    return requests
+
+def metric_groups(aggregates, name):
+    """The statistics of every group of the metric `name`, before its min_games filter is applied."""
+    metric = METRICS[name]
+    return aggregates[(metric.dimension, metric.value)]
+
+def evaluate(aggregates, name):
+    """The MetricResult of the metric `name` from statistics computed for its plan."""
+    metric = METRICS[name]
+    group = metric_groups(aggregates, name)
+    if metric.min_games:
+        group = group[group["n"] >= metric.min_games]
+    statistic, p_value = TESTS[metric.test](group, metric.groups) if metric.test else (float("nan"), float("nan"))
+    return MetricResult(group, group_means(group).rename(metric.value), statistic, p_value)
+
+def metric_result(name, df, aggregates=None):
+    """The MetricResult of `name` from `aggregates` when given, otherwise computed from the games of `df`."""
+    return evaluate(aggregates or compute_stats(df, plan([name])), name)
+
+def run_metrics(source, names=None, chunk_size=None, filters=None):
+    """
+    Evaluates the metrics `names` (default: all of METRICS) over one pass of the data: `source` is a
+    frame of games or the path of a cleaned dataset, whose statistics come from analysis.cached_aggregates
+    (streamed in chunks of `chunk_size` rows when given, and reused while the dataset is unchanged).
+    Returns a dict of metric name to MetricResult, or None when there are no games.
+    """
+    names = list(names or METRICS)
+    if isinstance(source, str):
+        from analysis import cached_aggregates
+
+        aggregates = cached_aggregates(source, plan(names), filters=filters, chunk_size=chunk_size)
+    else:
+        aggregates = compute_stats(source, plan(names)) if len(source) else None
+    if aggregates is None:
+        return None
+    return {name: evaluate(aggregates, name) for name in names}
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Legal games used to build synthetic PGNs: (SAN moves, PGN result, white result, black result)
+SAMPLE_GAMES = [
+    ("e4 e5 Nf3 Nc6 Bc4 Bc5 c3 Nf6 d3 d6 O-O O-O Re1 a6 Bb3 Ba7 h3 h6 Nbd2 Re8 Nf1 Be6 Bc2 d5 exd5 Qxd5 Ng3 "
+     "Rad8 Qe2 Qd7 Be3 Bxe3 Qxe3 Nd5 Qe2 f6 d4 exd4 Qxe6+ Qxe6 Rxe6 Rxe6 cxd4 Nf4", "1-0", "win", "resigned"),
+    ("d4 d5 Nc3 Nf6 Bg5 e6 e3 Be7 Qd2 O-O O-O-O c5 dxc5 Bxc5 Nf3 Nc6 Bxf6 Qxf6 Nxd5 exd5 Qxd5 Be6 Qxc5 Rac8 "
+     "Qa3 Nb4 Kb1 Rxc2 Qxb4 Rxf2 Qe4 Rxf3", "0-1", "timeout", "win"),
+    ("e4 e5 Bc4 Nc6 Qh5 Nf6 Qxf7#", "1-0", "win", "checkmated"),
+]
+
+def format_clock(seconds):
+    """Formats remaining clock time the way Chess.com writes [%clk] comments, e.g. 0:09:58.6."""
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{int(hours)}:{int(minutes):02d}:{secs:04.1f}"
+
+def make_game(username, index, year=2023, month=1, opponent="opponent"):
+    """Builds a synthetic game in the shape returned by the Chess.com archive endpoint."""
+    moves, pgn_result, white_result, black_result = SAMPLE_GAMES[index % len(SAMPLE_GAMES)]
+    color = "white" if index % 2 == 0 else "black"
+    players = {"white": username, "black": opponent} if color == "white" else {"white": opponent, "black": username}
+    ratings = {color: 1200 + index % 300, ("black" if color == "white" else "white"): 1200 + index % 250}
+
+    start = datetime(year, month, index % 28 + 1, index % 24, index % 60, 0)
+    clocks = {"white": 600.0, "black": 600.0}
+    movetext = []
+    for ply, san in enumerate(moves.split()):
+        side = "white" if ply % 2 == 0 else "black"
+        clocks[side] -= (ply * 7 + index) % 15 + 1.5
+        number = f"{ply // 2 + 1}." if side == "white" else f"{ply // 2 + 1}..."
+        movetext.append(f"{number} {san} {{[%clk {format_clock(clocks[side])}]}}")
+    end = start + timedelta(seconds=1200 - clocks["white"] - clocks["black"])
+
+    headers = {
+        "Event": "Live Chess", "Site": "Chess.com", "Date": start.strftime("%Y.%m.%d"), "Round": "-",
+        "White": players["white"], "Black": players["black"], "Result": pgn_result,
+        "ECO": "C50", "ECOUrl": "https://www.chess.com/openings/Italian-Game-Giuoco-Piano",
+        "UTCDate": start.strftime("%Y.%m.%d"), "UTCTime": start.strftime("%H:%M:%S"),
+        "WhiteElo": str(ratings["white"]), "BlackElo": str(ratings["black"]), "TimeControl": "600",
+        "StartTime": start.strftime("%H:%M:%S"), "EndDate": end.strftime("%Y.%m.%d"), "EndTime": end.strftime("%H:%M:%S"),
+        "Link": f"https://www.chess.com/game/live/{year}{month:02d}-{index}",
+    }
+    pgn = "\n".join(f'[{key} "{value}"]' for key, value in headers.items())
+    pgn += "\n\n" + " ".join(movetext) + " " + pgn_result + "\n"
+    return {
+        "url": headers["Link"],
+        "pgn": pgn,
+        "time_class": "rapid",
+        "end_time": int(end.replace(tzinfo=timezone.utc).timestamp()),
+        "eco": headers["ECOUrl"],
+        "white": {"username": players["white"], "rating": ratings["white"], "result": white_result},
+        "black": {"username": players["black"], "rating": ratings["black"], "result": black_result},
+    }
+
+def make_history(username, games, per_month=500, start_year=2015):
+    """Yields `games` synthetic games of `username`, `per_month` in each consecutive month from `start_year`."""
+    for index in range(games):
+        month_index = index // per_month
+        yield make_game(username, index, year=start_year + month_index // 12, month=month_index % 12 + 1)
+
+class MockChessHandler(BaseHTTPRequestHandler):
+    """Serves /player/<username>/games/archives and /player/<username>/games/<YYYY>/<MM>."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, payload, status=200, validators=False):
+        body = json.dumps(payload).encode()
+        if validators:
+            etag = '"' + hashlib.md5(body).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if validators:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.request_count += 1
+        time.sleep(server.latency)
+        if server.error_rate and random.random() < server.error_rate:
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        parts = self.path.strip("/").split("/")
+        if len(parts) < 4 or parts[0] != "player" or parts[2] != "games":
+            self.send_json({"message": "not found"}, status=404)
+            return
+        username = parts[1]
+        months = server.players.get(username)
+        if months is None:
+            self.send_json({"message": "not found"}, status=404)
+            return
+
+        base = f"http://{server.server_address[0]}:{server.server_address[1]}/player/{username}/games"
+        if parts[3] == "archives":
+            self.send_json({"archives": [f"{base}/{year}/{month:02d}" for year, month in months]})
+            return
+
+        year, month = int(parts[3]), int(parts[4])
+        games = [
+            make_game(username, i, year=year, month=month)
+            for i in range(server.games_per_archive)
+        ]
+        self.send_json({"games": games}, validators=True)
+
+def archive_months(count, start_year=2015):
+    """Returns `count` consecutive (year, month) pairs starting in January of `start_year`."""
+    return [(start_year + i // 12, i % 12 + 1) for i in range(count)]
+
+def serve_mock_api(players, games_per_archive=20, latency=0.0, error_rate=0.0):
+    """
+    Starts a local Chess.com-like API in a background thread.
+
+    Args:
+        players (dict): Maps username to the number of monthly archives it has.
+        games_per_archive (int): Games returned by every monthly archive.
+        latency (float): Seconds slept before answering each request.
+        error_rate (float): Probability that a request is answered with 429.
+
+    Returns:
+        tuple: (server, api_base) - call server.shutdown() when done. server.request_count
+        counts the requests answered so far.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockChessHandler)
+    server.daemon_threads = True
+    server.players = {name: archive_months(count) for name, count in players.items()}
+    server.games_per_archive = games_per_archive
+    server.latency = latency
+    server.error_rate = error_rate
+    server.request_count = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_base = f"http://{server.server_address[0]}:{server.server_address[1]}"
+    return server, api_base
@@ -0,0 +1,117 @@
+import hashlib
+import inspect
+import json
+import os
+import re
+from functools import lru_cache
+from urllib.parse import unquote
+
+import numpy as np
+import pandas as pd
+
+UNKNOWN_OPENING = "Unknown Opening"
+
+# The word that ends an opening family's name, e.g. "Sicilian Defense", "Italian Game", "Kings Gambit"
+FAMILY_WORDS = {"Opening", "Defense", "Defence", "Game", "Gambit", "Countergambit", "Attack", "System"}
+# Move sequences that Chess.com appends to deeper lines, e.g. "6.Bg5" or "2...c5"
+MOVE_RE = re.compile(r"^\d+\.")
+
+@lru_cache(maxsize=None)
+def parse_opening(eco):
+    """
+    Splits a Chess.com ECO URL (or an opening name) into a canonical (family, variation) pair, e.g.
+    ".../openings/Sicilian-Defense-Najdorf-Variation-6.Bg5-e6" -> ("Sicilian Defense", "Najdorf Variation").
+    Trailing move sequences are dropped; the family ends at the first word of FAMILY_WORDS, or spans
+    the whole name if there is none. Missing or unknown openings become ("Unknown Opening", "").
+    """
+    if not eco or eco == "Unknown" or eco == UNKNOWN_OPENING:
+        return UNKNOWN_OPENING, ""
+    name = unquote(eco.rstrip("/").split("/")[-1]).replace("-", " ").split(":")[0]
+    words = []
+    for word in name.split():
+        if MOVE_RE.match(word):
+            break
+        words.append(word[:1].upper() + word[1:])
+    if not words:
+        return UNKNOWN_OPENING, ""
+    end = next((i + 1 for i, word in enumerate(words) if word in FAMILY_WORDS), len(words))
+    return " ".join(words[:end]), " ".join(words[end:])
+
+def parser_fingerprint():
+    """Hash of parse_opening and the constants it uses, which changes whenever URLs may parse differently."""
+    sources = [inspect.getsource(parse_opening), repr(sorted(FAMILY_WORDS)), MOVE_RE.pattern, UNKNOWN_OPENING]
+    return hashlib.sha1("".join(sources).encode()).hexdigest()
+
+class OpeningIndex:
+    """
+    Assigns small integer IDs to canonical (family, variation) openings. ECO URLs that normalize to the
+    same opening share an ID, and every URL is parsed only the first time it is seen. IDs are never
+    reassigned: the index is kept as JSON at `path`, so appended rows and later runs use the same IDs.
+    An index saved by a different parse_opening has every URL parsed again; openings it already knew
+    keep their IDs. Families get IDs of their own the same way, in the order they first appear.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.openings = []
+        self.ids_by_opening = {}
+        self.ids_by_eco = {}
+        self.family_ids_by_name = {}
+        self.family_id_of = []
+        self.changed = False
+        if path and os.path.exists(path):
+            with open(path, "r") as file:
+                data = json.load(file)
+            for family, variation in data["openings"]:
+                self.add((family, variation))
+            if data.get("parser") == parser_fingerprint():
+                self.ids_by_eco = data["eco"]
+            else:
+                self.ids_by_eco = {eco: self.add(parse_opening(eco)) for eco in data["eco"]}
+                self.changed = True
+
+    def add(self, opening):
+        opening_id = self.ids_by_opening.get(opening)
+        if opening_id is None:
+            opening_id = self.ids_by_opening[opening] = len(self.openings)
+            self.openings.append(opening)
+            self.family_id_of.append(self.family_ids_by_name.setdefault(opening[0], len(self.family_ids_by_name)))
+        return opening_id
+
+    def lookup(self, eco):
+        """The ID of an ECO URL or opening name, adding it to the index if it is new."""
+        opening_id = self.ids_by_eco.get(eco)
+        if opening_id is None:
+            opening_id = self.ids_by_eco[eco] = self.add(parse_opening(eco))
+            self.changed = True
+        return opening_id
+
+    def ids(self, ecos):
+        """IDs of many ECO URLs as a uint16 array, looking up each distinct URL once."""
+        codes, distinct = pd.factorize(np.asarray(ecos, dtype=object), use_na_sentinel=False)
+        return np.array([self.lookup(eco) for eco in distinct], dtype=np.uint16)[codes]
+
+    def family(self, opening_id):
+        return self.openings[opening_id][0]
+
+    def variation(self, opening_id):
+        return self.openings[opening_id][1]
+
+    def families(self):
+        """Family name of every ID, as an array indexable by opening ID."""
+        return np.array([family for family, _ in self.openings], dtype=object)
+
+    def family_ids(self):
+        """Family ID of every opening ID, as a uint16 array indexable by opening ID."""
+        return np.array(self.family_id_of, dtype=np.uint16)
+
+    def save(self):
+        """Writes the index atomically if any ECO URL was added (or parsed again) since it was loaded."""
+        if not self.path or not self.changed:
+            return
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump({"parser": parser_fingerprint(), "openings": [list(opening) for opening in self.openings],
+                       "eco": self.ids_by_eco}, file)
+        os.replace(temp_path, self.path)
+        self.changed = False
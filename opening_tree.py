@@ -0,0 +1,226 @@
+import argparse
+import bisect
+import os
+
+import numpy as np
+import pandas as pd
+
+from features import RESULT_SCORES
+from replay import STARTING_FEN, Board
+
+# Plies of every game that go into the tree (10 moves per side)
+TREE_PLIES = 20
+# Edges of the tree: the games in which the player of `color` (0 white, 1 black) played or faced
+# `move` from the `parent` position into the `child` one, keyed by Zobrist hashes (see replay.Board.zobrist).
+# Every game also has an edge from parent 0 into its starting position, with an empty move
+EDGE_DTYPE = np.dtype([("parent", "<u8"), ("color", "u1"), ("child", "<u8"), ("move", "S7"),
+                       ("games", "<u4"), ("wins", "<u4"), ("draws", "<u4")])
+# Positions: all the games that reached `hash` with the player on `color`, whatever the move order,
+# with the `parent` and `move` through which it was reached most often
+NODE_DTYPE = np.dtype([("hash", "<u8"), ("color", "u1"), ("parent", "<u8"), ("move", "S7"),
+                       ("games", "<u4"), ("wins", "<u4"), ("draws", "<u4")])
+COUNT_FIELDS = ["games", "wins", "draws"]
+
+def position_key(moves=(), fen=None):
+    """Zobrist hash of the position after the SAN `moves` from the starting position (or `fen`)."""
+    board = Board(fen or STARTING_FEN)
+    for san in moves:
+        board.push(san)
+    return board.zobrist()
+
+def game_path(moves, fen=None, plies=TREE_PLIES):
+    """
+    Hashes of the positions of the first `plies` plies of a game, starting with the initial position,
+    and the SAN moves between them. Stops at the first move that cannot be played.
+    """
+    try:
+        board = Board(fen or STARTING_FEN)
+    except (ValueError, KeyError, IndexError):
+        return [], []
+    keys = [board.zobrist()]
+    played = []
+    for san in moves[:plies]:
+        try:
+            board.push(san)
+        except (ValueError, KeyError, IndexError):
+            break
+        keys.append(board.zobrist())
+        played.append(san.rstrip("+#?!"))
+    return keys, played
+
+def aggregate_edges(edges):
+    """Sums the counts of duplicate (parent, color, child) edges, returning them sorted by that key."""
+    if len(edges) == 0:
+        return np.zeros(0, dtype=EDGE_DTYPE)
+    edges = edges[np.lexsort((edges["child"], edges["color"], edges["parent"]))]
+    new = np.ones(len(edges), dtype=bool)
+    new[1:] = (edges["parent"][1:] != edges["parent"][:-1]) | (edges["color"][1:] != edges["color"][:-1]) \
+        | (edges["child"][1:] != edges["child"][:-1])
+    starts = np.flatnonzero(new)
+    merged = edges[starts]
+    for field in COUNT_FIELDS:
+        merged[field] = np.add.reduceat(edges[field], starts)
+    return merged
+
+def chunk_edges(games, plies=TREE_PLIES):
+    """
+    The aggregated edges of a chunk of games, given as (SAN moves, FEN or None, player color code,
+    result) tuples; the result is scored like features.RESULT_SCORES.
+    """
+    parents, children, colors, moves, outcomes = [], [], [], [], []
+    for sans, fen, color, result in games:
+        keys, played = game_path(sans, fen, plies)
+        if not keys:
+            continue
+        parents.extend([0] + keys[:-1])
+        children.extend(keys)
+        moves.extend([""] + played)
+        colors.extend([color] * len(keys))
+        outcomes.extend([RESULT_SCORES.get(result, 0.0)] * len(keys))
+    edges = np.zeros(len(parents), dtype=EDGE_DTYPE)
+    edges["parent"] = parents
+    edges["child"] = children
+    edges["color"] = colors
+    edges["move"] = moves
+    outcomes = np.asarray(outcomes, dtype=np.float64)
+    edges["games"] = 1
+    edges["wins"] = outcomes == 1.0
+    edges["draws"] = outcomes == 0.5
+    return aggregate_edges(edges)
+
+def nodes_from_edges(edges):
+    """The positions of a set of aggregated edges: counts summed over the edges into each (hash, color)."""
+    order = np.lexsort((-edges["games"].astype(np.int64), edges["color"], edges["child"]))
+    edges = edges[order]
+    new = np.ones(len(edges), dtype=bool)
+    new[1:] = (edges["child"][1:] != edges["child"][:-1]) | (edges["color"][1:] != edges["color"][:-1])
+    starts = np.flatnonzero(new)
+    nodes = np.zeros(len(starts), dtype=NODE_DTYPE)
+    # Within a position the most played edge comes first
+    nodes["hash"] = edges["child"][starts]
+    nodes["color"] = edges["color"][starts]
+    nodes["parent"] = edges["parent"][starts]
+    nodes["move"] = edges["move"][starts]
+    if len(edges):
+        for field in COUNT_FIELDS:
+            nodes[field] = np.add.reduceat(edges[field], starts)
+    return nodes
+
+def stats_frame(records):
+    """Games, wins, draws and the player's score of node or edge records, with moves decoded."""
+    frame = pd.DataFrame({"move": np.char.decode(records["move"]) if len(records) else [],
+                          **{field: records[field].astype(np.int64) for field in COUNT_FIELDS}})
+    with np.errstate(invalid="ignore", divide="ignore"):
+        frame["score"] = (frame["wins"] + frame["draws"] / 2) / frame["games"]
+    return frame
+
+class OpeningTree:
+    """
+    The positions of the first TREE_PLIES plies of every game, as two sorted structured arrays (see
+    NODE_DTYPE and EDGE_DTYPE) kept in .npy files that are memory-mapped on load: the stats of a
+    position or of its continuations are a binary search away, without rescanning any PGN. Counts
+    are per player color; lookups without a color add both up.
+    """
+
+    def __init__(self, edges, nodes=None):
+        self.edges = edges
+        self.nodes = nodes_from_edges(edges) if nodes is None else nodes
+
+    @classmethod
+    def from_parts(cls, parts):
+        """Merges the chunk_edges of many chunks (and of an existing tree's edges) into one tree."""
+        parts = [part for part in parts if part is not None]
+        return cls(aggregate_edges(np.concatenate(parts)) if parts else np.zeros(0, dtype=EDGE_DTYPE))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Opens the tree saved at `path`, memory-mapped unless mmap=False."""
+        mode = "r" if mmap else None
+        return cls(np.load(path + ".edges.npy", mmap_mode=mode), np.load(path + ".nodes.npy", mmap_mode=mode))
+
+    def save(self, path):
+        """Writes <path>.edges.npy and <path>.nodes.npy, each atomically."""
+        for suffix, array in ((".edges.npy", self.edges), (".nodes.npy", self.nodes)):
+            temp_path = path + suffix + ".tmp"
+            with open(temp_path, "wb") as file:
+                np.save(file, array)
+            os.replace(temp_path, path + suffix)
+
+    def node_range(self, key):
+        # bisect reads single elements, so a memory-mapped array is never read whole
+        hashes = self.nodes["hash"]
+        start = bisect.bisect_left(hashes, key)
+        return start, bisect.bisect_right(hashes, key, lo=start)
+
+    def edge_range(self, parent):
+        parents = self.edges["parent"]
+        start = bisect.bisect_left(parents, parent)
+        return start, bisect.bisect_right(parents, parent, lo=start)
+
+    def position(self, key, color=None):
+        """{"games", "wins", "draws", "score"} of the position with Zobrist hash `key`."""
+        start, end = self.node_range(np.uint64(key))
+        nodes = self.nodes[start:end]
+        if color is not None:
+            nodes = nodes[nodes["color"] == color]
+        counts = {field: int(nodes[field].sum()) for field in COUNT_FIELDS}
+        counts["score"] = (counts["wins"] + counts["draws"] / 2) / counts["games"] if counts["games"] else np.nan
+        return counts
+
+    def lookup(self, moves=(), color=None, fen=None):
+        """Stats of the position after the SAN `moves`, e.g. lookup(["e4", "c5"], color=0)."""
+        return self.position(position_key(moves, fen), color)
+
+    def children(self, key, color=None, min_games=1):
+        """The moves played from the position `key`, with their stats, most played first."""
+        start, end = self.edge_range(np.uint64(key))
+        edges = self.edges[start:end]
+        if color is not None:
+            edges = edges[edges["color"] == color]
+        frame = stats_frame(edges).groupby("move", sort=False)[COUNT_FIELDS].sum()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            frame["score"] = (frame["wins"] + frame["draws"] / 2) / frame["games"]
+        frame = frame[frame["games"] >= min_games]
+        return frame.sort_values("games", ascending=False)
+
+    def line(self, key, color):
+        """The most common SAN move sequence that reaches the position `key` with the player on `color`."""
+        moves = []
+        for _ in range(TREE_PLIES + 1):
+            start, end = self.node_range(np.uint64(key))
+            nodes = self.nodes[start:end]
+            nodes = nodes[nodes["color"] == color]
+            if not len(nodes) or nodes["parent"][0] == 0:
+                break
+            moves.append(nodes["move"][0].decode())
+            key = int(nodes["parent"][0])
+        return moves[::-1]
+
+    def worst_branches(self, color, min_games=10, limit=10):
+        """
+        The moves after which the player of `color` scores worst, among those played in at least
+        `min_games` games, with the line leading to each and its stats.
+        """
+        edges = self.edges[(self.edges["color"] == color) & (self.edges["games"] >= min_games) & (self.edges["parent"] != 0)]
+        frame = stats_frame(edges)
+        frame = frame.sort_values(["score", "games"], ascending=[True, False]).head(limit)
+        frame.insert(0, "line", [" ".join(self.line(int(edges["parent"][i]), color) + [frame.at[i, "move"]]) for i in frame.index])
+        return frame.drop(columns="move").reset_index(drop=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Look up positions in the opening tree of a cleaned dataset.")
+    parser.add_argument("file_path", nargs="?", default="cleaned_games.parquet")
+    parser.add_argument("--moves", default="", help='SAN moves from the starting position, e.g. "e4 c5 Nf3"')
+    parser.add_argument("--color", choices=["white", "black"], help="Only games in which the player had this color")
+    parser.add_argument("--min-games", type=int, default=10)
+    args = parser.parse_args()
+
+    tree = OpeningTree.load(args.file_path.rstrip("/\\") + ".tree")
+    color = None if args.color is None else int(args.color == "black")
+    moves = args.moves.split()
+    stats = tree.lookup(moves, color)
+    print(f"{' '.join(moves) or 'Starting position'}: {stats['games']} games, score {stats['score']:.1%}")
+    print(tree.children(position_key(moves), color).head(20))
+    for side in ([color] if color is not None else [0, 1]):
+        print(f"Worst branches as {'black' if side else 'white'}:")
+        print(tree.worst_branches(side, args.min_games))
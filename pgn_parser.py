@@ -0,0 +1,60 @@
+import re
+from collections import namedtuple
+
+HEADER_RE = re.compile(r'\[(\w+)\s+"([^"]*)"\]')
+# Comments, (non-nested) variations and NAGs match without a group, so findall yields '' for them;
+# move numbers and results never start with a SAN character and are skipped entirely
+MOVE_RE = re.compile(r'\{[^}]*\}|\([^()]*\)|\$\d+|([a-hNBRQKO][a-h1-8xNBRQKO=+#\-]*[?!]*)')
+BLACK_FIRST_RE = re.compile(r'\s*\d+\.\.\.')
+# The blank line between the tag section and the movetext, with LF or CRLF line endings
+HEADER_END_RE = re.compile(r'\r?\n\r?\n')
+
+CASTLE_SIDES = {"O-O-O": "Queenside", "O-O": "Kingside"}
+
+ParsedPGN = namedtuple("ParsedPGN", ["headers", "white_moves", "black_moves", "move_count", "white_castle", "black_castle",
+                                     "moves"])
+
+def castle_side(moves):
+    """Returns the side ("Kingside" or "Queenside") of the first castling move in `moves`, or "None"."""
+    for san in moves:
+        if san[0] == "O":
+            return CASTLE_SIDES.get(san.rstrip("+#?!"), "None")
+    return "None"
+
+def split_pgn(pgn):
+    """Splits a PGN into its tag section and its movetext; a PGN without tags is all movetext."""
+    if "\r" in pgn:
+        parts = HEADER_END_RE.split(pgn, maxsplit=1)
+        head, movetext = parts if len(parts) == 2 else (pgn, "")
+    else:
+        head, _, movetext = pgn.partition("\n\n")
+    if not movetext and not head.lstrip().startswith("["):
+        head, movetext = "", head
+    return head, movetext
+
+def parse_pgn(pgn):
+    """
+    Parses a PGN string, scanning the tag section and the movetext once each.
+
+    Returns a ParsedPGN with the tag pairs as a dict, the SAN moves of each side (comments, NAGs and
+    variations skipped), the number of full moves played, the castling side of each player
+    ("Kingside", "Queenside" or "None") and every SAN move in the order played.
+    """
+    head, movetext = split_pgn(pgn)
+    headers = dict(HEADER_RE.findall(head))
+
+    sans = [san for san in MOVE_RE.findall(movetext) if san]
+    if BLACK_FIRST_RE.match(movetext):
+        white_moves, black_moves = sans[1::2], sans[0::2]
+    else:
+        white_moves, black_moves = sans[0::2], sans[1::2]
+
+    return ParsedPGN(
+        headers,
+        white_moves,
+        black_moves,
+        (len(sans) + 1) // 2,
+        castle_side(white_moves),
+        castle_side(black_moves),
+        sans,
+    )
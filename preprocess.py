@@ -1,7 +1,30 @@
+import numpy as np
 import pandas as pd
+import hashlib
+import inspect
 import json
+import os
 import re
-from datetime import datetime
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import islice
+
+import clocks as clock_parser
+import column_cache
+from clocks import MoveTimes, clocks_path
+from game_db import is_sqlite, write_sqlite
+from game_store import iter_raw_games, prefix_hash
+import opening_index
+import opening_tree
+import pgn_parser
+import replay as replay_engine
+import schema
+from opening_index import OpeningIndex
+from opening_tree import OpeningTree
+from pgn_parser import parse_pgn
+from schema import is_parquet, write_parquet
 
 # Function to convert decimal minutes to minutes:seconds format
 def convert_to_minutes_seconds(duration):
@@ -11,159 +34,420 @@ def convert_to_minutes_seconds(duration):
 
 # Function to count moves in the PGN string
 def count_moves(pgn):
-    move_pairs = re.findall(r'\d+\.\s([a-zA-Z0-9\+\#=\-]+)\s([a-zA-Z0-9\+\#=\-]+)', pgn)
-    if move_pairs:
-        return len(move_pairs)
-    single_moves = re.findall(r'\d+\.\s([a-zA-Z0-9\+\#=\-]+)', pgn)
-    return len(single_moves) // 2
-
-# Function to check for castling
-def detect_castling(moves, color):
+    return parse_pgn(pgn).move_count
+
+COLUMNS = ["result", "color", "opening", "time", "game_duration", "move_count", "castle", "opponent_castle",
+           "white_elo", "black_elo"]
+# Columns of the cleaned dataset: build_frame adds the opening ID next to the opening family
+CLEANED_COLUMNS = COLUMNS[:3] + ["opening_id", "family_id"] + COLUMNS[3:]
+# Features from replaying the moves (see replay), from the player's point of view: the plies at which
+# each side castled and at which the queens came off, and material (own minus opponent's) after move
+# 20 and at the end. Missing when the game is too short or a move could not be replayed
+REPLAY_COLUMNS = ["castle_ply", "opponent_castle_ply", "queen_trade_ply", "material_diff_20", "final_material_diff"]
+
+def replay_features(parsed, color):
+    """The REPLAY_COLUMNS values of a parsed game for the player of `color`."""
+    features = replay_engine.game_features(parsed) if parsed is not None else None
+    if features is None:
+        return (None,) * len(REPLAY_COLUMNS)
+    if color == "white":
+        castle_ply, opponent_castle_ply = features.white_castle_ply, features.black_castle_ply
+        material_20 = (features.white_material_20, features.black_material_20)
+        material = (features.white_material, features.black_material)
+    else:
+        castle_ply, opponent_castle_ply = features.black_castle_ply, features.white_castle_ply
+        material_20 = (features.black_material_20, features.white_material_20)
+        material = (features.black_material, features.white_material)
+    return (
+        castle_ply,
+        opponent_castle_ply,
+        features.queen_trade_ply,
+        material_20[0] - material_20[1] if material_20[0] is not None else None,
+        material[0] - material[1],
+    )
+
+def process_game(game, your_username, replay=False, clocks=False, tree=False):
+    """
+    Extracts the cleaned fields of one game as a tuple ordered like COLUMNS, with `time` left as the
+    epoch timestamp and `opening` as the ECO URL, which build_frame resolves through the opening
+    index. With `replay` the moves are replayed and the REPLAY_COLUMNS values follow. With `clocks`
+    an item (PGN, player color code, time control) for clocks.MoveTimes follows, and with `tree` a last
+    item (SAN moves, FEN, player color code, result) for opening_tree.chunk_edges. Returns None for
+    games that are skipped.
+    """
+    if isinstance(game, str):
+        game = json.loads(game)
+    if game.get("time_class", "") != "rapid":
+        return None  # Skip non-rapid games
+
+    white_elo = None
+    black_elo = None
+    result = "Unknown"
+    color = None
     castle = "None"
-    for move in moves:
+    opponent_castle = "None"
+    game_duration = None
+    move_count = None
+
+
+    # Check if you are the white player
+    if game["white"]["username"].lower() == your_username.lower():
+        color = "white"
+        result = game["white"].get("result", "Unknown")
+    # Otherwise, you're the black player
+    elif game["black"]["username"].lower() == your_username.lower():
+        color = "black"
+        result = game["black"].get("result", "Unknown")
+    else:
+        # If you're not in the game, skip it
+        return None
+    white_elo = game["white"].get("rating", None)
+    black_elo = game["black"].get("rating", None)
+
+    parsed = None
+    pgn = game.get("pgn", "")
+    if pgn:
+        # Headers, moves and castling of both sides come from a single pass over the PGN
+        parsed = parse_pgn(pgn)
         if color == "white":
-            if "0-0" in move:  # White castles kingside
-                castle = "Kingside"
-            elif "0-0-0" in move:  # White castles queenside
-                castle = "Queenside"
-        elif color == "black":
-            if "0-0" in move:  # Black castles kingside
-                castle = "Kingside"
-            elif "0-0-0" in move:  # Black castles queenside
-                castle = "Queenside"
-    return castle
-
-def preprocess_games(input_file="all_chess_games.json", output_file="cleaned_games.csv", your_username="ardaylmaz"):
-    with open(input_file, "r") as file:
-        games = json.load(file)
-
-    processed_data = []
-    for game in games:
-        if game.get("time_class", "") != "rapid":
-            continue  # Skip non-rapid games
-
-        white_elo = None
-        black_elo = None
-        result = "Unknown"
-        color = None
-        castle = "None"
-        opponent_castle = "None"
-        game_duration = None
-        move_count = None
-
-
-        # Check if you are the white player
-        if game["white"]["username"].lower() == your_username.lower():
-            color = "white"
-            result = game["white"].get("result", "Unknown")
-            white_elo = game["white"].get("rating", None)
-            black_elo = game["black"].get("rating", None)
-            # Check for castling in PGN (white's moves)
-            pgn = game.get("pgn", "")
-            if "O-O" in pgn.split()[::2]:  # Only check white's moves (odd-indexed moves in PGN)
-                castle = "Kingside"
-            elif "O-O-O" in pgn.split()[::2]:
-                castle = "Queenside"
-        # Otherwise, you're the black player
-        elif game["black"]["username"].lower() == your_username.lower():
-            color = "black"
-            result = game["black"].get("result", "Unknown")
-            white_elo = game["white"].get("rating", None)
-            black_elo = game["black"].get("rating", None)
-            # Check for castling in PGN (black's moves)
-            pgn = game.get("pgn", "")
-            if "O-O" in pgn.split()[1::2]:  # Only check black's moves (even-indexed moves in PGN)
-                castle = "Kingside"
-            elif "O-O-O" in pgn.split()[1::2]:
-                castle = "Queenside"
-        else:
-            # If you're not in the game, skip it
-            continue
-    
-            
-        # Determine opponent's castling (opposite color to yours)
-        opponent_color = "white" if color == "black" else "black"
-        opponent_pgn = game.get("pgn", "")
-        
-        # Split PGN into moves for each player
-        if opponent_color == "white":
-            # Opponent is white, check their moves (even-indexed moves)
-            if "O-O" in opponent_pgn.split()[::2]:
-                opponent_castle = "Kingside"
-            elif "O-O-O" in opponent_pgn.split()[::2]:
-                opponent_castle = "Queenside"
+            castle, opponent_castle = parsed.white_castle, parsed.black_castle
         else:
-            # Opponent is black, check their moves (odd-indexed moves)
-            if "O-O" in opponent_pgn.split()[1::2]:
-                opponent_castle = "Kingside"
-            elif "O-O-O" in opponent_pgn.split()[1::2]:
-                opponent_castle = "Queenside"
+            castle, opponent_castle = parsed.black_castle, parsed.white_castle
+
+        start_time = None
+        end_time = None
+        utc_date = parsed.headers.get("UTCDate")
+        utc_time = parsed.headers.get("UTCTime")
+        if utc_date and utc_time:
+            start_time = datetime.strptime(utc_date + " " + utc_time, "%Y.%m.%d %H:%M:%S")
+
+        end_time_str = parsed.headers.get("EndTime")
+        has_end_date = "EndDate" in parsed.headers
+        end_date = parsed.headers.get("EndDate", utc_date)
+        if end_date and end_time_str:
+            end_time = datetime.strptime(end_date + " " + end_time_str, "%Y.%m.%d %H:%M:%S")
+            # Without an EndDate header, a game that ends after midnight ends on the next day
+            if not has_end_date and start_time and end_time < start_time:
+                end_time += timedelta(days=1)
+
+        if start_time and end_time:
+            game_duration = (end_time - start_time).total_seconds() / 60
+
+        move_count = parsed.move_count
+
+    if game_duration is not None:
+        game_duration = convert_to_minutes_seconds(game_duration)
+
+
+    row = (
+        result,
+        color,
+        game.get("eco") or "Unknown",
+        game.get("end_time", None),
+        game_duration,
+        move_count,
+        castle,  # Now includes detected castling
+        opponent_castle,  # Opponent's castling
+        white_elo,
+        black_elo,
+    )
+    if replay:
+        row += replay_features(parsed, color)
+    if clocks:
+        time_control = parsed.headers.get("TimeControl") if parsed is not None else None
+        row += ((pgn, 0 if color == "white" else 1, time_control or game.get("time_control")),)
+    if tree:
+        moves, fen = (parsed.moves, parsed.headers.get("FEN")) if parsed is not None else ([], None)
+        row += ((moves, fen, 0 if color == "white" else 1, result),)
+    return row
+
+def process_chunk(games, your_username, replay=False, clocks=False, tree=False):
+    """
+    Processes a chunk of games into columns: a dict mapping each name in COLUMNS (and REPLAY_COLUMNS
+    with `replay`) to a list of values. With `clocks`, the "clocks" entry holds the chunk's clocks as
+    a clocks.MoveTimes, and with `tree` the "tree" entry the chunk's aggregated opening-tree edges, so
+    workers return flat arrays rather than PGNs and moves.
+    """
+    names = COLUMNS + REPLAY_COLUMNS if replay else COLUMNS
+    rows = [row for row in (process_game(game, your_username, replay, clocks, tree) for game in games) if row is not None]
+    move_times = edges = None
+    if tree:
+        edges = opening_tree.chunk_edges([row[-1] for row in rows])
+        rows = [row[:-1] for row in rows]
+    if clocks:
+        pgns, colors, time_controls = zip(*(row[-1] for row in rows)) if rows else ((), (), ())
+        move_times = MoveTimes.from_pgns(pgns, colors, time_controls)
+        rows = [row[:-1] for row in rows]
+    values = list(zip(*rows)) if rows else [()] * len(names)
+    columns = {name: list(column) for name, column in zip(names, values)}
+    if clocks:
+        columns["clocks"] = move_times
+    if tree:
+        columns["tree"] = edges
+    return columns
+
+def convert_times(epochs):
+    """Converts epoch seconds to timestamps, marking missing values "Unknown Time" and unconvertible ones "Invalid Time"."""
+    epochs = pd.Series(epochs, dtype="object")
+    present = epochs.notna() & (epochs != 0)
+    times = pd.to_datetime(pd.to_numeric(epochs.where(present), errors="coerce"), unit="s", errors="coerce")
+    if present.all() and times.notna().all():
+        return times
+    times = times.astype("object")
+    times[~present] = "Unknown Time"
+    times[present & pd.isna(times)] = "Invalid Time"
+    return times
+
+def build_frame(chunks, openings, replay=False):
+    """
+    Concatenates columnar chunks, in order, into the cleaned DataFrame. The ECO URLs are replaced by
+    their canonical opening family and the opening and family IDs assigned by `openings`, an OpeningIndex.
+    """
+    names = COLUMNS + REPLAY_COLUMNS if replay else COLUMNS
+    columns = {name: [] for name in names}
+    for chunk in chunks:
+        for name in names:
+            columns[name].extend(chunk[name])
+    columns["time"] = convert_times(columns["time"])
+    opening_ids = openings.ids(columns["opening"]) if columns["opening"] else np.array([], dtype=np.uint16)
+    columns["opening"] = openings.families()[opening_ids]
+    columns["opening_id"] = opening_ids
+    columns["family_id"] = openings.family_ids()[opening_ids]
+    return pd.DataFrame(columns, columns=CLEANED_COLUMNS + REPLAY_COLUMNS if replay else CLEANED_COLUMNS)
+
+def split_extras(chunks, parts):
+    """Passes chunks through, moving each chunk's per-chunk arrays (e.g. "clocks") to the list parts[name]."""
+    for chunk in chunks:
+        for name, values in parts.items():
+            values.append(chunk.pop(name))
+        yield chunk
+
+def iter_chunks(games, chunk_size):
+    """Groups an iterable of games into lists of at most `chunk_size` games."""
+    games = iter(games)
+    while True:
+        chunk = list(islice(games, chunk_size))
+        if not chunk:
+            return
+        yield chunk
 
-        pgn = game.get("pgn", "")
-        if pgn:
-            start_time = None
-            end_time = None
-            date_match = re.search(r'\[UTCDate "(\d{4}\.\d{2}\.\d{2})"\]', pgn)
-            time_match = re.search(r'\[UTCTime "(\d{2}:\d{2}:\d{2})"\]', pgn)
+def process_chunks_parallel(chunks, your_username, workers, replay=False, clocks=False, tree=False):
+    """
+    Processes chunks in a process pool, yielding the results in input order. At most 2 * workers
+    chunks are in flight, so the input is never read far ahead of the workers.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(process_chunk, chunk, your_username, replay, clocks, tree))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
 
-            if date_match and time_match:
-                start_time_str = date_match.group(1) + " " + time_match.group(1)
-                start_time = datetime.strptime(start_time_str, "%Y.%m.%d %H:%M:%S")
+URL_RE = re.compile(r'"url":\s*"([^"]+)"')
 
-            end_time_match = re.search(r'\[EndTime "(\d{2}:\d{2}:\d{2})"\]', pgn)
-            if end_time_match:
-                end_time_str = date_match.group(1) + " " + end_time_match.group(1)
-                end_time = datetime.strptime(end_time_str, "%Y.%m.%d %H:%M:%S")
+def game_key(game):
+    """
+    Identifies a game by its URL. Raw JSONL lines are matched with a regex instead of being decoded;
+    games without a URL fall back to a hash of their content.
+    """
+    if isinstance(game, str):
+        match = URL_RE.search(game)
+        return match.group(1) if match else hashlib.sha1(game.encode()).hexdigest()
+    return game.get("url") or hashlib.sha1(json.dumps(game, sort_keys=True).encode()).hexdigest()
 
-            if start_time and end_time:
-                game_duration = (end_time - start_time).total_seconds() / 60
+@lru_cache(maxsize=None)
+def logic_fingerprint(replay=False, clocks=False, tree=False):
+    """
+    Hash of the code that turns a game into a row, so rows written by older logic (or with replay
+    features, clocks or the opening tree switched on or off) can be detected.
+    """
+    sources = [inspect.getsource(process_game), inspect.getsource(convert_times),
+               inspect.getsource(pgn_parser), inspect.getsource(schema), inspect.getsource(opening_index)]
+    if replay:
+        sources += [inspect.getsource(replay_features), inspect.getsource(replay_engine)]
+    if clocks:
+        sources.append(inspect.getsource(clock_parser))
+    if tree:
+        sources += [inspect.getsource(opening_tree), inspect.getsource(replay_engine)]
+    return hashlib.sha1("".join(sources).encode()).hexdigest()
 
-            move_count = count_moves(pgn)
+def index_path(output_file):
+    """The processed-game index lives next to the output, e.g. cleaned_games.parquet.index.json."""
+    return output_file.rstrip("/\\") + ".index.json"
 
-            # Parse the moves and detect castling
-            moves = re.findall(r'\d+\.\s([a-zA-Z0-9\+\#=\-]+)\s?([a-zA-Z0-9\+\#=\-]+)?', pgn)  # Modified regex to capture all moves
+def keys_path(output_file):
+    """Keys of the processed games, one per line, e.g. cleaned_games.parquet.keys.txt."""
+    return output_file.rstrip("/\\") + ".keys.txt"
 
-        if game_duration is not None:
-            game_duration = convert_to_minutes_seconds(game_duration)
+def openings_path(output_file):
+    """The opening index of an output, e.g. cleaned_games.parquet.openings.json."""
+    return output_file.rstrip("/\\") + ".openings.json"
 
+def tree_path(output_file):
+    """The opening tree of an output, e.g. cleaned_games.parquet.tree (.edges.npy and .nodes.npy)."""
+    return output_file.rstrip("/\\") + ".tree"
 
-        opening_url = game.get("eco", "Unknown")
-        if opening_url != "Unknown":
-            opening_name = opening_url.split('/')[-1].replace('-', ' ').strip()
-            if ":" in opening_name:
-                opening_name = opening_name.split(":")[0]
+def load_index(output_file, your_username, replay=False, clocks=False, tree=False):
+    """
+    Returns the index of `output_file`: {"offset": bytes of the input store already processed,
+    "prefix": hash of the bytes before that offset, "games": number of processed games}. Returns None
+    if the output has to be rebuilt: no index, no output, another user, or rows written by different
+    processing logic.
+    """
+    path = index_path(output_file)
+    if not all(os.path.exists(p) for p in (path, keys_path(output_file), output_file)):
+        return None
+    try:
+        with open(path, "r") as file:
+            index = json.load(file)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if index.get("username", "").lower() != your_username.lower() or index.get("logic") != logic_fingerprint(replay, clocks, tree):
+        print("Processing logic or user changed; rebuilding the cleaned dataset.")
+        return None
+    return index
+
+def load_keys(output_file):
+    with open(keys_path(output_file), "r") as file:
+        return set(file.read().splitlines())
+
+def save_index(output_file, your_username, new_keys, append, offset=0, prefix=None, games=0, replay=False,
+               clocks=False, tree=False):
+    """Adds `new_keys` to the key file (replacing it unless `append`) and writes the index next to it."""
+    with open(keys_path(output_file), "a" if append else "w") as file:
+        file.writelines(key + "\n" for key in new_keys)
+    path = index_path(output_file)
+    tmp_path = path + ".tmp"
+    index = {"username": your_username, "logic": logic_fingerprint(replay, clocks, tree), "offset": offset, "prefix": prefix,
+             "games": games}
+    with open(tmp_path, "w") as file:
+        json.dump(index, file)
+    os.replace(tmp_path, path)
+
+def resume_offset(input_file, index):
+    """
+    Byte offset of an uncompressed .jsonl store up to which every game is already processed, or 0 if
+    the store was rewritten with a different beginning since the index was saved.
+    """
+    offset = index.get("offset", 0)
+    if not input_file.endswith(".jsonl") or not offset or os.path.getsize(input_file) < offset:
+        return 0
+    return offset if prefix_hash(input_file, offset) == index.get("prefix") else 0
+
+def preprocess_games(input_file="all_chess_games.jsonl", output_file="cleaned_games.parquet", your_username="ardaylmaz",
+                     workers=1, chunk_size=10000, incremental=False, replay=False, clocks=False, tree=False):
+    """
+    Cleans the rapid games of `your_username` and saves them to `output_file`.
+
+    Games are processed in chunks of `chunk_size`. With workers > 1 the chunks are spread over a
+    process pool; each worker returns columns rather than per-game dicts, and the output is identical
+    to the serial mode.
+
+    A .parquet `output_file` is written as a typed dataset partitioned by month, a .db/.sqlite one as
+    an indexed SQLite table (see game_db); any other path is written as CSV.
+
+    With `replay`, every game's moves are replayed on a board (see replay) and the REPLAY_COLUMNS
+    features are added; this costs a few hundred microseconds per game.
+
+    With `clocks`, the [%clk] comments of every game are kept as a clocks.MoveTimes, flat arrays of
+    every ply's remaining time, in <output_file>.clocks.npz, one game per row in processing order.
+
+    With `tree`, the positions of the first opening_tree.TREE_PLIES plies of every game are counted
+    into an opening tree kept in <output_file>.tree.edges.npy and .nodes.npy (see opening_tree).
+
+    The cleaned rows are also written to a memory-mapped column cache next to the output (see
+    column_cache), which load_data opens without parsing while the output is unchanged.
+
+    Openings are stored as their canonical family plus an integer `opening_id` (family and variation)
+    and `family_id` from the opening index kept next to the output (<output_file>.openings.json), so
+    IDs stay the same across runs.
+
+    Every run keeps the keys of the games it processed in an index next to the output
+    (<output_file>.keys.txt). With `incremental`, only games missing from it are parsed, and their
+    rows are appended to the existing output. For an uncompressed .jsonl input the index also keeps a high-water mark, so
+    when the store has only grown since the last run, reading starts where that run stopped without
+    loading the keys. The index (<output_file>.index.json) records a fingerprint of the processing code,
+    so changing that logic triggers a full rebuild.
+
+    Returns the cleaned rows (only the new ones when appending) with the compact schema of
+    schema.to_typed_frame; a CSV output keeps the readable "M:SS" durations and time strings.
+    """
+    index = load_index(output_file, your_username, replay, clocks, tree) if incremental else None
+    append = index is not None
+    start = resume_offset(input_file, index) if append else 0
+    # Games before the high-water mark are known to be processed, so their keys are not needed
+    seen = load_keys(output_file) if append and not start else set()
+    end = os.path.getsize(input_file) if input_file.endswith(".jsonl") else None
+    new_keys = []
+
+    def unseen(games):
+        for game in games:
+            key = game_key(game)
+            if key not in seen:
+                seen.add(key)
+                new_keys.append(key)
+                yield game
+
+    def record(games):
+        for game in games:
+            new_keys.append(game_key(game))
+            yield game
+
+    # Games are streamed from a JSONL store as raw lines and decoded by the workers
+    games = iter_raw_games(input_file, start, end)
+    games = unseen(games) if incremental else record(games)
+    chunks = iter_chunks(games, chunk_size)
+
+    if workers > 1:
+        processed = process_chunks_parallel(chunks, your_username, workers, replay, clocks, tree)
+    else:
+        processed = (process_chunk(chunk, your_username, replay, clocks, tree) for chunk in chunks)
+
+    parts = {name: [] for name, enabled in (("clocks", clocks), ("tree", tree)) if enabled}
+    if parts:
+        processed = split_extras(processed, parts)
+
+    openings = OpeningIndex(openings_path(output_file))
+    df = build_frame(processed, openings, replay)
+    if append and df.empty:
+        print(f"No new games; {output_file} is up to date.")
+    else:
+        # Checked before the dataset changes: only a cache of exactly the old rows can be appended to
+        cache_appendable = append and column_cache.is_fresh(output_file)
+        if is_parquet(output_file):
+            write_parquet(df, output_file, append=append)
+        elif is_sqlite(output_file):
+            write_sqlite(df, output_file, append=append)
         else:
-            opening_name = "Unknown Opening"
-
-        time_epoch = game.get("end_time", None)
-        if time_epoch:
-            try:
-                # Convert the epoch timestamp to a readable datetime
-                time = pd.to_datetime(time_epoch, unit='s')
-            except Exception as e:
-                print(f"Error converting time: {e}")
-                time = "Invalid Time"
+            df.to_csv(output_file, mode="a" if append else "w", header=not append, index=False)
+        if append:
+            print(f"Appended {len(df)} rows for {len(new_keys)} new games to {output_file}.")
         else:
-            time = "Unknown Time"
-
-
-        game_data = {
-            "result": result,
-            "color": color,
-            "opening": opening_name,
-            "time": time,
-            "game_duration": game_duration,
-            "move_count": move_count,
-            "castle": castle,  # Now includes detected castling
-            "opponent_castle": opponent_castle,  # Opponent's castling
-            "white_elo": white_elo,
-            "black_elo": black_elo
-        }
-        processed_data.append(game_data)
-
-    df = pd.DataFrame(processed_data)
-    df.to_csv(output_file, index=False)
-    print(f"Preprocessed data saved to {output_file}.")
+            print(f"Preprocessed data saved to {output_file}.")
+        openings.save()
+        typed = schema.to_typed_frame(df, copy=False)
+        if append and not cache_appendable:
+            column_cache.build(output_file)
+        else:
+            column_cache.write(output_file, typed, append=append)
+        if clocks:
+            if append and os.path.exists(clocks_path(output_file)):
+                parts["clocks"].insert(0, MoveTimes.load(clocks_path(output_file)))
+            MoveTimes.concat(parts["clocks"]).save(clocks_path(output_file))
+        if tree:
+            if append and os.path.exists(tree_path(output_file) + ".edges.npy"):
+                parts["tree"].insert(0, OpeningTree.load(tree_path(output_file), mmap=False).edges)
+            OpeningTree.from_parts(parts["tree"]).save(tree_path(output_file))
+    # Full rebuilds rewrite the index too, so that a later incremental run does not resume from the
+    # high-water mark and keys of an older output
+    prefix = prefix_hash(input_file, end) if end else None
+    total = (index["games"] if append else 0) + len(new_keys)
+    save_index(output_file, your_username, new_keys, append, end or 0, prefix, total, replay, clocks, tree)
+
+    # The cleaned rows just written (only the new ones when appending), in the compact schema
+    return schema.to_typed_frame(df, copy=False)
 
 if __name__ == "__main__":
-    preprocess_games(your_username="ardaylmaz")
+    preprocess_games(your_username="ardaylmaz", workers=os.cpu_count(), incremental=True)
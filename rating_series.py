@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+from features import add_derived_features
+
+def rating_series(df, start_date=None):
+    """
+    The player's rating after each game as a Series indexed by game time, sorted by time, built with
+    vectorized operations from `time`, `color` and the Elo columns. Games without a valid time or
+    rating are dropped; with `start_date` only games from that date on are kept.
+    """
+    add_derived_features(df)
+    times = df["time"]
+    if not pd.api.types.is_datetime64_any_dtype(times):
+        times = pd.to_datetime(times, errors="coerce")
+    times = times.to_numpy()
+    elo = df["my_elo"].to_numpy(dtype="float64")
+    keep = ~np.isnat(times) & ~np.isnan(elo)
+    if start_date is not None:
+        keep &= times >= np.datetime64(pd.Timestamp(start_date))
+    order = np.argsort(times[keep], kind="stable")
+    return pd.Series(elo[keep][order], index=pd.DatetimeIndex(times[keep][order], name="time"), name="elo")
+
+def resample_close(series, rule="D"):
+    """The last rating of each period (e.g. "D" daily, "W" weekly), skipping periods without games."""
+    return series.resample(rule).last().dropna()
+
+def rating_bands(series, rule="W"):
+    """Per-period low, high and closing rating, for drawing a min/max band around the close."""
+    resampled = series.resample(rule)
+    bands = pd.DataFrame({"low": resampled.min(), "high": resampled.max(), "close": resampled.last()})
+    return bands.dropna()
+
+def rolling_mean(series, window=50):
+    """Rolling mean of the rating over `window` games, or over a time span such as "30D"."""
+    return series.rolling(window, min_periods=1).mean()
+
+def lttb_indices(x, y, threshold):
+    """
+    Indices of the `threshold` points kept by Largest-Triangle-Three-Buckets downsampling. The first
+    and last points are always kept; every bucket in between contributes the point forming the largest
+    triangle with the previously kept point and the average of the next bucket.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    # threshold - 2 buckets over the points between the first and the last
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        average_x = x[end:next_end].mean()
+        average_y = y[end:next_end].mean()
+        areas = np.abs((x[previous] - average_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (average_y - y[previous]))
+        previous = start + int(areas.argmax())
+        indices[bucket + 1] = previous
+    return indices
+
+def downsample(series, max_points=1000):
+    """At most `max_points` points of a time series chosen by LTTB, so plotting cost stays bounded."""
+    x = series.index.asi8 if isinstance(series.index, pd.DatetimeIndex) else series.index.to_numpy()
+    return series.iloc[lttb_indices(x, series.to_numpy(), max_points)]
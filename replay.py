@@ -0,0 +1,331 @@
+import hashlib
+from collections import namedtuple
+
+from pgn_parser import parse_pgn
+
+WHITE, BLACK = 0, 1
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+PIECE_LETTERS = {"N": KNIGHT, "B": BISHOP, "R": ROOK, "Q": QUEEN, "K": KING}
+FEN_PIECES = {"p": PAWN, "n": KNIGHT, "b": BISHOP, "r": ROOK, "q": QUEEN, "k": KING}
+PIECE_VALUES = (1, 3, 3, 5, 9, 0)
+
+STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+# Rook origin and destination files of each castling move
+CASTLING_ROOKS = {"O-O": (7, 5), "O-O-O": (0, 3)}
+# Plies after which "material at move 20" is taken: both sides have played 20 moves
+MATERIAL_PLY = 40
+
+# Squares are numbered a1 = 0, b1 = 1, ..., h8 = 63; a bitboard has bit n set for square n
+SQUARES = {f"{file}{rank}": (rank - 1) * 8 + index for index, file in enumerate("abcdefgh") for rank in range(1, 9)}
+FILE_MASKS = [sum(1 << (rank * 8 + file) for rank in range(8)) for file in range(8)]
+RANK_MASKS = [0xFF << (rank * 8) for rank in range(8)]
+DISAMBIGUATION_MASKS = {**{"abcdefgh"[i]: FILE_MASKS[i] for i in range(8)}, **{"12345678"[i]: RANK_MASKS[i] for i in range(8)}}
+
+def step_attacks(steps):
+    """For every square, the bitboard of squares one of `steps` (file, rank) offsets away."""
+    table = []
+    for square in range(64):
+        file, rank = square % 8, square // 8
+        table.append(sum(1 << ((rank + dr) * 8 + file + df) for df, dr in steps if 0 <= file + df < 8 and 0 <= rank + dr < 8))
+    return table
+
+KNIGHT_ATTACKS = step_attacks([(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)])
+KING_ATTACKS = step_attacks([(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)])
+# PAWN_ATTACKS[color][square]: squares a pawn of `color` on `square` attacks
+PAWN_ATTACKS = (step_attacks([(-1, 1), (1, 1)]), step_attacks([(-1, -1), (1, -1)]))
+
+def zobrist_key(name):
+    """A fixed pseudo-random 64-bit key, derived from `name` so that hashes stay the same across runs and versions."""
+    return int.from_bytes(hashlib.blake2b(name.encode(), digest_size=8).digest(), "little")
+
+# Zobrist keys: one per piece and square, castling right, en passant file and for Black to move
+ZOBRIST_PIECES = [[zobrist_key(f"piece {index} {square}") for square in range(64)] for index in range(12)]
+ZOBRIST_BLACK = zobrist_key("black to move")
+ZOBRIST_EN_PASSANT = [zobrist_key(f"en passant {file}") for file in range(8)]
+# Castling rights are bits: 1 White kingside, 2 White queenside, 4 Black kingside, 8 Black queenside
+CASTLING_RIGHTS = {"K": 1, "Q": 2, "k": 4, "q": 8}
+ZOBRIST_CASTLING = [0] * 16
+for rights in range(16):
+    for bit in range(4):
+        if rights & (1 << bit):
+            ZOBRIST_CASTLING[rights] ^= zobrist_key(f"castling {bit}")
+# The rights kept when a piece moves from or to a square: moving the king or a rook, or capturing a
+# rook on its starting square, loses them
+CASTLING_KEEP = [15] * 64
+for square, lost in ((4, 3), (7, 1), (0, 2), (60, 12), (63, 4), (56, 8)):
+    CASTLING_KEEP[square] = 15 ^ lost
+
+def rays(df, dr):
+    """For every square, the bitboard of squares in direction (df, dr) up to the edge of the board."""
+    table = []
+    for square in range(64):
+        file, rank = square % 8 + df, square // 8 + dr
+        bits = 0
+        while 0 <= file < 8 and 0 <= rank < 8:
+            bits |= 1 << (rank * 8 + file)
+            file, rank = file + df, rank + dr
+        table.append(bits)
+    return table
+
+# Rays towards higher squares stop at their lowest blocker, rays towards lower squares at their highest
+ROOK_RAYS = ((True, rays(0, 1)), (True, rays(1, 0)), (False, rays(0, -1)), (False, rays(-1, 0)))
+BISHOP_RAYS = ((True, rays(1, 1)), (True, rays(-1, 1)), (False, rays(-1, -1)), (False, rays(1, -1)))
+
+def slider_attacks(square, occupied, directions):
+    """Squares a rook or bishop (per `directions`) on `square` attacks, up to and including the first blocker."""
+    attacks = 0
+    for increasing, table in directions:
+        ray = table[square]
+        blockers = ray & occupied
+        if blockers:
+            blocker = (blockers & -blockers).bit_length() - 1 if increasing else blockers.bit_length() - 1
+            ray ^= table[blocker]
+        attacks |= ray
+    return attacks
+
+def lowest_square(bitboard):
+    return (bitboard & -bitboard).bit_length() - 1
+
+ReplayFeatures = namedtuple("ReplayFeatures", ["plies", "white_castle_ply", "black_castle_ply", "queen_trade_ply",
+                                               "white_material_20", "black_material_20", "white_material", "black_material"])
+
+class Board:
+    """
+    A position as 12 bitboards (pieces[color * 6 + piece]) plus the occupancy of each color. Moves are
+    applied from SAN without generating every legal move: the moving piece is found by looking back
+    from the target square, and only an ambiguous SAN pays for a pin check.
+    """
+
+    __slots__ = ("pieces", "occupied", "turn", "material", "castling", "en_passant", "hash")
+
+    def __init__(self, fen=STARTING_FEN):
+        fields = fen.split()
+        placement, turn = fields[:2]
+        self.pieces = [0] * 12
+        for rank, row in enumerate(reversed(placement.split("/"))):
+            file = 0
+            for char in row:
+                if char.isdigit():
+                    file += int(char)
+                    continue
+                color = BLACK if char.islower() else WHITE
+                self.pieces[color * 6 + FEN_PIECES[char.lower()]] |= 1 << (rank * 8 + file)
+                file += 1
+        self.occupied = [self.pieces[0] | self.pieces[1] | self.pieces[2] | self.pieces[3] | self.pieces[4] | self.pieces[5],
+                         self.pieces[6] | self.pieces[7] | self.pieces[8] | self.pieces[9] | self.pieces[10] | self.pieces[11]]
+        self.turn = WHITE if turn == "w" else BLACK
+        self.material = [sum(PIECE_VALUES[piece] * self.pieces[color * 6 + piece].bit_count() for piece in range(5))
+                         for color in (WHITE, BLACK)]
+        self.castling = sum(CASTLING_RIGHTS.get(char, 0) for char in fields[2]) if len(fields) > 2 else 0
+        self.en_passant = SQUARES.get(fields[3]) if len(fields) > 3 else None
+        # Zobrist hash of the piece placement, updated with every move; zobrist() adds the rest of the position
+        self.hash = 0
+        for index, bitboard in enumerate(self.pieces):
+            while bitboard:
+                self.hash ^= ZOBRIST_PIECES[index][lowest_square(bitboard)]
+                bitboard &= bitboard - 1
+
+    def piece_at(self, square, color):
+        """The piece type of `color` on `square`, or None."""
+        bit = 1 << square
+        if not self.occupied[color] & bit:
+            return None
+        base = color * 6
+        for piece in range(6):
+            if self.pieces[base + piece] & bit:
+                return piece
+
+    def is_attacked(self, square, by, occupied, removed=0):
+        """Whether `by` attacks `square` with `occupied` squares and the pieces on `removed` captured."""
+        base = by * 6
+        keep = ~removed
+        pieces = self.pieces
+        if KNIGHT_ATTACKS[square] & pieces[base + KNIGHT] & keep:
+            return True
+        if PAWN_ATTACKS[1 - by][square] & pieces[base + PAWN] & keep:
+            return True
+        if KING_ATTACKS[square] & pieces[base + KING]:
+            return True
+        queens = pieces[base + QUEEN]
+        if slider_attacks(square, occupied, BISHOP_RAYS) & (pieces[base + BISHOP] | queens) & keep:
+            return True
+        return bool(slider_attacks(square, occupied, ROOK_RAYS) & (pieces[base + ROOK] | queens) & keep)
+
+    def leaves_king_safe(self, piece, origin, target):
+        """Whether moving `piece` from `origin` to `target` keeps the mover's king out of check."""
+        color = self.turn
+        move = (1 << origin) | (1 << target)
+        occupied = ((self.occupied[0] | self.occupied[1]) & ~(1 << origin)) | (1 << target)
+        king = target if piece == KING else lowest_square(self.pieces[color * 6 + KING])
+        return not self.is_attacked(king, 1 - color, occupied, removed=move & self.occupied[1 - color])
+
+    def capture(self, square):
+        """Removes the opponent's piece on `square`, returning its type (None if the square is empty)."""
+        them = 1 - self.turn
+        piece = self.piece_at(square, them)
+        if piece is not None:
+            bit = 1 << square
+            self.pieces[them * 6 + piece] ^= bit
+            self.occupied[them] ^= bit
+            self.material[them] -= PIECE_VALUES[piece]
+            self.hash ^= ZOBRIST_PIECES[them * 6 + piece][square]
+        return piece
+
+    def move_piece(self, piece, origin, target):
+        index = self.turn * 6 + piece
+        move = (1 << origin) | (1 << target)
+        self.pieces[index] ^= move
+        self.occupied[self.turn] ^= move
+        keys = ZOBRIST_PIECES[index]
+        self.hash ^= keys[origin] ^ keys[target]
+        if self.castling:
+            self.castling &= CASTLING_KEEP[origin] & CASTLING_KEEP[target]
+
+    def push(self, san):
+        """
+        Plays one SAN move (e.g. "Nbd2", "exd6", "e8=Q+", "O-O") for the side to move. Returns "O" for
+        castling, "x" for a capture and "" otherwise. Raises ValueError if the move cannot be played.
+        """
+        san = san.rstrip("+#?!")
+        color = self.turn
+        kind = ""
+        self.en_passant = None
+        first = san[0]
+        if first == "O":
+            rank = 0 if color == WHITE else 56
+            rook = CASTLING_ROOKS.get(san)
+            # Only standard castling: Chess960 castling from other squares is not supported
+            if rook is None or not self.pieces[color * 6 + KING] & (1 << (rank + 4)) \
+                    or not self.pieces[color * 6 + ROOK] & (1 << (rank + rook[0])):
+                raise ValueError(f"Invalid castling move: {san}")
+            self.move_piece(KING, rank + 4, rank + (6 if san == "O-O" else 2))
+            self.move_piece(ROOK, rank + rook[0], rank + rook[1])
+            kind = "O"
+        elif first in PIECE_LETTERS:
+            piece = PIECE_LETTERS[first]
+            body = san[1:].replace("x", "")
+            target = SQUARES.get(body[-2:])
+            if target is None:
+                raise ValueError(f"Invalid move: {san}")
+            pieces = self.pieces[color * 6 + piece]
+            if piece == KNIGHT:
+                candidates = KNIGHT_ATTACKS[target] & pieces
+            elif piece == KING:
+                candidates = KING_ATTACKS[target] & pieces
+            else:
+                occupied = self.occupied[0] | self.occupied[1]
+                attacks = 0
+                if piece != ROOK:
+                    attacks |= slider_attacks(target, occupied, BISHOP_RAYS)
+                if piece != BISHOP:
+                    attacks |= slider_attacks(target, occupied, ROOK_RAYS)
+                candidates = attacks & pieces
+            for char in body[:-2]:
+                candidates &= DISAMBIGUATION_MASKS.get(char, 0)
+            if candidates & (candidates - 1):
+                # Several pieces reach the target; SAN leaves out those that are pinned
+                legal = 0
+                bits = candidates
+                while bits:
+                    origin = lowest_square(bits)
+                    bits &= bits - 1
+                    if self.leaves_king_safe(piece, origin, target):
+                        legal |= 1 << origin
+                candidates = legal
+            if not candidates or candidates & (candidates - 1):
+                raise ValueError(f"Illegal or ambiguous move: {san}")
+            if self.occupied[1 - color] & (1 << target):
+                self.capture(target)
+                kind = "x"
+            self.move_piece(piece, lowest_square(candidates), target)
+        else:
+            promotion = None
+            if "=" in san:
+                san, _, letter = san.partition("=")
+                promotion = PIECE_LETTERS.get(letter[:1])
+                if promotion is None or promotion == KING:
+                    raise ValueError(f"Invalid promotion: {san}={letter}")
+            target = SQUARES.get(san[-2:])
+            if target is None:
+                raise ValueError(f"Invalid move: {san}")
+            forward = 8 if color == WHITE else -8
+            pawns = self.pieces[color * 6 + PAWN]
+            if len(san) == 2:
+                origin = target - forward
+                if not pawns & (1 << origin):
+                    origin -= forward
+                    self.en_passant = target - forward
+                if not pawns & (1 << origin) or (self.occupied[0] | self.occupied[1]) & (1 << target):
+                    raise ValueError(f"Illegal move: {san}")
+            else:
+                side = ord(san[0]) - ord(san[-2])
+                origin = target - forward + side
+                if side not in (-1, 1) or not 0 <= origin < 64 or not pawns & (1 << origin):
+                    raise ValueError(f"Illegal move: {san}")
+                # Capturing onto an empty square is en passant: the captured pawn is beside the origin
+                if self.capture(target) is None and self.capture(target - forward) != PAWN:
+                    raise ValueError(f"Illegal move: {san}")
+                kind = "x"
+            self.move_piece(PAWN, origin, target)
+            if promotion is not None:
+                bit = 1 << target
+                self.pieces[color * 6 + PAWN] ^= bit
+                self.pieces[color * 6 + promotion] ^= bit
+                self.hash ^= ZOBRIST_PIECES[color * 6 + PAWN][target] ^ ZOBRIST_PIECES[color * 6 + promotion][target]
+                self.material[color] += PIECE_VALUES[promotion] - PIECE_VALUES[PAWN]
+        self.turn = 1 - color
+        return kind
+
+    def zobrist(self):
+        """
+        64-bit Zobrist hash of the position: pieces, side to move, castling rights and the en passant
+        file, the latter only when a pawn can actually capture en passant, so transpositions match.
+        """
+        key = self.hash ^ ZOBRIST_CASTLING[self.castling]
+        if self.turn == BLACK:
+            key ^= ZOBRIST_BLACK
+        if self.en_passant is not None and PAWN_ATTACKS[1 - self.turn][self.en_passant] & self.pieces[self.turn * 6 + PAWN]:
+            key ^= ZOBRIST_EN_PASSANT[self.en_passant % 8]
+        return key
+
+    def has_queens(self):
+        return bool(self.pieces[QUEEN] | self.pieces[6 + QUEEN])
+
+def replay(sans, fen=None):
+    """
+    Replays SAN moves from the starting position (or `fen`) and returns their ReplayFeatures: the number
+    of plies, the ply at which each side castled, the ply after which no queen is left on the board
+    (None if the queens stay or there were none), the material of each side after move 20 (None if
+    the game is shorter) and at the end. Plies count from 1; material counts pawns 1, knights and
+    bishops 3, rooks 5 and queens 9. Raises ValueError at the first move that cannot be played.
+    """
+    board = Board(fen or STARTING_FEN)
+    castle_plies = [None, None]
+    queen_trade_ply = None
+    material_20 = (None, None)
+    queens = board.has_queens()
+    for ply, san in enumerate(sans, 1):
+        color = board.turn
+        kind = board.push(san)
+        if kind == "O":
+            if castle_plies[color] is None:
+                castle_plies[color] = ply
+        elif kind == "x" and queens and queen_trade_ply is None and not board.has_queens():
+            queen_trade_ply = ply
+        if ply == MATERIAL_PLY:
+            material_20 = tuple(board.material)
+    return ReplayFeatures(len(sans), castle_plies[WHITE], castle_plies[BLACK], queen_trade_ply,
+                          material_20[WHITE], material_20[BLACK], board.material[WHITE], board.material[BLACK])
+
+def game_features(parsed):
+    """ReplayFeatures of a pgn_parser.ParsedPGN, or None if it has no moves or one cannot be played."""
+    if not parsed.moves:
+        return None
+    try:
+        return replay(parsed.moves, parsed.headers.get("FEN"))
+    except (ValueError, KeyError):
+        return None
+
+def pgn_features(pgn):
+    """ReplayFeatures of a PGN string, like game_features."""
+    return game_features(parse_pgn(pgn))
@@ -0,0 +1,173 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from aggregates import DIMENSIONS, group_codes
+from features import add_derived_features
+
+# Upper bound on the memory of one batch of resamples; batch sizes are derived from it
+MAX_BATCH_BYTES = 64 << 20
+# Values with at most this many distinct levels (e.g. scores of 0, 0.5 and 1) are resampled as
+# counts per level instead of game by game
+MAX_LEVELS = 32
+
+class GroupSample:
+    """
+    The values of a test's groups, ready for resampling: `values` sorted by group, `sizes` games per
+    group, and for discrete values the `levels` and the `table` of games per group and level.
+    """
+
+    def __init__(self, codes, values, groups):
+        keep = (codes >= 0) & ~np.isnan(values)
+        codes = codes[keep]
+        order = np.argsort(codes, kind="stable")
+        self.groups = list(groups)
+        self.values = values[keep][order]
+        self.sizes = np.bincount(codes, minlength=len(self.groups))
+        self.starts = np.concatenate([[0], np.cumsum(self.sizes)[:-1]])
+        self.levels, level_codes = np.unique(self.values, return_inverse=True)
+        if len(self.levels) <= MAX_LEVELS:
+            self.table = np.zeros((len(self.groups), len(self.levels)), dtype=np.int64)
+            np.add.at(self.table, (codes[order], level_codes.reshape(-1)), 1)
+        else:
+            self.table = None
+
+    def sums(self):
+        """Sum and sum of squares of the values of each group."""
+        return (np.add.reduceat(self.values, self.starts), np.add.reduceat(self.values * self.values, self.starts))
+
+def group_sample(df, dimension, value, groups=None):
+    """
+    The GroupSample of `value` (e.g. "score") over the groups of `dimension` (a key of
+    aggregates.DIMENSIONS), keeping only `groups`, in that order, when given.
+    """
+    add_derived_features(df)
+    codes, labels = group_codes(DIMENSIONS[dimension](df), sort=True)
+    labels = list(labels)
+    if groups is not None:
+        remap = np.full(len(labels) + 1, -1, dtype=np.int64)
+        for i, group in enumerate(groups):
+            if group in labels:
+                remap[labels.index(group)] = i
+        codes = remap[codes]
+        labels = list(groups)
+    return GroupSample(np.asarray(codes), df[value].to_numpy(dtype="float64", na_value=np.nan), labels)
+
+def welch_t(sizes, sums, sumsq):
+    """Welch's t statistic of the first group against the second, for each row of sums."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / sizes
+        variances = (sumsq - sums * means) / (sizes - 1)
+        return (means[..., 0] - means[..., 1]) / np.sqrt(variances[..., 0] / sizes[0] + variances[..., 1] / sizes[1])
+
+def f_statistic(sizes, sums, sumsq):
+    """One-way ANOVA F statistic over the groups, for each row of sums."""
+    total = sizes.sum()
+    k = len(sizes)
+    between_sums = (sums * sums / sizes).sum(axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        between = between_sums - sums.sum(axis=-1) ** 2 / total
+        within = sumsq.sum(axis=-1) - between_sums
+        return (between / (k - 1)) / (within / (total - k))
+
+def test_statistic(sizes, sums, sumsq):
+    """|Welch t| for two groups, the F statistic for more; larger values are further from the null."""
+    if len(sizes) == 2:
+        return np.abs(welch_t(sizes, sums, sumsq))
+    return f_statistic(sizes, sums, sumsq)
+
+def permuted_tables(table, size, rng):
+    """
+    `size` random games-per-level tables of the groups after shuffling the group labels, i.e. with the
+    same group sizes and level totals as `table`, drawn as sequential hypergeometric samples.
+    """
+    k, levels = table.shape
+    remaining = np.tile(table.sum(axis=0), (size, 1))
+    tables = np.empty((size, k, levels), dtype=np.int64)
+    for group in range(k - 1):
+        left = np.full(size, table[group].sum(), dtype=np.int64)
+        others = remaining.sum(axis=1)
+        for level in range(levels - 1):
+            others -= remaining[:, level]
+            drawn = rng.hypergeometric(remaining[:, level], others, left)
+            tables[:, group, level] = drawn
+            left -= drawn
+        tables[:, group, -1] = left
+        remaining -= tables[:, group]
+    tables[:, -1] = remaining
+    return tables
+
+def bootstrap_tables(table, size, rng):
+    """`size` random tables with each group resampled with replacement from the pooled games (the null)."""
+    pooled = table.sum(axis=0) / table.sum()
+    return np.stack([rng.multinomial(n, pooled, size=size) for n in table.sum(axis=1)], axis=1)
+
+def resampled_sums(sample, method, size, rng):
+    """Per-group sums and sums of squares of `size` resamples, each an array of shape (size, groups)."""
+    if sample.table is not None:
+        tables = (permuted_tables if method == "permutation" else bootstrap_tables)(sample.table, size, rng)
+        return tables @ sample.levels, tables @ (sample.levels * sample.levels)
+    n = len(sample.values)
+    if method == "permutation":
+        # Every row is the games shuffled in place, while the groups keep their positions
+        resampled = np.tile(sample.values, (size, 1))
+        rng.permuted(resampled, axis=1, out=resampled)
+    else:
+        # Every row of the index matrix draws all games with replacement from the pooled games
+        resampled = sample.values[rng.integers(0, n, size=(size, n))]
+    return np.add.reduceat(resampled, sample.starts, axis=1), np.add.reduceat(resampled * resampled, sample.starts, axis=1)
+
+def resample_statistics(sample, method, seeds, batch_sizes):
+    """The test statistic of every resample of the given batches, one seeded generator per batch."""
+    results = []
+    for seed, size in zip(seeds, batch_sizes):
+        sums, sumsq = resampled_sums(sample, method, size, np.random.default_rng(seed))
+        results.append(test_statistic(sample.sizes, sums, sumsq))
+    return np.concatenate(results) if results else np.empty(0)
+
+def default_batch_size(sample, resamples):
+    """The largest batch whose working arrays stay within MAX_BATCH_BYTES."""
+    if sample.table is not None:
+        per_resample = sample.table.size * 8 * 4
+    else:
+        per_resample = len(sample.values) * 8 * 4
+    return int(min(max(MAX_BATCH_BYTES // per_resample, 1), resamples))
+
+def resampling_test(sample, method="permutation", resamples=10000, seed=0, workers=1, batch_size=None):
+    """
+    Permutation or bootstrap significance test of the differences between the groups of a GroupSample:
+    Welch's t for two groups, the ANOVA F statistic for more, without their normality assumptions.
+
+    A permutation test shuffles the group labels; a bootstrap test redraws every group with replacement
+    from the pooled games. Resamples are generated in batches of `batch_size` (by default as many as fit
+    in MAX_BATCH_BYTES), each from its own generator seeded from `seed`, so the result does not depend
+    on `workers`; with workers > 1 the batches are spread over a process pool.
+
+    Returns:
+        tuple: (observed statistic, p-value), the p-value counting the observed data as one resample.
+        Both are NaN when a group has fewer than 2 games or the statistic is undefined (e.g. no variance).
+    """
+    if method not in ("permutation", "bootstrap"):
+        raise ValueError(f"Unknown resampling method: {method}")
+    if len(sample.sizes) < 2 or (sample.sizes < 2).any():
+        return np.nan, np.nan
+    observed = test_statistic(sample.sizes, *sample.sums())
+    if np.isnan(observed):
+        return np.nan, np.nan
+    batch_size = batch_size or default_batch_size(sample, resamples)
+    batch_sizes = [min(batch_size, resamples - start) for start in range(0, resamples, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(batch_sizes))
+
+    if workers > 1 and len(batch_sizes) > 1:
+        # Each worker gets a contiguous share of the batches, so the sample is sent once per worker
+        shares = np.array_split(np.arange(len(batch_sizes)), min(workers, len(batch_sizes)))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(resample_statistics, sample, method, [seeds[i] for i in share],
+                                       [batch_sizes[i] for i in share]) for share in shares]
+            statistics = np.concatenate([future.result() for future in futures])
+    else:
+        statistics = resample_statistics(sample, method, seeds, batch_sizes)
+
+    # Resamples tied with the observed statistic count as at least as extreme
+    extreme = np.count_nonzero(statistics >= observed * (1 - 1e-12))
+    return observed, (extreme + 1) / (resamples + 1)
@@ -0,0 +1,149 @@
+import copy
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+from collections import OrderedDict
+
+def dataset_fingerprint(path, content=False):
+    """
+    Fingerprint of a dataset file, or of every file below a dataset directory (e.g. a partitioned
+    Parquet dataset). By default it covers the path, size and modification time of each file, which
+    changes whenever the dataset is rewritten; with `content` the bytes themselves are hashed.
+    """
+    digest = hashlib.sha1()
+    if os.path.isdir(path):
+        files = sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+    else:
+        files = [path]
+    for file_path in files:
+        stat = os.stat(file_path)
+        digest.update(f"{os.path.relpath(file_path, path)}\0{stat.st_size}\0".encode())
+        if content:
+            with open(file_path, "rb") as file:
+                for block in iter(lambda: file.read(1 << 20), b""):
+                    digest.update(block)
+        else:
+            digest.update(str(stat.st_mtime_ns).encode())
+    return digest.hexdigest()
+
+def code_fingerprint(objects):
+    """Hash of the source of functions or modules, which changes whenever their code does."""
+    return hashlib.sha1("".join(inspect.getsource(obj) for obj in objects).encode()).hexdigest()
+
+class ResultCache:
+    """
+    Memoizes analysis results per dataset: entries are keyed by the function, a fingerprint of its
+    code, a fingerprint of the dataset it read and its other arguments. Results are pickled to `cache_dir`, at most `max_entries`
+    of them, evicting the least recently used; the last `memory_entries` results are also kept in
+    memory, so repeated calls in one process return without unpickling. Memory hits return deep
+    copies, so callers may modify their result without changing the cached one.
+    """
+
+    def __init__(self, cache_dir="analysis_cache", max_entries=64, memory_entries=8, content=False):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.content = content
+        self.memory = OrderedDict()
+
+    @staticmethod
+    def dataset_prefix(file_path):
+        """File name prefix shared by every entry computed from `file_path`."""
+        return hashlib.sha1(os.path.abspath(file_path).encode()).hexdigest()[:16]
+
+    def key(self, func, file_path, arguments, code=""):
+        call = repr((func.__module__, func.__qualname__, sorted(arguments.items()), code))
+        fingerprint = dataset_fingerprint(file_path, self.content)
+        return f"{self.dataset_prefix(file_path)}-{hashlib.sha1((fingerprint + call).encode()).hexdigest()}"
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key + ".pkl")
+
+    def get(self, key):
+        """Returns (True, result) for a cached key, (False, None) otherwise."""
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return True, copy.deepcopy(self.memory[key])
+        path = self.entry_path(key)
+        try:
+            with open(path, "rb") as file:
+                result = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return False, None
+        # The modification time of an entry is its last use, for LRU eviction
+        os.utime(path)
+        self.remember(key, result)
+        return True, result
+
+    def put(self, key, result):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.entry_path(key)
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as file:
+            pickle.dump(result, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+        self.remember(key, result)
+        self.evict()
+
+    def remember(self, key, result):
+        self.memory[key] = copy.deepcopy(result)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def evict(self):
+        """Deletes the least recently used entries beyond max_entries."""
+        entries = [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith(".pkl")]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime_ns)
+        for entry in entries[:len(entries) - self.max_entries]:
+            os.remove(entry.path)
+            self.memory.pop(entry.name[:-len(".pkl")], None)
+
+    def invalidate(self, file_path=None):
+        """Drops every cached result computed from `file_path`, or the whole cache without one."""
+        prefix = self.dataset_prefix(file_path) + "-" if file_path is not None else ""
+        for key in [key for key in self.memory if key.startswith(prefix)]:
+            del self.memory[key]
+        if not os.path.isdir(self.cache_dir):
+            return
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.startswith(prefix) and entry.name.endswith(".pkl"):
+                os.remove(entry.path)
+
+    def memoize(self, func, ignore=(), sources=()):
+        """
+        Wraps `func(file_path, *args, **kwargs)` so that calls on an unchanged dataset with the same
+        arguments return the cached result. The wrapper has `invalidate(file_path=None)` attached.
+
+        Arguments are matched by name with their defaults filled in, however they are passed; those
+        named in `ignore` (e.g. a chunk size) do not change the result and are left out of the key.
+        The key also covers the source of `func` and of the modules or functions in `sources` that it
+        depends on, so results computed by older code are not reused.
+        """
+        signature = inspect.signature(func)
+        first = next(iter(signature.parameters))
+        code = None
+
+        @functools.wraps(func)
+        def wrapper(file_path, *args, **kwargs):
+            nonlocal code
+            if not os.path.exists(file_path):
+                return func(file_path, *args, **kwargs)
+            if code is None:
+                code = code_fingerprint([func, *sources])
+            bound = signature.bind(file_path, *args, **kwargs)
+            bound.apply_defaults()
+            arguments = {name: value for name, value in bound.arguments.items() if name != first and name not in ignore}
+            key = self.key(func, file_path, arguments, code)
+            found, result = self.get(key)
+            if not found:
+                result = func(file_path, *args, **kwargs)
+                self.put(key, result)
+            return result
+
+        wrapper.invalidate = self.invalidate
+        return wrapper
@@ -0,0 +1,104 @@
+import os
+import shutil
+
+import pandas as pd
+
+CATEGORY_COLUMNS = ["result", "color", "opening", "castle", "opponent_castle"]
+# Nullable small integers: ratings and plies stay well below 32767, move counts and opening IDs below
+# 65535, material differences within +-127
+INTEGER_COLUMNS = {"opening_id": "UInt16", "family_id": "UInt16", "move_count": "UInt16", "white_elo": "Int16", "black_elo": "Int16", "game_duration": "Int32",
+                   "castle_ply": "Int16", "opponent_castle_ply": "Int16", "queen_trade_ply": "Int16",
+                   "material_diff_20": "Int8", "final_material_diff": "Int8"}
+
+def is_parquet(path):
+    return path.endswith(".parquet")
+
+def duration_to_seconds(durations):
+    """Converts "M:SS" duration strings to whole seconds; missing or malformed values become <NA>."""
+    parts = pd.Series(durations, dtype="string").str.extract(r"^(\d+):(\d{2})$")
+    minutes = pd.to_numeric(parts[0], errors="coerce")
+    seconds = pd.to_numeric(parts[1], errors="coerce")
+    return (minutes * 60 + seconds).astype("Int32")
+
+def to_typed_frame(df, copy=True):
+    """
+    Returns a cleaned games frame with the compact typed schema: categoricals for the label columns,
+    datetime64 `time` (the "Unknown Time"/"Invalid Time" sentinels become NaT), `game_duration` in
+    seconds (Int32), Int16 Elo and UInt16 move count. Columns that already have their type are left
+    as they are. With copy=False the columns of `df` are converted in place.
+    """
+    typed = df.copy() if copy else df
+    for name in CATEGORY_COLUMNS:
+        if name in typed.columns and not isinstance(typed[name].dtype, pd.CategoricalDtype):
+            typed[name] = typed[name].astype("category")
+    if "time" in typed.columns and not pd.api.types.is_datetime64_any_dtype(typed["time"]):
+        typed["time"] = pd.to_datetime(typed["time"], errors="coerce")
+    if "game_duration" in typed.columns and not pd.api.types.is_numeric_dtype(typed["game_duration"]):
+        typed["game_duration"] = duration_to_seconds(typed["game_duration"])
+    for name, dtype in INTEGER_COLUMNS.items():
+        if name in typed.columns and typed[name].dtype != dtype:
+            typed[name] = pd.to_numeric(typed[name], errors="coerce").astype(dtype)
+    return typed
+
+def memory_report(df):
+    """
+    Memory used by each column of a frame (deep, counting string contents) as a DataFrame with the
+    dtype, total bytes and bytes per row, plus a "total" row.
+    """
+    rows = max(len(df), 1)
+    usage = df.memory_usage(deep=True, index=False)
+    report = pd.DataFrame({
+        "dtype": df.dtypes.astype(str),
+        "bytes": usage,
+        "bytes_per_row": usage / rows,
+    })
+    report.loc["total"] = ["", usage.sum(), usage.sum() / rows]
+    return report
+
+def write_parquet(df, path, append=False):
+    """
+    Writes a cleaned games frame as a Parquet dataset partitioned by month (<path>/month=YYYY-MM/...).
+    Games without a valid time go to the month=unknown partition. With `append`, the rows are added
+    as new files next to the existing dataset instead of replacing it.
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError("pyarrow is required for Parquet output: pip install pyarrow")
+
+    typed = to_typed_frame(df)
+    typed["month"] = typed["time"].dt.strftime("%Y-%m").fillna("unknown")
+    if os.path.isdir(path) and not append:
+        # Replace the previous dataset instead of adding files next to it
+        shutil.rmtree(path)
+    typed.to_parquet(path, partition_cols=["month"], index=False)
+
+def apply_filters(df, filters):
+    """
+    Applies Parquet-style filters, a list of (column, op, value) tuples combined with AND, to a frame.
+    Supported ops: ==, !=, <, <=, >, >=, in, not in.
+    """
+    mask = pd.Series(True, index=df.index)
+    for column, op, value in filters:
+        values = df[column]
+        if column == "time" and not pd.api.types.is_datetime64_any_dtype(values):
+            values = pd.to_datetime(values, errors="coerce")
+        if op in ("=", "=="):
+            mask &= values == value
+        elif op == "!=":
+            mask &= values != value
+        elif op == "<":
+            mask &= values < value
+        elif op == "<=":
+            mask &= values <= value
+        elif op == ">":
+            mask &= values > value
+        elif op == ">=":
+            mask &= values >= value
+        elif op == "in":
+            mask &= values.isin(value)
+        elif op == "not in":
+            mask &= ~values.isin(value)
+        else:
+            raise ValueError(f"Unsupported filter operator: {op}")
+    return df[mask]
@@ -0,0 +1,87 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from aggregates import family_stats, group_means
+from analysis import ALL_AGGREGATES, cached_aggregates, load_data
+from features import add_derived_features
+from metrics import evaluate, metric_groups
+from rating_series import downsample, rating_series, resample_close
+
+# Columns the feed reads besides the cached aggregates
+FEED_COLUMNS = ["time", "color", "result", "white_elo", "black_elo", "opening", "family_id"]
+
+def series(labels, values, digits=2):
+    """A chart series as {"labels": [...], "values": [...]}, with values rounded and NaN as null."""
+    values = np.asarray(values, dtype="float64").round(digits)
+    return {
+        "labels": [str(label) for label in labels],
+        "values": [None if np.isnan(value) else (int(value) if value.is_integer() else float(value)) for value in values],
+    }
+
+def rating_feed(df, start_date="2023-01-01", max_points=1000):
+    """
+    The player's rating at the end of each day from `start_date` on, like plot_elo_rating_progression,
+    downsampled with LTTB to at most `max_points` days.
+    """
+    daily = downsample(resample_close(rating_series(df, start_date), "D"), max_points)
+    return series(daily.index.strftime("%Y-%m-%d"), daily.to_numpy(), 0)
+
+def build_feed(file_path="cleaned_games.parquet", min_opening_games=10, top_openings=10):
+    """
+    Precomputes what the charts of index.html show: win rates by color, time of day, Elo difference
+    and opening, games per month and per hour, and the rating series. Win rates are percentages.
+    Openings are shown by family; families with fewer than `min_opening_games` games are left out.
+    """
+    aggregates = cached_aggregates(file_path, ALL_AGGREGATES)
+    if aggregates is None:
+        return None
+    df = add_derived_features(load_data(file_path, columns=FEED_COLUMNS))
+    times = pd.to_datetime(df["time"], errors="coerce").dropna()
+
+    # The raw per-opening statistics, so that the threshold is `min_opening_games` and not the metric's
+    by_opening = family_stats(metric_groups(aggregates, "score_by_opening"), df)
+    by_opening = by_opening[by_opening["n"] >= min_opening_games]
+    openings = (group_means(by_opening) * 100).sort_values(ascending=False, kind="stable").head(top_openings)
+    color_win_rate = evaluate(aggregates, "win_rate_by_color").means * 100
+    time_of_day_win_rate = evaluate(aggregates, "win_rate_by_time_of_day").means * 100
+    elo_diff_win_rate = evaluate(aggregates, "score_by_elo_diff").means * 100
+    games_per_month = times.dt.to_period("M").value_counts().sort_index()
+    games_per_hour = times.dt.hour.value_counts().reindex(range(24), fill_value=0)
+
+    return {
+        "games": len(df),
+        "win_rate_by_color": series(color_win_rate.index, color_win_rate),
+        "win_rate_by_time_of_day": series(time_of_day_win_rate.index, time_of_day_win_rate),
+        "win_rate_by_elo_diff": series(elo_diff_win_rate.index, elo_diff_win_rate),
+        "win_rate_by_opening": series(openings.index, openings),
+        "games_per_month": series(games_per_month.index, games_per_month.to_numpy(), 0),
+        "games_per_hour": series(games_per_hour.index, games_per_hour.to_numpy(), 0),
+        "rating": rating_feed(df),
+    }
+
+def export_feed(file_path="cleaned_games.parquet", output_file="data/aggregates.json"):
+    """Writes build_feed's aggregates as compact JSON for index.html. Returns the size written in bytes."""
+    feed = build_feed(file_path)
+    if feed is None:
+        print(f"No games to export from {file_path}.")
+        return 0
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    temp_file = output_file + ".tmp"
+    with open(temp_file, "w") as file:
+        json.dump(feed, file, separators=(",", ":"))
+    os.replace(temp_file, output_file)
+    return os.path.getsize(output_file)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the aggregates drawn by index.html.")
+    parser.add_argument("file_path", nargs="?", default="cleaned_games.parquet")
+    parser.add_argument("--output", default="data/aggregates.json")
+    args = parser.parse_args()
+
+    size = export_feed(args.file_path, args.output)
+    if size:
+        print(f"Wrote {size} bytes to {args.output}.")
@@ -0,0 +1,50 @@
+import numpy as np
+
+from analysis import analyze_time_management
+from clocks import MoveTimes, clocks_path, parse_clocks, parse_time_control
+from game_store import write_games
+from mock_api import make_history
+from preprocess import preprocess_games
+
+def test_clock_parsing():
+    assert parse_time_control("180+2") == (180.0, 2.0) and parse_time_control("600") == (600.0, 0.0)
+    pgn = ('[TimeControl "180+2"]\n\n1. e4 {[%clk 0:03:01.9]} 1... e5 {[%clk 0:02:59.5]} '
+           '2. Nf3 {[%clk 0:02:58]} 2... Nc6 {[%clk 1:02:50.5]} *')
+    times = MoveTimes.from_pgns([pgn], [0], ["180+2"])
+    assert np.allclose(times.clocks, [181.9, 179.5, 178.0, 3770.5])
+    # White's first move took 0.1 s, black's 2.5 s; the last clock is over the base time, so 0 s
+    assert np.allclose(times.spent(), [0.1, 2.5, 5.9, 0.0], atol=1e-3)
+    assert times.own_moves().tolist() == [True, False, True, False]
+
+def test_invalid_and_truncated_clocks():
+    clocks, plies, counts = parse_clocks(["1. e4 {[%clk 100:00:01]} e5 {[%clk 0:1:02]} 2. d4 {[%clk ", "",
+                                          "{[%clk 0:00:07]} 1. e4 {[%clk 0:00:05.25]}"])
+    # The clock before any move is dropped
+    assert np.allclose(clocks, [360001, np.nan, np.nan, 5.2], equal_nan=True) and counts.tolist() == [3, 0, 1]
+    assert plies.tolist() == [0, 1, 2, 0]
+
+def test_clocks_follow_move_numbers():
+    pgns = [
+        # White's first clock is missing, and a clocked variation is skipped
+        '[Event "Live Chess (Blitz)"]\n\n1. e4 e5 {[%clk 0:02:59]} 2. Nf3 {[%clk 0:02:58]} (2. d4 {[%clk 0:02:00]} exd4) '
+        '2... Nc6 {A (comment) 3. d4} {[%clk 0:02:55]} 3.Bb5 {[%clk 0:02:50]} *',
+        # Set up from a position with Black to move, with CRLF line endings
+        '[SetUp "1"]\r\n[FEN "8/8/8/8/8/8/8/K6k b - - 0 12"]\r\n\r\n12... Kh2 {[%clk 0:01:00]} 13. Ka2 {[%clk 0:00:58]} '
+        'Kh3 {[%clk 0:00:55]} 1/2-1/2',
+    ]
+    times = MoveTimes.from_pgns(pgns, [1, 1], ["180", "60"])
+    assert times.plies.tolist() == [1, 2, 3, 4, 23, 24, 25] and times.counts().tolist() == [4, 3]
+    assert times.own_moves().tolist() == [True, False, True, False, True, False, True]
+    # Moves whose mover's previous clock is missing take no time from it
+    assert np.allclose(times.spent(), [1, np.nan, 4, 8, np.nan, np.nan, 5], equal_nan=True)
+
+
+def test_time_management_analysis_reads_preprocessed_clocks(tmp_path, capsys):
+    store, output = str(tmp_path / "games.jsonl"), str(tmp_path / "cleaned.parquet")
+    write_games(store, make_history("player", 30, per_month=30))
+    preprocess_games(store, output, "player", clocks=True)
+    times = MoveTimes.load(clocks_path(output))
+    assert len(times) == 30 and (times.plies >= 0).all()
+    trouble = analyze_time_management(times, threshold=30.0)
+    assert trouble["games"] == 30 and 0 <= trouble["player_moves"] <= 1
+    assert "Mean seconds per move by phase (player):" in capsys.readouterr().out
@@ -0,0 +1,93 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import column_cache
+
+def frame(rows, start=0, openings=("Sicilian Defense", "Italian Game")):
+    """Columns of every kind the cache encodes: nullable Int16, categorical, datetime, float and int."""
+    index = np.arange(start, start + rows)
+    return pd.DataFrame({
+        "white_elo": pd.array([None if i % 7 == 0 else 1000 + i for i in index], dtype="Int16"),
+        "opening": pd.Categorical([openings[i % len(openings)] for i in index]),
+        "time": pd.Timestamp("2024-01-01") + pd.to_timedelta(index, unit="h"),
+        "elo_diff": np.where(index % 5 == 0, np.nan, index * 0.5),
+        "move_count": index.astype("int64"),
+    })
+
+@pytest.fixture
+def dataset(tmp_path):
+    """A dataset file to key the cache by; only its fingerprint matters here."""
+    path = str(tmp_path / "games.csv")
+    with open(path, "w") as file:
+        file.write("rows\n")
+    return path
+
+def grow(path):
+    """Changes the dataset as appending rows to it would."""
+    with open(path, "a") as file:
+        file.write("more\n")
+
+def assert_frames_equal(loaded, expected):
+    expected = expected.reset_index(drop=True)
+    for name in expected.columns:
+        assert loaded[name].dtype == expected[name].dtype, name
+    # Copied out of the memory maps, which assert_frame_equal tells apart from plain arrays
+    pd.testing.assert_frame_equal(loaded.copy(), expected, check_categorical=False)
+
+def test_round_trip(dataset):
+    df = frame(50)
+    column_cache.write(dataset, df)
+    assert_frames_equal(column_cache.load(dataset), df)
+    assert list(column_cache.load(dataset, ["time", "opening"]).columns) == ["time", "opening"]
+    assert column_cache.load(dataset, ["castle"]) is None
+
+def test_append_adds_new_categories(dataset):
+    first, second = frame(30), frame(20, start=30, openings=("French Defense", "Italian Game"))
+    column_cache.write(dataset, first)
+    assert column_cache.is_fresh(dataset)
+    grow(dataset)
+    column_cache.write(dataset, second, append=True)
+    loaded = column_cache.load(dataset)
+    assert list(loaded["opening"].cat.categories) == ["Italian Game", "Sicilian Defense", "French Defense"]
+    assert_frames_equal(loaded, pd.concat([first, second]).astype({"opening": "object"}).astype({"opening": "category"}))
+
+def test_append_widens_category_codes(dataset):
+    many = [f"Opening {i}" for i in range(200)]
+    first, second = frame(100, openings=many[:100]), frame(100, start=100, openings=many[100:])
+    column_cache.write(dataset, first)
+    grow(dataset)
+    column_cache.write(dataset, second, append=True)
+    loaded = column_cache.load(dataset)
+    assert loaded["opening"].cat.codes.dtype == np.int16
+    assert loaded["opening"].astype(str).tolist() == [many[i % 100] for i in range(100)] + many[100:]
+
+def test_append_drops_bytes_left_by_an_unfinished_write(dataset):
+    first, second = frame(30), frame(10, start=30)
+    column_cache.write(dataset, first)
+    # As if an earlier append wrote part of a column and never got to the metadata
+    with open(os.path.join(column_cache.cache_path(dataset), "move_count.values.bin"), "ab") as file:
+        file.write(np.arange(5, dtype="int64").tobytes())
+    assert_frames_equal(column_cache.load(dataset), first)
+    grow(dataset)
+    column_cache.write(dataset, second, append=True)
+    assert column_cache.load(dataset)["move_count"].tolist() == list(range(40))
+
+def test_stale_cache_is_not_loaded(dataset):
+    column_cache.write(dataset, frame(10))
+    grow(dataset)
+    assert not column_cache.is_fresh(dataset)
+    assert column_cache.load(dataset) is None
+
+def test_append_with_other_columns_rebuilds_from_the_dataset(tmp_path):
+    path = str(tmp_path / "games.csv")
+    df = pd.DataFrame({"result": ["win", "resigned"], "color": ["white", "black"]})
+    df.to_csv(path, index=False)
+    column_cache.write(path, df[["result"]])
+    pd.DataFrame({"result": ["agreed"], "color": ["white"]}).to_csv(path, mode="a", header=False, index=False)
+    column_cache.write(path, pd.DataFrame({"result": ["agreed"], "color": ["white"]}), append=True)
+    loaded = column_cache.load(path)
+    assert loaded["result"].astype(str).tolist() == ["win", "resigned", "agreed"]
+    assert loaded["color"].astype(str).tolist() == ["white", "black", "white"]
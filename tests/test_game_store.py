@@ -0,0 +1,23 @@
+import os
+
+import pytest
+
+from game_store import iter_games, write_games
+
+def failing_download(games):
+    yield from games
+    raise OSError("connection reset")
+
+@pytest.mark.parametrize("name", ["games.jsonl", "games.jsonl.gz", "games.json"])
+def test_failed_write_keeps_the_previous_store(tmp_path, name):
+    path = str(tmp_path / name)
+    old = [{"url": f"game/{i}"} for i in range(10)]
+    assert write_games(path, old) == 10
+
+    with pytest.raises(OSError):
+        write_games(path, failing_download([{"url": "game/new"}]))
+    assert list(iter_games(path)) == old
+    assert os.listdir(tmp_path) == [name]
+
+    assert write_games(path, old[:3]) == 3
+    assert list(iter_games(path)) == old[:3]
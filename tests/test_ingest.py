@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+from game_store import iter_games
+from ingest import ingest_users, user_output_path
+from mock_api import archive_months, serve_mock_api
+
+@pytest.fixture
+def api():
+    server, api_base = serve_mock_api({"alice": 2, "bob": 2}, games_per_archive=5)
+    yield server, api_base
+    server.shutdown()
+
+def ingest(api_base, tmp_path, **kwargs):
+    return ingest_users(["alice", "bob"], output_dir=str(tmp_path / "out"), cache_dir=str(tmp_path / "cache"),
+                        concurrency=2, rate=1000, max_retries=0, api_base=api_base, **kwargs)
+
+def test_a_new_batch_picks_up_new_months(api, tmp_path):
+    server, api_base = api
+    assert ingest(api_base, tmp_path) == {
+        "alice": {"status": "done", "games": 10, "archives": 2}, "bob": {"status": "done", "games": 10, "archives": 2}}
+    # A complete batch leaves nothing to resume
+    assert not os.path.exists(tmp_path / "out" / "ingest_state.json")
+
+    server.players["alice"] = archive_months(3)
+    assert ingest(api_base, tmp_path)["alice"]["games"] == 15
+    assert len(list(iter_games(user_output_path(str(tmp_path / "out"), "alice")))) == 15
+
+def test_resume_only_retries_unfinished_users(api, tmp_path):
+    server, api_base = api
+    months = server.players.pop("bob")
+    state = ingest(api_base, tmp_path)
+    assert state["alice"]["status"] == "done" and state["bob"]["status"] == "failed"
+
+    server.players["bob"] = months
+    server.players["alice"] = archive_months(3)
+    state = ingest(api_base, tmp_path, resume=True)
+    assert state["alice"]["games"] == 10 and state["bob"]["status"] == "done"
+    assert not os.path.exists(tmp_path / "out" / "ingest_state.json")
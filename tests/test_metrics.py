@@ -0,0 +1,99 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregates import DIMENSIONS, anova_from_stats, compute_stats, family_stats
+from analysis import ALL_AGGREGATES
+from game_db import compute_stats_sql, write_sqlite
+from live_stats import GAME_DIMENSIONS, LiveStats
+from metrics import METRICS, metric_result, plan, run_metrics
+
+def games_frame(rows, seed=0):
+    """Cleaned games with random results, colors, openings, times, castling and ratings."""
+    rng = np.random.default_rng(seed)
+    results = np.array(["win", "resigned", "checkmated", "timeout", "agreed", "repetition"])
+    castles = np.array(["Kingside", "Queenside", "None"])
+    white_elo = rng.integers(400, 2400, rows)
+    family_ids = rng.integers(0, 20, rows)
+    return pd.DataFrame({
+        "result": results[rng.integers(0, len(results), rows)],
+        "color": np.where(rng.random(rows) < 0.5, "white", "black"),
+        "opening": [f"Opening {i}" for i in family_ids],
+        # Two variations of each family
+        "opening_id": family_ids * 2 + np.arange(rows) % 2,
+        "family_id": family_ids,
+        "time": pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 365 * 86400, rows), unit="s"),
+        "castle": castles[rng.integers(0, 3, rows)],
+        "white_elo": white_elo,
+        "black_elo": white_elo + rng.integers(-300, 300, rows),
+    })
+
+HOURS = [0, 8, 9, 16, 17, 20, 21, 23]
+EXPECTED_LABELS = {
+    "time_of_day": ["Morning", "Morning", "Afternoon", "Afternoon", "Evening", "Evening", "Night", "Night"],
+    "day_half": ["Morning/Afternoon"] * 4 + ["Evening/Night"] * 4,
+    "castling_type": ["Kingside", "Queenside", "No Castling", "Kingside", "No Castling", "Queenside",
+                      "No Castling", "No Castling"],
+}
+
+@pytest.fixture
+def labelled_games():
+    df = games_frame(len(HOURS))
+    df["time"] = [pd.Timestamp(2024, 1, 1, hour, 30) for hour in HOURS]
+    df["castle"] = ["Kingside", "Queenside", "None", "Kingside", "None", "Queenside", "None", "None"]
+    return df
+
+@pytest.mark.parametrize("dimension", EXPECTED_LABELS)
+def test_binning_agrees_across_backends(labelled_games, dimension, tmp_path):
+    labels = EXPECTED_LABELS[dimension]
+    assert list(DIMENSIONS[dimension](labelled_games)) == labels
+    assert [GAME_DIMENSIONS[dimension][0](game) for game in labelled_games.to_dict("records")] == labels
+    path = str(tmp_path / "games.db")
+    write_sqlite(labelled_games, path)
+    counts = compute_stats_sql(path, [(dimension, "score")])[(dimension, "score")]["n"]
+    assert counts.to_dict() == pd.Series(labels).value_counts().reindex(counts.index).to_dict()
+
+def test_plan_lists_each_statistic_once():
+    requests = plan(["win_rate_by_color", "score_by_color", "score_by_castling"])
+    assert requests == [("color", "is_win"), ("color", "score"), ("castled", "score")]
+    assert len(plan()) == len(set(plan()))
+
+def test_batched_metrics_match_single_metrics():
+    df = games_frame(20_000)
+    results = run_metrics(df)
+    for name in METRICS:
+        single = metric_result(name, df.copy())
+        assert results[name].stats.equals(single.stats), name
+        assert np.allclose([results[name].statistic, results[name].p_value], [single.statistic, single.p_value],
+                           equal_nan=True), name
+
+def test_min_games_drops_small_groups():
+    df = games_frame(200)
+    df.loc[:4, "family_id"] = 99
+    result = metric_result("score_by_opening", df)
+    assert 99 not in result.stats.index and (result.stats["n"] >= 10).all()
+
+def test_no_games():
+    assert run_metrics(games_frame(0)) is None
+
+def test_opening_anova_compares_families():
+    df = games_frame(2000)
+    df.loc[:9, "opening"], df.loc[:9, "family_id"] = "Rare Opening", 20
+    result = metric_result("score_by_opening", df)
+    assert list(result.stats.index) == list(range(21))
+    by_name = compute_stats(df, [("opening", "score")])[("opening", "score")]
+    assert family_stats(result.stats, df).equals(by_name)
+    assert np.allclose([result.statistic, result.p_value], anova_from_stats(by_name))
+
+def test_live_stats_round_trip_keeps_integer_labels():
+    df = games_frame(400)
+    live = LiveStats.from_frame(df.iloc[:200].copy(), ALL_AGGREGATES)
+    restored = LiveStats.from_dict(json.loads(json.dumps(live.to_dict())))
+    for game in df.iloc[200:].to_dict("records"):
+        restored.update(game)
+    by_id = restored.aggregates()[("family_id", "score")]
+    expected = compute_stats(df, [("family_id", "score")])[("family_id", "score")]
+    assert list(by_id.index) == list(expected.index)
+    assert (by_id["n"].to_numpy() == expected["n"].to_numpy()).all()
@@ -0,0 +1,38 @@
+import opening_index
+from opening_index import OpeningIndex, parse_opening
+
+SICILIAN = "https://www.chess.com/openings/Sicilian-Defense-Najdorf-Variation-6.Bg5-e6"
+ITALIAN = "https://www.chess.com/openings/Italian-Game-Two-Knights-Defense"
+
+def test_saved_urls_are_parsed_again_when_the_parser_changes(tmp_path, monkeypatch):
+    path = str(tmp_path / "games.openings.json")
+    index = OpeningIndex(path)
+    assert list(index.ids([SICILIAN, ITALIAN])) == [0, 1]
+    index.save()
+
+    unchanged = OpeningIndex(path)
+    assert unchanged.ids_by_eco == {SICILIAN: 0, ITALIAN: 1} and not unchanged.changed
+
+    # Without "Defense" as a family word the Najdorf line becomes a family of its own
+    monkeypatch.setattr(opening_index, "FAMILY_WORDS", opening_index.FAMILY_WORDS - {"Defense"})
+    parse_opening.cache_clear()
+    try:
+        reparsed = OpeningIndex(path)
+        assert reparsed.changed
+        assert reparsed.ids_by_eco == {SICILIAN: 2, ITALIAN: 1}
+        assert reparsed.openings[2] == ("Sicilian Defense Najdorf Variation", "")
+        # Openings the old parser produced keep their IDs, so rows written before stay valid
+        assert reparsed.openings[:2] == [("Sicilian Defense", "Najdorf Variation"), ("Italian Game", "Two Knights Defense")]
+        reparsed.save()
+        assert not OpeningIndex(path).changed
+    finally:
+        parse_opening.cache_clear()
+
+def test_variations_of_a_family_share_its_family_id(tmp_path):
+    path = str(tmp_path / "games.openings.json")
+    index = OpeningIndex(path)
+    dragon = "https://www.chess.com/openings/Sicilian-Defense-Dragon-Variation"
+    assert list(index.ids([SICILIAN, ITALIAN, dragon])) == [0, 1, 2]
+    assert list(index.family_ids()) == [0, 1, 0]
+    index.save()
+    assert list(OpeningIndex(path).family_ids()) == [0, 1, 0]
@@ -0,0 +1,31 @@
+import numpy as np
+
+from opening_tree import OpeningTree, chunk_edges, position_key
+
+def test_position_keys():
+    # Move order does not matter, but lost castling rights and a possible en passant capture do
+    assert position_key("Nf3 d5 d4".split()) == position_key("d4 d5 Nf3".split())
+    assert position_key("Nf3 Nf6 Ng1 Ng8".split()) == position_key([])
+    assert position_key("Nf3 Nf6 Rg1 Ng8 Rh1 Nf6 Ng1 Ng8".split()) != position_key([])
+    assert position_key("e4 a6 e5 d5".split()) != position_key("e4 d5 e5 a6".split())
+    assert position_key("e4 a6 e5 h5".split()) == position_key("e4 h5 e5 a6".split())
+
+def test_tree_counts():
+    games = [("e4 e5 Nf3 Nc6".split(), None, 0, "win"), ("e4 c5".split(), None, 0, "agreed"),
+             ("Nf3 e5 e4 Nc6".split(), None, 1, "checkmated"), ("e4 e5 Nf3 Nc6".split(), None, 0, "resigned")]
+    tree = OpeningTree.from_parts([chunk_edges(games[:2]), chunk_edges(games[2:])])
+    assert tree.lookup([]) == {"games": 4, "wins": 1, "draws": 1, "score": 0.375}
+    assert tree.lookup(["e4"], color=0) == {"games": 3, "wins": 1, "draws": 1, "score": 0.5}
+    # The third game transposes into the first
+    assert tree.lookup("e4 e5 Nf3 Nc6".split())["games"] == 3
+    assert tree.lookup("e4 e5 Nf3 Nc6".split(), color=0)["games"] == 2
+    assert tree.children(position_key(["e4"]), color=0)["games"].to_dict() == {"e5": 2, "c5": 1}
+    assert tree.line(position_key("e4 e5 Nf3 Nc6".split()), 0) == "e4 e5 Nf3 Nc6".split()
+    assert np.isnan(tree.lookup(["d4"])["score"])
+
+def test_save_and_load(tmp_path):
+    tree = OpeningTree.from_parts([chunk_edges([("e4 e5".split(), None, 0, "win")])])
+    path = str(tmp_path / "games.tree")
+    tree.save(path)
+    loaded = OpeningTree.load(path)
+    assert loaded.lookup(["e4"]) == tree.lookup(["e4"]) == {"games": 1, "wins": 1, "draws": 0, "score": 1.0}
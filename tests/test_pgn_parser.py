@@ -0,0 +1,26 @@
+from mock_api import make_game
+from pgn_parser import parse_pgn
+
+def test_queenside_castling():
+    # The legacy string matching took "O-O-O" for kingside castling
+    game = parse_pgn("1. d4 d5 2. Nc3 Nc6 3. Bf4 Bf5 4. Qd2 Qd7 5. O-O-O O-O-O 6. e3 e6 *")
+    assert (game.white_castle, game.black_castle) == ("Queenside", "Queenside")
+
+def test_castling_with_check_after_king_walk():
+    game = parse_pgn("1. e4 e5 2. Nf3 Nc6 3. Bc4 Bc5 4. Kf1 Nf6 5. d3 O-O+ 6. h3 d6 *")
+    assert (game.white_castle, game.black_castle) == ("None", "Kingside")
+
+def test_clocks_variations_and_annotations_are_skipped():
+    game = parse_pgn('[UTCDate "2023.01.01"]\n\n1. e4 {[%clk 0:09:58.6]} 1... e5 {[%clk 0:09:57.1]} '
+                     '2. Ke2 {[%clk 0:09:50.0]} 2... Qh4 (2... Nc6 3. O-O) 3. Kf3 $2 {[%clk 0:09:40.0]} 1-0')
+    assert game.white_moves == ["e4", "Ke2", "Kf3"] and game.black_moves == ["e5", "Qh4"]
+    assert game.move_count == 3 and game.white_castle == "None"
+    assert game.headers == {"UTCDate": "2023.01.01"}
+
+def test_move_count_of_a_mate():
+    assert parse_pgn("1. e4 e5 2. Qh5 Nc6 3. Bc4 Nf6 4. Qxf7# 1-0").move_count == 4
+
+def test_crlf_line_endings():
+    pgn = make_game("player", 0)["pgn"]
+    game = parse_pgn(pgn.replace("\n", "\r\n"))
+    assert game == parse_pgn(pgn) and game.move_count > 0
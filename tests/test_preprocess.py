@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from analysis import load_data
+from game_store import append_games, write_games
+from mock_api import make_game, make_history
+from preprocess import preprocess_games, process_game
+
+@pytest.fixture
+def store(tmp_path):
+    path = str(tmp_path / "games.jsonl")
+    write_games(path, make_history("player", 100, per_month=40))
+    return path
+
+def rows(path):
+    return len(load_data(path))
+
+@pytest.mark.parametrize("output_name", ["cleaned.csv", "cleaned.parquet"])
+def test_full_rebuild_then_incremental(store, tmp_path, output_name):
+    output = str(tmp_path / output_name)
+    preprocess_games(store, output, "player", incremental=True)
+    assert rows(output) == 100
+
+    # A full rebuild after the store grew must leave an index an incremental run can resume from
+    append_games(store, list(make_history("player", 200, per_month=40))[100:])
+    preprocess_games(store, output, "player")
+    assert rows(output) == 200
+    preprocess_games(store, output, "player", incremental=True)
+    assert rows(output) == 200
+
+def test_incremental_appends_only_new_games(store, tmp_path):
+    output = str(tmp_path / "cleaned.csv")
+    preprocess_games(store, output, "player")
+    assert os.path.exists(output + ".index.json")
+    append_games(store, list(make_history("player", 150, per_month=40))[100:])
+    assert len(preprocess_games(store, output, "player", incremental=True)) == 50
+    assert rows(output) == 150
+
+def test_duration_of_a_game_ending_after_midnight():
+    game = make_game("player", 0)
+    game["pgn"] = game["pgn"].replace('[UTCTime "00:00:00"]', '[UTCTime "23:58:00"]').replace('[EndDate "2023.01.01"]\n', "")
+    end_time = game["pgn"].split('[EndTime "')[1][:8]
+    assert end_time < "23:58:00" and process_game(game, "player")[4] == "8:13"
+
+def test_end_date_header_is_used_as_given():
+    game = make_game("player", 0)
+    game["pgn"] = game["pgn"].replace('[UTCTime "00:00:00"]', '[UTCTime "23:58:00"]')
+    next_day = game["pgn"].replace('[EndDate "2023.01.01"]', '[EndDate "2023.01.02"]')
+    assert process_game(dict(game, pgn=next_day), "player")[4] == "8:13"
+    # An EndDate header is never moved to the next day, even when it puts the end before the start
+    assert process_game(game, "player")[4] != "8:13"
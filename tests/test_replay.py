@@ -0,0 +1,23 @@
+from mock_api import make_game
+from replay import SQUARES, Board, ReplayFeatures, pgn_features, replay
+
+def test_replay_features():
+    assert pgn_features("1. e4 e5 2. Bc4 Nc6 3. Qh5 Nf6 4. Qxf7# 1-0") == ReplayFeatures(7, None, None, None, None, None, 39, 38)
+    # En passant (3. gxh6), a capturing underpromotion (5. hxg8=N) and the promoted knight taken back
+    sans = "h4 g5 hxg5 h5 gxh6 Nf6 h7 Rg8 hxg8=N Bg7 Rh7 Bf8 Rxf7 Kxf7 e4 Nxe4 Qh5+ Kxg8".split()
+    assert replay(sans) == ReplayFeatures(18, None, None, None, None, None, 32, 31)
+
+def test_replay_castling_and_queen_trade():
+    # Castling on both sides, then the queens come off at ply 41 (Qxe6+ Qxe6 ... Rxe6 and later)
+    assert pgn_features(make_game("player", 0)["pgn"]) == ReplayFeatures(44, 11, 12, 41, 25, 32, 20, 22)
+    assert pgn_features(make_game("player", 1)["pgn"]) == ReplayFeatures(32, 11, 10, None, None, None, 27, 27)
+
+def test_replay_pinned_piece_needs_no_disambiguation():
+    # Both knights reach e4 but the one on d2 is pinned, so SAN has no disambiguation
+    board = Board("4k3/8/8/b5N1/8/8/3N4/4K3 w - - 0 1")
+    board.push("Ne4")
+    assert board.pieces[1] == (1 << SQUARES["d2"]) | (1 << SQUARES["e4"])
+
+def test_replay_illegal_move():
+    # A king move the king cannot make leaves the game without features
+    assert pgn_features("1. e4 e5 2. Ke3 *") is None
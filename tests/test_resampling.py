@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from scipy.stats import f_oneway, ttest_ind
+
+from resampling import GroupSample, resampling_test
+
+def sample_of(groups):
+    """A GroupSample of a list of per-group value arrays."""
+    codes = np.concatenate([np.full(len(values), i) for i, values in enumerate(groups)])
+    return GroupSample(codes, np.concatenate(groups).astype("float64"), [f"group {i}" for i in range(len(groups))])
+
+def scores(rng, n, p_win=0.45, p_draw=0.1):
+    return rng.choice([1.0, 0.5, 0.0], size=n, p=[p_win, p_draw, 1 - p_win - p_draw])
+
+@pytest.mark.parametrize("discrete", [True, False])
+def test_observed_statistic_matches_scipy(discrete):
+    rng = np.random.default_rng(0)
+    draw = (lambda n: scores(rng, n)) if discrete else (lambda n: rng.normal(size=n))
+    a, b, c = draw(300), draw(200), draw(250)
+    assert (sample_of([a, b]).table is not None) == discrete
+
+    observed, _ = resampling_test(sample_of([a, b]), resamples=10)
+    assert np.isclose(observed, abs(ttest_ind(a, b, equal_var=False).statistic))
+    observed, _ = resampling_test(sample_of([a, b, c]), resamples=10)
+    assert np.isclose(observed, f_oneway(a, b, c).statistic)
+
+@pytest.mark.parametrize("method", ["permutation", "bootstrap"])
+@pytest.mark.parametrize("discrete", [True, False])
+def test_p_value_tracks_the_parametric_test_on_null_data(method, discrete):
+    rng = np.random.default_rng(1)
+    draw = (lambda n: scores(rng, n)) if discrete else (lambda n: rng.normal(size=n))
+    for seed in range(3):
+        a, b, c = draw(400), draw(300), draw(350)
+        _, p_value = resampling_test(sample_of([a, b]), method, resamples=4000, seed=seed)
+        assert abs(p_value - ttest_ind(a, b, equal_var=False).pvalue) < 0.05
+        _, p_value = resampling_test(sample_of([a, b, c]), method, resamples=4000, seed=seed)
+        assert abs(p_value - f_oneway(a, b, c).pvalue) < 0.05
+
+@pytest.mark.parametrize("method", ["permutation", "bootstrap"])
+def test_results_do_not_depend_on_workers(method):
+    rng = np.random.default_rng(2)
+    sample = sample_of([scores(rng, 500), scores(rng, 400, p_win=0.5)])
+    single = resampling_test(sample, method, resamples=1000, seed=7, workers=1, batch_size=100)
+    assert resampling_test(sample, method, resamples=1000, seed=7, workers=2, batch_size=100) == single
+    assert resampling_test(sample, method, resamples=1000, seed=8, workers=1, batch_size=100) != single
+
+def test_groups_with_fewer_than_two_games():
+    rng = np.random.default_rng(3)
+    result = resampling_test(sample_of([scores(rng, 50), np.array([1.0])]), resamples=10)
+    assert np.isnan(result).all()
+    result = resampling_test(sample_of([scores(rng, 50), np.array([])]), resamples=10)
+    assert np.isnan(result).all()
@@ -0,0 +1,65 @@
+import pandas as pd
+
+from result_cache import ResultCache
+
+def count_rows(file_path, requests=None, filters=None, chunk_size=None):
+    count_rows.calls += 1
+    with open(file_path, "r") as file:
+        return sum(1 for _ in file)
+
+def score_frames(file_path):
+    return {"score": pd.DataFrame({"games": [2, 3]}, index=["white", "black"])}
+
+def first_binning(hour):
+    return hour <= 17
+
+def second_binning(hour):
+    return hour < 17
+
+def test_calls_share_an_entry_however_arguments_are_passed(tmp_path):
+    path = tmp_path / "games.csv"
+    path.write_text("a\nb\n")
+    count_rows.calls = 0
+    cached = ResultCache(str(tmp_path / "cache")).memoize(count_rows, ignore=["chunk_size"])
+    assert cached(str(path), ["color"]) == 2
+    assert cached(str(path), ["color"], chunk_size=1000) == 2
+    assert cached(str(path), requests=["color"], filters=None) == 2
+    assert count_rows.calls == 1
+    cached(str(path), ["color"], filters=[("color", "==", "white")])
+    assert count_rows.calls == 2
+
+def test_code_changes_invalidate_entries(tmp_path):
+    path = tmp_path / "games.csv"
+    path.write_text("a\n")
+    count_rows.calls = 0
+    cache_dir = str(tmp_path / "cache")
+    ResultCache(cache_dir).memoize(count_rows, sources=[first_binning])(str(path))
+    ResultCache(cache_dir).memoize(count_rows, sources=[first_binning])(str(path))
+    assert count_rows.calls == 1
+    ResultCache(cache_dir).memoize(count_rows, sources=[second_binning])(str(path))
+    assert count_rows.calls == 2
+
+def test_dataset_changes_invalidate_entries(tmp_path):
+    path = tmp_path / "games.csv"
+    path.write_text("a\n")
+    cached = ResultCache(str(tmp_path / "cache")).memoize(count_rows)
+    assert cached(str(path)) == 1
+    path.write_text("a\nb\nc\n")
+    assert cached(str(path)) == 3
+
+def test_callers_get_their_own_copies(tmp_path):
+    path = tmp_path / "games.csv"
+    path.write_text("a\n")
+    cache = ResultCache(str(tmp_path / "cache"))
+    cached = cache.memoize(score_frames)
+    first = cached(str(path))
+    first["score"].loc["white", "games"] = 0
+    from_memory = cached(str(path))
+    assert from_memory["score"]["games"].tolist() == [2, 3]
+    from_memory["score"].loc["black", "games"] = 0
+    del from_memory["score"]
+    assert cached(str(path))["score"]["games"].tolist() == [2, 3]
+    cache.memory.clear()
+    from_disk = cached(str(path))
+    del from_disk["score"]
+    assert cached(str(path))["score"]["games"].tolist() == [2, 3]
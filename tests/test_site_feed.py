@@ -0,0 +1,23 @@
+import pandas as pd
+
+from site_feed import build_feed
+
+def test_min_opening_games_sets_the_opening_threshold(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    rows = [("Sicilian Defense", "win")] * 3 + [("French Defense", "resigned")] * 12
+    pd.DataFrame({
+        "time": pd.date_range("2024-01-01 10:00", periods=len(rows), freq="h").astype(str),
+        "result": [result for _, result in rows],
+        "color": "white",
+        "opening": [opening for opening, _ in rows],
+        "family_id": [{"Sicilian Defense": 0, "French Defense": 1}[opening] for opening, _ in rows],
+        "white_elo": 1500,
+        "black_elo": 1400,
+        "castle": "None",
+    }).to_csv("games.csv", index=False)
+
+    # Below the 10 games of the score_by_opening metric, a lower threshold still lets openings in
+    assert build_feed("games.csv", min_opening_games=3)["win_rate_by_opening"] == {
+        "labels": ["Sicilian Defense", "French Defense"], "values": [100, 0]}
+    assert build_feed("games.csv", min_opening_games=5)["win_rate_by_opening"]["labels"] == ["French Defense"]
+    assert build_feed("games.csv", min_opening_games=20)["win_rate_by_opening"]["labels"] == []
@@ -0,0 +1,44 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from data import archive_cache_path, archive_complete, sync_games
+from mock_api import archive_months, serve_mock_api
+
+@pytest.fixture
+def api():
+    server, api_base = serve_mock_api({"player": 2}, games_per_archive=5)
+    yield server, api_base
+    server.shutdown()
+
+def test_archive_complete():
+    url = "https://api.chess.com/pub/player/player/games/2023/12"
+    assert archive_complete({"fetched_at": datetime(2024, 1, 3, tzinfo=timezone.utc).timestamp()}, url)
+    assert not archive_complete({"fetched_at": datetime(2023, 12, 31, 12, tzinfo=timezone.utc).timestamp()}, url)
+    assert not archive_complete({}, url)
+
+def test_archive_cached_mid_month_is_refetched(api, tmp_path):
+    server, api_base = api
+    output_file, cache_dir = str(tmp_path / "games.jsonl"), str(tmp_path / "cache")
+    assert sync_games("player", output_file, cache_dir, api_base=api_base, return_games=False) == 10
+
+    # As if the last sync ran in the middle of February 2015, when its archive had 5 games
+    february = f"{api_base}/player/player/games/2015/02"
+    path = archive_cache_path(cache_dir, february)
+    with open(path, "r") as file:
+        entry = json.load(file)
+    entry["fetched_at"] = datetime(2015, 2, 15, tzinfo=timezone.utc).timestamp()
+    with open(path, "w") as file:
+        json.dump(entry, file)
+
+    # Since then February got 5 more games and March started. The mock serves as many games for
+    # every month, but January was fetched after it ended, so its 5 cached games are reused
+    server.games_per_archive = 10
+    server.players["player"] = archive_months(3)
+    assert sync_games("player", output_file, cache_dir, api_base=api_base, return_games=False) == 25
+
+    # Every archive is now complete: only the archive list is requested
+    before = server.request_count
+    assert sync_games("player", output_file, cache_dir, api_base=api_base, return_games=False) == 25
+    assert server.request_count - before == 1
@@ -0,0 +1,13 @@
+import visualization
+from visualization import figure_digests
+
+def test_digests_follow_the_code_the_plots_call(tmp_path, monkeypatch):
+    path = str(tmp_path / "games.csv")
+    with open(path, "w") as file:
+        file.write("time,result,color,white_elo,black_elo\n2024-01-01 10:00:00,win,white,1500,1400\n")
+    before = figure_digests(path, ["Figure_5", "Figure_6"], "png")
+    assert figure_digests(path, ["Figure_5", "Figure_6"], "png") == before
+    # A change to a helper module the plots call, e.g. the metric definitions, re-renders them
+    monkeypatch.setattr(visualization, "FIGURE_SOURCES", visualization.FIGURE_SOURCES + [visualization.plot_losses])
+    after = figure_digests(path, ["Figure_5", "Figure_6"], "png")
+    assert all(after[name] != before[name] for name in before)
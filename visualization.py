@@ -1,17 +1,36 @@
-from analysis import load_data, analyze_win_rate_by_color, analyze_win_rate_by_time_of_day, analyze_elo_diff_vs_win_rate
-import matplotlib.pyplot as plt
-import seaborn as sns
+from analysis import load_data, analyze_win_rate_by_color, analyze_win_rate_by_time_of_day, analyze_elo_diff_vs_win_rate, ALL_AGGREGATES, cached_aggregates
 import pandas as pd
-import matplotlib.ticker as ticker
 import numpy as np
-
-def plot_win_rate_by_color(df):
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import aggregates as aggregate_stats
+import analysis
+import features
+import metrics
+import rating_series as rating_helpers
+import schema
+from aggregates import family_stats, group_means
+from metrics import metric_result
+from rating_series import downsample, rating_bands, rating_series
+from result_cache import code_fingerprint
+from site_feed import export_feed
+
+def plot_win_rate_by_color(df, aggregates=None):
     """Plot win rate by color (white vs black)."""
+    import matplotlib.pyplot as plt
+
     if "color" not in df.columns or "result" not in df.columns:
         print("Data file must contain 'color' and 'result' columns.")
         return
     
-    color_win_rate = df.groupby("color")["result"].apply(lambda x: (x == "win").sum() / len(x) * 100)
+    color_win_rate = metric_result("win_rate_by_color", df, aggregates).means * 100
     
     # Plotting
     plt.figure(figsize=(8, 6))
@@ -21,16 +40,15 @@ def plot_win_rate_by_color(df):
     plt.xticks(rotation=0)
     plt.show()
 
-def plot_win_rate_by_opening(df, top_n=10):
+def plot_win_rate_by_opening(df, top_n=10, aggregates=None):
     """Horizontal bar plot for win rate by opening."""
-    df["win"] = df["result"].apply(lambda x: 1 if x == "win" else (0.5 if x == "agreed" else 0))
-    opening_counts = df["opening"].value_counts()
-    valid_openings = opening_counts[opening_counts >= 10].index
-    filtered_df = df[df["opening"].isin(valid_openings)]
+    import matplotlib.pyplot as plt
+    import seaborn as sns
 
+    # Mean score of the opening families played at least 10 times, labelled by family name
+    by_opening = family_stats(metric_result("score_by_opening", df, aggregates).stats, df)
     win_rate_by_opening = (
-        filtered_df.groupby("opening")["win"]
-        .mean()
+        group_means(by_opening)
         .sort_values(ascending=False)
         .head(top_n)
     )
@@ -50,10 +68,12 @@ def plot_win_rate_by_opening(df, top_n=10):
 
 
 
-def plot_elo_diff_vs_win_rate(df):
+def plot_elo_diff_vs_win_rate(df, aggregates=None):
     """Visualize the Elo difference vs win rate using a bar plot with a custom color palette."""
+    import matplotlib.pyplot as plt
+
     # First analyze the data
-    win_rate_by_elo_diff = analyze_elo_diff_vs_win_rate(df)
+    win_rate_by_elo_diff = analyze_elo_diff_vs_win_rate(df, aggregates)
     
     if win_rate_by_elo_diff is None or len(win_rate_by_elo_diff) == 0:
         print("No data to visualize.")
@@ -63,7 +83,8 @@ def plot_elo_diff_vs_win_rate(df):
     colors = plt.cm.Blues(np.linspace(0.3, 0.7, len(win_rate_by_elo_diff)))  # Adjust the range to avoid bright blues
     
     # Basic bar plot with the new color palette
-    plt.style.use('seaborn')
+    # The style was renamed to seaborn-v0_8 in matplotlib 3.6
+    plt.style.use('seaborn-v0_8' if 'seaborn-v0_8' in plt.style.available else 'seaborn')
     fig, ax = plt.subplots(figsize=(10, 6))
     
     ax.bar(win_rate_by_elo_diff.index, win_rate_by_elo_diff, color=colors)
@@ -83,19 +104,13 @@ def plot_elo_diff_vs_win_rate(df):
 
 
 
-def plot_win_rate_by_castling_type(df):
+def plot_win_rate_by_castling_type(df, aggregates=None):
     """Visualize the win rate by castling type."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     
-    # Combine your castling and opponent's castling into a single column 'castling_type'
-    df["castling_type"] = df.apply(
-        lambda row: "Kingside" if row["castle"] == "Kingside" else ("Queenside" if row["castle"] == "Queenside" else "No Castling"), axis=1
-    )
-    
-    # Create a new column for win rate, with wins as 1, draws as 0.5, and losses as 0
-    df["win"] = df["result"].apply(lambda x: 1 if x == "win" else (0.5 if x == "agreed" else 0))
-
-    # Calculate win rate by castling type
-    win_rate_by_castling = df.groupby("castling_type")["win"].mean() * 100
+    # Score (wins as 1, draws as 0.5, losses as 0) by castling type: kingside, queenside or no castling
+    win_rate_by_castling = metric_result("score_by_castling_type", df, aggregates).means * 100
 
     # Plot the win rate by castling type
     plt.figure(figsize=(8, 6))
@@ -106,33 +121,32 @@ def plot_win_rate_by_castling_type(df):
     plt.show()
 
 
-def plot_elo_rating_progression(df, start_date="2023-01-01"):
+def plot_elo_rating_progression(df, start_date="2023-01-01", max_points=2000, band_rule="W"):
     """
     Visualizes Elo rating progression over time for your games from the specified start date onwards.
     
     Parameters:
     - df: DataFrame containing game data, including 'time', 'white_elo', 'black_elo', and 'color' columns.
     - start_date: Start date to filter the data (default is "2023-01-01").
+    - max_points: The per-game line is downsampled (LTTB) to at most this many points, so the plot
+      costs the same however long the history is.
+    - band_rule: Period of the shaded min/max band behind the line (e.g. "W" weekly), or None.
     
     Returns:
     - A plot showing Elo rating progression over time.
     """
-    # Make a copy of the DataFrame to avoid modifying the original
-    df_copy = df.copy()
+    import matplotlib.pyplot as plt
 
-    # Ensure 'time' is a datetime column and filter the data for games from the start_date onwards
-    df_copy['time'] = pd.to_datetime(df_copy['time'], errors='coerce')  # Convert time to datetime
-    df_copy = df_copy[df_copy['time'] >= pd.to_datetime(start_date)]  # Filter games from 2023 onwards
-    
-    # Calculate your Elo rating based on whether you played as white or black
-    df_copy['elo_rating'] = df_copy.apply(lambda row: row['white_elo'] if row['color'] == 'white' else row['black_elo'], axis=1)
-    
-    # Drop rows where Elo rating is missing
-    df_copy = df_copy.dropna(subset=['elo_rating'])
+    # Per-game rating series, sorted by time; my_elo is your rating as white or black
+    ratings = rating_series(df, start_date)
     
     # Plot Elo rating progression over time without markers
     plt.figure(figsize=(10, 6))
-    plt.plot(df_copy['time'], df_copy['elo_rating'], linestyle='-', color='b', label='Elo Rating')
+    if band_rule and len(ratings):
+        bands = rating_bands(ratings, band_rule)
+        plt.fill_between(bands.index, bands['low'], bands['high'], color='b', alpha=0.15, linewidth=0, label='Min/max range')
+    line = downsample(ratings, max_points)
+    plt.plot(line.index, line.to_numpy(), linestyle='-', color='b', label='Elo Rating')
     
     plt.title('Elo Rating Progression Over Time (2023 Onwards)')
     plt.xlabel('Date')
@@ -145,6 +159,9 @@ def plot_elo_rating_progression(df, start_date="2023-01-01"):
 
 
 def plot_distribution_game_length(df):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     plt.figure(figsize=(10, 6))
     
     # Plot KDE (Kernel Density Estimate) as a line plot
@@ -168,22 +185,25 @@ def plot_losses(df):
     Parameters:
     - df: DataFrame containing game data, including 'result' and 'loss_type' columns.
     """
+    import matplotlib.pyplot as plt
+
     # Define loss types based on your dataset's loss conditions
     # Anything other than 'win', 'agreed', 'repetition' is considered a loss
     loss_conditions = ['win', 'agreed', 'repetition', 'stalemate', 'insufficient', 'timevsinsufficient']
     
     # Add a column to categorize losses
-    df['loss_type'] = df['result'].apply(lambda x: 'Loss' if x not in loss_conditions else None)
+    loss_type = pd.Series(np.where(df['result'].isin(loss_conditions), None, 'Loss'), index=df.index, dtype=object)
     
     # Now we'll define possible loss types and manually categorize them if present
     # Example: You may have a 'resignation', 'checkmate', 'abandoned', 'timeout' column or some other way to categorize losses
     # For now, we assume you already know how to classify these losses and manually add them
     
-    # Here is an example approach if such columns exist (replace this with your actual categorization logic):
-    df['loss_type'] = df.apply(lambda row: 'Resigned' if 'resign' in row['result'].lower() else row['loss_type'], axis=1)
-    df['loss_type'] = df.apply(lambda row: 'Checkmated' if 'checkmated' in row['result'].lower() else row['loss_type'], axis=1)
-    df['loss_type'] = df.apply(lambda row: 'Abandoned' if 'abandoned' in row['result'].lower() else row['loss_type'], axis=1)
-    df['loss_type'] = df.apply(lambda row: 'Timeout' if 'timeout' in row['result'].lower() else row['loss_type'], axis=1)
+    # Here is an example approach if such columns exist (replace this with your actual categorization logic);
+    # later matches take precedence
+    result = df['result'].astype(str).str.lower()
+    for pattern, label in [('resign', 'Resigned'), ('checkmated', 'Checkmated'), ('abandoned', 'Abandoned'), ('timeout', 'Timeout')]:
+        loss_type[result.str.contains(pattern, regex=False).to_numpy()] = label
+    df['loss_type'] = loss_type
     
     # Filter out the losses and categorize them
     losses_df = df[df['loss_type'].notna()]
@@ -217,6 +237,8 @@ def plot_percentage_games_per_month_from_2023(df):
     """
     Plots the percentage of games played per month starting from 2023.
     """
+    import matplotlib.pyplot as plt
+
     # Convert 'time' column to datetime if not already
     df['time'] = pd.to_datetime(df['time'], errors='coerce')
     
@@ -241,28 +263,14 @@ def plot_percentage_games_per_month_from_2023(df):
     plt.show()
 
 
-def plot_win_rate_by_time_of_day(df):
+def plot_win_rate_by_time_of_day(df, aggregates=None):
     """
     Visualizes the win rate by time of day: Morning, Afternoon, Evening, and Night, with different colors for each bar.
     """
-    # Convert 'time' column to datetime if not already
-    df["time"] = pd.to_datetime(df["time"], errors="coerce")
-    df = df.dropna(subset=["time"])
-    
-    # Extract the hour and categorize into time of day
-    df["hour"] = df["time"].dt.hour
-    df["time_of_day"] = pd.cut(
-        df["hour"],
-        bins=[0, 9, 17, 21, 24],
-        labels=["Morning", "Afternoon", "Evening", "Night"],
-        right=False
-    )
-    
-    # Create a binary column for wins
-    df["win"] = df["result"].apply(lambda x: 1 if x == "win" else 0)
-    
-    # Calculate win rate by time of day
-    win_rate_by_time_of_day = df.groupby("time_of_day")["win"].mean() * 100
+    import matplotlib.pyplot as plt
+
+    # Win rate by time of day, binned like analyze_win_rate_by_time_of_day (aggregates.TIME_OF_DAY_BINS)
+    win_rate_by_time_of_day = metric_result("win_rate_by_time_of_day", df, aggregates).means * 100
     
     # Define custom colors for each bar
     colors = ["skyblue", "lightgreen", "orange", "violet"]
@@ -281,34 +289,156 @@ def plot_win_rate_by_time_of_day(df):
     plt.tight_layout()
     plt.show()
 
+# The figures of figures/ (as referenced by index.html): plot function and the columns it reads.
+# Figure_2 (games per hour) has no plotting code here, so renders leave the committed image as it is
+FIGURES = {
+    "Figure_1": (plot_percentage_games_per_month_from_2023, ["time"]),
+    "Figure_3": (plot_elo_rating_progression, ["time", "result", "color", "white_elo", "black_elo"]),
+    "Figure_4": (plot_win_rate_by_opening, ["opening", "family_id", "result"]),
+    "Figure_5": (plot_win_rate_by_time_of_day, ["time", "result"]),
+    "Figure_6": (plot_elo_diff_vs_win_rate, ["result", "color", "white_elo", "black_elo"]),
+    "Figure_7": (plot_win_rate_by_castling_type, ["castle", "result"]),
+    "Figure_8": (plot_win_rate_by_color, ["color", "result"]),
+    "Figure_9": (plot_losses, ["result"]),
+    "Figure_10": (plot_distribution_game_length, ["move_count"]),
+}
+
+def render_figure(name, file_path, output_path):
+    """
+    Renders one figure of FIGURES to `output_path` with the non-interactive Agg backend, loading only
+    the columns it needs. Returns (name, seconds).
+    """
+    import matplotlib.pyplot as plt
+
+    start = time.perf_counter()
+    plot, columns = FIGURES[name]
+    plt.switch_backend("Agg")
+    df = load_data(file_path, columns=columns)
+    # Styles set by one plot must not leak into the next figure rendered by the same worker
+    with plt.rc_context(), warnings.catch_warnings():
+        # plt.show() is a no-op under Agg; the figure is saved instead
+        warnings.filterwarnings("ignore", message=".*non-interactive.*")
+        plot(df)
+        plt.gcf().savefig(output_path)
+    plt.close("all")
+    return name, time.perf_counter() - start
+
+# Modules the plot functions call into (the analyses, metrics and their statistics, the rating
+# series and the typed loading); a change to any of them re-renders every figure
+FIGURE_SOURCES = [analysis, metrics, aggregate_stats, features, rating_helpers, schema]
+
+def figure_digests(file_path, names, fmt):
+    """
+    Digest of each figure's input: the hashed values of the columns it reads, the source of its plot
+    function and of FIGURE_SOURCES, and the output format. A figure whose digest is unchanged does
+    not need re-rendering.
+    """
+    columns = sorted({column for name in names for column in FIGURES[name][1]})
+    df = load_data(file_path, columns=columns)
+    column_hashes = {
+        column: hashlib.sha1(pd.util.hash_pandas_object(df[column], index=False).to_numpy().tobytes()).hexdigest()
+        for column in df.columns
+    }
+    helpers = code_fingerprint(FIGURE_SOURCES)
+    digests = {}
+    for name in names:
+        plot, plot_columns = FIGURES[name]
+        digest = hashlib.sha1(f"{fmt}\0{helpers}\0{inspect.getsource(plot)}".encode())
+        for column in plot_columns:
+            digest.update(f"{column}\0{column_hashes.get(column)}".encode())
+        digests[name] = digest.hexdigest()
+    return digests
+
+def render_figures(file_path="cleaned_games.parquet", output_dir="figures", fmt="png", workers=None, names=None, force=False):
+    """
+    Renders the figures of FIGURES (or just `names`) headlessly to <output_dir>/<name>.<fmt>, spread
+    over a process pool of `workers`. A figure is skipped when its file exists and its input digest
+    matches the last render, recorded in <output_dir>/render_manifest.json; `force` renders everything.
 
-
-
+    Returns a dict of figure name to render time in seconds, or "unchanged" for skipped figures and
+    "failed" for figures whose plot raised an error (which is printed).
+    """
+    names = list(names or FIGURES)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, "render_manifest.json")
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r") as file:
+            manifest = json.load(file)
+
+    digests = figure_digests(file_path, names, fmt)
+    timings = {}
+    pending = []
+    for name in names:
+        output_path = os.path.join(output_dir, f"{name}.{fmt}")
+        if not force and manifest.get(name) == digests[name] and os.path.exists(output_path):
+            timings[name] = "unchanged"
+        else:
+            pending.append((name, output_path))
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count(), len(pending))) as executor:
+            futures = {executor.submit(render_figure, name, file_path, output_path): name for name, output_path in pending}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    _, timings[name] = future.result()
+                    manifest[name] = digests[name]
+                except Exception as e:
+                    print(f"Error rendering {name}: {e}")
+                    timings[name] = "failed"
+                    manifest.pop(name, None)
+
+    temp_path = manifest_path + ".tmp"
+    with open(temp_path, "w") as file:
+        json.dump(manifest, file, indent=4)
+    os.replace(temp_path, manifest_path)
+    return {name: timings[name] for name in names}
 
 
 if __name__ == "__main__":
-    # Load the cleaned game data
-    df = load_data()
-
-    plot_win_rate_by_time_of_day(df)
-    plot_percentage_games_per_month_from_2023(df)
-    
-    
-    plot_losses(df)
-    # Perform analysis and plotting
-    analyze_win_rate_by_color(df)
-    plot_win_rate_by_color(df)
-
-    plot_win_rate_by_opening(df)
-    
-    analyze_elo_diff_vs_win_rate(df)
-    plot_elo_diff_vs_win_rate(df)
-    
-    analyze_win_rate_by_time_of_day(df)
-    plot_win_rate_by_castling_type(df)
-
-    plot_elo_rating_progression(df)
-    plot_distribution_game_length(df)
+    parser = argparse.ArgumentParser(description="Plot the cleaned chess games.")
+    parser.add_argument("--render", metavar="DIR", help="Render every figure headlessly to DIR instead of showing them")
+    parser.add_argument("--format", choices=["png", "svg"], default="png")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--force", action="store_true", help="Re-render figures whose input has not changed")
+    parser.add_argument("--feed", default="data/aggregates.json",
+                        help="Where a render also writes the JSON feed the charts of index.html are drawn from")
+    args = parser.parse_args()
+
+    if args.render:
+        timings = render_figures("cleaned_games.parquet", args.render, args.format, args.workers, force=args.force)
+        for name, seconds in timings.items():
+            print(f"{name:>10}: " + (seconds if isinstance(seconds, str) else f"{seconds:.2f}s"))
+        # The site draws its charts from the feed and falls back to the figures without it
+        size = export_feed("cleaned_games.parquet", args.feed)
+        if size:
+            print(f"Wrote {size} bytes to {args.feed}.")
+    else:
+        # Load the cleaned game data
+        df = load_data()
+        # Statistics shared with analysis.py, reused from its cache while the data is unchanged
+        aggregates = cached_aggregates("cleaned_games.parquet", ALL_AGGREGATES)
+
+        plot_win_rate_by_time_of_day(df, aggregates)
+        plot_percentage_games_per_month_from_2023(df)
+    
+    
+        plot_losses(df)
+        # Perform analysis and plotting
+        analyze_win_rate_by_color(df, aggregates)
+        plot_win_rate_by_color(df, aggregates)
+
+        plot_win_rate_by_opening(df, aggregates=aggregates)
+    
+        # Prints the analysis of the Elo difference as well
+        plot_elo_diff_vs_win_rate(df, aggregates)
+    
+        analyze_win_rate_by_time_of_day(df, aggregates)
+        plot_win_rate_by_castling_type(df, aggregates)
+
+        plot_elo_rating_progression(df)
+        plot_distribution_game_length(df)
 
    
 